@@ -1,55 +1,53 @@
-import re
 import datetime
 import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from duckduckgo_search import DDGS
 from google.adk.agents.llm_agent import Agent
 import json
-from .tuvi_metrics import TuViMetrics
+import os
+from core.search_cache import SearchCache, make_search_key
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core import deadline
+from core.metrics import record_search_cache
+from core.model_tiers import ModelTierPolicy, build_tiered_model
+from core.tracing import annotate, span, traced
+from .tuvi_metrics import metrics_engine
+from .birth_parser import parse_birth
 from .feature_life_path import tinh_con_so_chu_dao
 from .feature_zodiac import xem_cung_hoang_dao
 from .feature_numerology import luan_giai_than_so_hoc
 
+# Kết quả tra cứu online: TTL + stale-while-revalidate, lưu SQLite dùng chung giữa các worker
+search_cache = SearchCache(
+    os.environ.get('SEARCH_CACHE_PATH', 'data/search_cache.db'),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 24 * 3600)),
+    stale_ttl=float(os.environ.get('SEARCH_CACHE_STALE_TTL', 7 * 24 * 3600)),
+    max_entries=int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 5000)),
+    on_count=record_search_cache,
+)
+
+# DDGS là lời gọi mạng blocking -> chạy trên pool riêng, có deadline, qua circuit breaker
+SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', 4))
+SEARCH_DEADLINE_RESERVE = 5.0 # Giây chừa lại cho Gemini viết câu trả lời sau khi tra cứu
+search_breaker = CircuitBreaker(
+    'duckduckgo',
+    failure_threshold=int(os.environ.get('SEARCH_BREAKER_THRESHOLD', 3)),
+    cooldown=float(os.environ.get('SEARCH_BREAKER_COOLDOWN', 60)),
+)
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ddgs")
+
 def _chuan_hoa_nam_sinh(text_input: str) -> int:
-    text = str(text_input).lower().strip()
-    current_year = datetime.datetime.now().year
-    
-    # Case 1: Nhập năm rõ ràng (1990, 2005)
-    match_4 = re.search(r'\b(19|20)\d{2}\b', text)
-    if match_4: return int(match_4.group(0))
-    
-    # Case 2: Nhập kiểu Gen Z (2k1, 2k, 2k10)
-    match_2k = re.search(r'\b2k(\d*)\b', text)
-    if match_2k:
-        suffix = match_2k.group(1)
-        return 2000 if suffix == "" else 2000 + int(suffix)
-    
-    # Case 3: Nhập tuổi (VD: "Con 30 tuổi", "tui ba mươi tuổi")
-    # Tìm số đứng trước chữ "tuổi"
-    match_tuoi = re.search(r'(\d{1,3})\s*(tuổi|t)', text)
-    if match_tuoi:
-        tuoi = int(match_tuoi.group(1))
-        if 0 < tuoi < 120:
-            return current_year - tuoi + 1 # Tuổi mụ thường tính +1, nhưng tính năm sinh thì trừ thẳng
-            
-    # Case 4: Nhập 2 số cuối (88, 92)
-    match_2 = re.search(r'\b\d{2}\b', text)
-    if match_2:
-        val = int(match_2.group(0))
-        if 10 < val <= 99:
-            return 1900 + val if val > 40 else 2000 + val
-            
-    return None
-    return None
+    # Năm 4 số -> "2k1" -> "30 tuổi" -> 2 số cuối (xem birth_parser)
+    return parse_birth(text_input).year
 
 def _chuan_hoa_ngay_sinh(text_input: str) -> str:
     """
     Trích xuất ngày sinh đầy đủ dd/mm/yyyy từ input.
     """
-    text = str(text_input).lower().strip()
-    match = re.search(r'\b(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{4})\b', text)
-    if match:
-        return f"{match.group(1)}/{match.group(2)}/{match.group(3)}"
-    return None
+    return parse_birth(text_input).ngay_sinh
+
 def _tinh_can_chi(nam_sinh: int) -> str:
     can = ["Canh", "Tân", "Nhâm", "Quý", "Giáp", "Ất", "Bính", "Đinh", "Mậu", "Kỷ"]
     chi = ["Thân", "Dậu", "Tuất", "Hợi", "Tý", "Sửu", "Dần", "Mão", "Thìn", "Tỵ", "Ngọ", "Mùi"]
@@ -86,7 +84,32 @@ def xem_sao_giai_han(du_lieu_dau_vao: str, gioi_tinh: str = "nam") -> dict:
         "instruction": "Dựa vào sao này để phán. Sao tốt (Mộc Đức, Thái Dương, Thái Âm) thì chúc mừng. Sao xấu (La Hầu, Kế Đô, Thái Bạch) thì dặn dò cẩn thận."
     }
 
-def tra_cuu_tu_vi_online(du_lieu_dau_vao: str, linh_vuc: str = "tổng quát") -> dict:
+@traced("search.duckduckgo")
+def _tim_kiem_ddgs(query: str) -> list:
+    """Gọi DuckDuckGo (blocking) và lọc lấy các đoạn mô tả đủ dài. Lỗi mạng thì ném ra cho cache xử lý."""
+    if not search_breaker.allow():
+        raise CircuitOpenError("Search circuit is open")
+    print(f"\n[SYSTEM] Tra cứu: '{query}'")
+    start = time.perf_counter()
+    try:
+        results = DDGS(timeout=max(1, int(SEARCH_TIMEOUT))).text(keywords=query, region='vn-vi', max_results=3)
+    except Exception:
+        search_breaker.record_failure()
+        raise
+    # Trả về sau hạn chót thì người hỏi đã nhận fallback rồi -> tính là lỗi (kết quả vẫn được cache)
+    if time.perf_counter() - start > SEARCH_TIMEOUT:
+        search_breaker.record_failure()
+    else:
+        search_breaker.record_success()
+
+    knowledge = []
+    if results:
+        for res in results:
+            if res and 'body' in res and len(res['body']) > 50:
+                knowledge.append(f"- {res['body']}")
+    return knowledge
+
+async def tra_cuu_tu_vi_online(du_lieu_dau_vao: str, linh_vuc: str = "tổng quát") -> dict:
     ns = _chuan_hoa_nam_sinh(du_lieu_dau_vao)
     if ns is None: return {"status": "missing_info", "message": "Thiếu năm sinh."}
         
@@ -94,20 +117,31 @@ def tra_cuu_tu_vi_online(du_lieu_dau_vao: str, linh_vuc: str = "tổng quát") -
         can_chi = _tinh_can_chi(ns)
         current_year = datetime.datetime.now().year + 1
         query = f"Tử vi tuổi {can_chi} sinh năm {ns} năm {current_year} {linh_vuc} luận giải chi tiết"
-        print(f"\n[SYSTEM] Tra cứu: '{query}'")
-
-        # Revert: Simple search logic
-        try:
-            results = DDGS().text(keywords=query, region='vn-vi', max_results=3)
-        except Exception as e:
-            print(f"[WARN] Search failed: {e}")
-            results = None
-
-        knowledge = []
-        if results:
-            for res in results:
-                if res and 'body' in res and len(res['body']) > 50:
-                    knowledge.append(f"- {res['body']}")
+
+        # Câu tra chỉ phụ thuộc (can chi, năm sinh, năm xem, lĩnh vực) -> cache theo khoá chuẩn hoá
+        key = make_search_key(can_chi, ns, current_year, linh_vuc)
+        knowledge = search_cache.get_fresh(key)
+        annotate(**{"search.cache_hit": knowledge is not None})
+        # Hạn chót tra cứu không vượt deadline của request, chừa thời gian cho lần gọi Gemini cuối
+        timeout = deadline.clamp(SEARCH_TIMEOUT, reserve=SEARCH_DEADLINE_RESERVE)
+        if knowledge is None and timeout <= 0:
+            deadline.trip("search")
+            annotate(**{"search.skipped_deadline": True})
+        elif knowledge is None:
+            # Không được block event loop: tra cache SQLite / gọi mạng ở thread riêng, có hạn chót
+            loop = asyncio.get_running_loop()
+            with span("search.load") as current:
+                ctx = contextvars.copy_context() # Span hiện tại đi theo sang thread tra cứu
+                try:
+                    knowledge = await asyncio.wait_for(
+                        loop.run_in_executor(_search_executor, ctx.run, search_cache.get_or_load, key,
+                                             lambda: _tim_kiem_ddgs(query)),
+                        timeout=timeout,
+                    )
+                except asyncio.TimeoutError:
+                    print(f"[WARN] Search timed out after {timeout:.1f}s")
+                    current.set_attribute("search.timed_out", True)
+                    knowledge = None
         
         if not knowledge:
             # RETURN FALLBACK (QUAN TRỌNG)
@@ -136,9 +170,8 @@ def phan_tich_chi_so_khoa_hoc(nam_sinh_input: str, gioi_tinh: str = "nam") -> di
         return {"status": "error", "message": "Cần cung cấp năm sinh cụ thể để chạy thuật toán phân tích."}
     
     try:
-        # Gọi bộ tính toán
-        engine = TuViMetrics()
-        data = engine.tinh_chi_so(ns, gioi_tinh)
+        # Gọi bộ tính toán (instance dùng chung, tra bảng dựng sẵn)
+        data = metrics_engine.tinh_chi_so(ns, gioi_tinh)
         
         # QUAN TRỌNG: Trả về một "Special Token" hoặc JSON string để Frontend nhận diện
         return {
@@ -159,27 +192,24 @@ def phan_tich_chi_so_khoa_hoc(nam_sinh_input: str, gioi_tinh: str = "nam") -> di
         return {"status": "error", "message": f"Máy tính của thầy bị nóng quá, tính chưa ra. Lỗi: {str(e)}. Con thử lại sau nghen!"}
 
 def xem_so_chu_dao(du_lieu_dau_vao: str) -> dict:
-    dob = _chuan_hoa_ngay_sinh(du_lieu_dau_vao)
-    if not dob: return {"status": "missing_info", "message": "Muốn tính Số Chủ Đạo phải cho thầy ngày tháng năm sinh đầy đủ (ví dụ 12/05/1990) nghen!"}
-    return tinh_con_so_chu_dao(dob)
+    record = parse_birth(du_lieu_dau_vao)
+    if not record.ngay_sinh: return {"status": "missing_info", "message": "Muốn tính Số Chủ Đạo phải cho thầy ngày tháng năm sinh đầy đủ (ví dụ 12/05/1990) nghen!"}
+    return tinh_con_so_chu_dao(record)
 
 def xem_cung_hoang_dao_tool(du_lieu_dau_vao: str) -> dict:
-    dob = _chuan_hoa_ngay_sinh(du_lieu_dau_vao)
-    # Fallback: Nếu không có năm, thử tìm pattern ngày/tháng (dd/mm)
-    if not dob:
-        match = re.search(r'\b(\d{1,2})[\/\-\.](\d{1,2})\b', du_lieu_dau_vao)
-        if match: dob = f"{match.group(1)}/{match.group(2)}/2000" # Năm giả định
-    
-    if not dob: return {"status": "missing_info", "message": "Cung Hoàng Đạo cần ngày và tháng sinh (ví dụ 20/11) mới xem được đa."}
-    return xem_cung_hoang_dao(dob)
+    # Có ngày sinh đầy đủ thì dùng, không thì chỉ cần ngày/tháng (dd/mm)
+    record = parse_birth(du_lieu_dau_vao)
+    if record.ngay_thang is None: return {"status": "missing_info", "message": "Cung Hoàng Đạo cần ngày và tháng sinh (ví dụ 20/11) mới xem được đa."}
+    return xem_cung_hoang_dao(record)
 
 def xem_than_so_hoc(du_lieu_dau_vao: str) -> dict:
-    dob = _chuan_hoa_ngay_sinh(du_lieu_dau_vao)
-    if not dob: return {"status": "missing_info", "message": "Thần Số Học cần ngày tháng năm sinh đầy đủ (dd/mm/yyyy) để tính hết các chỉ số nghen."}
-    return luan_giai_than_so_hoc(dob)
+    record = parse_birth(du_lieu_dau_vao)
+    if not record.ngay_sinh: return {"status": "missing_info", "message": "Thần Số Học cần ngày tháng năm sinh đầy đủ (dd/mm/yyyy) để tính hết các chỉ số nghen."}
+    return luan_giai_than_so_hoc(record)
 
 root_agent = Agent(
-    model='gemini-2.5-flash',
+    # AGENT_MODEL / AGENT_LIGHT_MODEL theo hạng của lượt; THAY_TU_MODEL_BACKEND=replay -> phát lại cassette, không cần mạng
+    model=build_tiered_model(ModelTierPolicy.from_env()),
     name='thay_tu_refined',
     description="Thầy Tư tinh tế, ứng biến linh hoạt và biết phân tích dữ liệu khoa học.",
     instruction=(
@@ -0,0 +1,156 @@
+"""
+Bộ tách thông tin ngày sinh dùng chung cho mọi tool: quét câu nhập đúng một lượt
+(một regex biên dịch sẵn) rồi trả về BirthRecord.
+
+Thứ tự ưu tiên năm sinh giữ nguyên như _chuan_hoa_nam_sinh cũ:
+năm 4 chữ số (19xx/20xx) -> kiểu Gen Z "2k1" -> "30 tuổi" -> 2 số cuối ("88").
+"""
+import re
+import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Một lượt quét qua mọi dãy chữ số; năm/tuổi/2k/ngày đều suy từ vị trí dãy số và ký tự kề bên
+_SCAN = re.compile(r"\d+")
+# Từ chỉ giới tính: chỉ dò khi có người hỏi tới (ít tool cần), lọc nhanh bằng `in` trước
+_FEMALE = re.compile(r"\b(?:nữ|gái|female)\b")
+_MALE = re.compile(r"\b(?:nam|trai|male)\b")
+_DIGITS = re.compile(r"\d*")
+_DATE_SEPARATORS = "/-."
+
+
+class BirthRecord(NamedTuple):
+    """Thông tin ngày sinh tách được từ câu nhập (trường nào không có thì None). Bất biến."""
+    year: Optional[int] = None # Năm sinh đã suy ra theo thứ tự ưu tiên
+    year_source: Optional[str] = None # "year" | "2k" | "age" | "two_digit"
+    day: Optional[int] = None # Ngày/tháng/năm từ ngày sinh đầy đủ dd/mm/yyyy
+    month: Optional[int] = None
+    date_year: Optional[int] = None
+    date_text: Optional[str] = None # Ngày sinh đầy đủ giữ nguyên chữ số như người dùng gõ (d/m/yyyy)
+    partial_day: Optional[int] = None # Ngày/tháng dạng dd/mm (không có năm)
+    partial_month: Optional[int] = None
+    age: Optional[int] = None # Số đứng trước "tuổi"
+    slang_2k: Optional[int] = None # Năm từ kiểu "2k1"
+    text: str = "" # Câu nhập đã chuẩn hoá (chữ thường), để dò thêm gợi ý giới tính khi cần
+
+    @property
+    def is_female(self) -> bool:
+        text = self.text
+        return ("nữ" in text or "gái" in text or "female" in text) and _FEMALE.search(text) is not None
+
+    @property
+    def is_male(self) -> bool:
+        text = self.text
+        return ("nam" in text or "trai" in text or "male" in text) and _MALE.search(text) is not None
+
+    @property
+    def ngay_sinh(self) -> Optional[str]:
+        """Ngày sinh đầy đủ dạng d/m/yyyy (như _chuan_hoa_ngay_sinh cũ)."""
+        return self.date_text
+
+    @property
+    def ngay_thang(self):
+        """(ngày, tháng): ưu tiên ngày sinh đầy đủ, không có thì lấy dạng dd/mm. None nếu không có."""
+        if self.day is not None:
+            return self.day, self.month
+        if self.partial_day is not None:
+            return self.partial_day, self.partial_month
+        return None
+
+    @property
+    def gioi_tinh_hint(self) -> Optional[str]:
+        """'nam' / 'nữ' nếu câu nhập nói rõ một giới tính, ngược lại None."""
+        is_female, is_male = self.is_female, self.is_male
+        if is_female == is_male:
+            return None
+        return "nữ" if is_female else "nam"
+
+
+def _is_word(ch: str) -> bool:
+    # Cùng định nghĩa với \w của re (unicode): chữ/số hoặc gạch dưới
+    return ch.isalnum() or ch == "_"
+
+
+def parse_birth(text_input, current_year: int = None) -> BirthRecord:
+    """Tách thông tin ngày sinh từ câu nhập. Kết quả được nhớ (LRU) vì router, cache và tool hay parse cùng một câu."""
+    if current_year is None:
+        current_year = datetime.datetime.now().year
+    return _parse_cached(str(text_input), current_year)
+
+
+@lru_cache(maxsize=4096)
+def _parse_cached(text_input: str, current_year: int) -> BirthRecord:
+    return _parse(text_input, current_year)
+
+
+def _parse(text_input: str, current_year: int) -> BirthRecord:
+    text = text_input.lower().strip()
+    n = len(text)
+
+    year_4 = slang = age = two_digit = None
+    date = partial = None
+    prev_start = prev_end = prev2_start = prev2_end = -1 # Hai dãy số liền trước, để ghép dd/mm/yyyy
+
+    for match in _SCAN.finditer(text):
+        start, end = match.span()
+        length = end - start
+        bounded_left = start == 0 or not _is_word(text[start - 1])
+        bounded_right = end == n or not _is_word(text[end])
+
+        if bounded_left and bounded_right:
+            if year_4 is None and length == 4 and text[start:start + 2] in ("19", "20"):
+                year_4 = int(text[start:end])
+            elif two_digit is None and length == 2:
+                two_digit = int(text[start:end])
+
+        # "2k", "2k1", "2k10": số 2 đầu từ, ngay sau là k, rồi các chữ số tới hết từ
+        if slang is None and length == 1 and bounded_left and text[start] == "2" and text[end:end + 1] == "k":
+            suffix_end = _DIGITS.match(text, end + 1).end()
+            if suffix_end == n or not _is_word(text[suffix_end]):
+                slang = 2000 + int(text[end + 1:suffix_end] or 0)
+
+        # "30 tuổi", "30t": tối đa 3 chữ số cuối của dãy, sau khoảng trắng là chữ t
+        if age is None:
+            j = end
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] == "t":
+                age = int(text[max(start, end - 3):end])
+
+        # Ngày: các dãy số nối nhau bằng đúng một dấu / - . (dd/mm và dd/mm/yyyy)
+        if bounded_right and prev_end >= 0 and start == prev_end + 1 and text[prev_end] in _DATE_SEPARATORS \
+                and prev_end - prev_start <= 2:
+            if partial is None and length <= 2 and _starts_word(text, prev_start):
+                partial = (text[prev_start:prev_end], text[start:end])
+            if date is None and length == 4 and prev2_end >= 0 and prev2_end - prev2_start <= 2 \
+                    and prev_start == prev2_end + 1 and text[prev2_end] in _DATE_SEPARATORS \
+                    and _starts_word(text, prev2_start):
+                date = (text[prev2_start:prev2_end], text[prev_start:prev_end], text[start:end])
+
+        prev2_start, prev2_end, prev_start, prev_end = prev_start, prev_end, start, end
+
+    # Thứ tự ưu tiên như cũ
+    year = source = None
+    if year_4 is not None:
+        year, source = year_4, "year"
+    elif slang is not None:
+        year, source = slang, "2k"
+    elif age is not None and 0 < age < 120:
+        year, source = current_year - age + 1, "age"
+    elif two_digit is not None and 10 < two_digit <= 99:
+        year, source = (1900 + two_digit if two_digit > 40 else 2000 + two_digit), "two_digit"
+
+    day = month = date_year = date_text = None
+    if date:
+        d, m, y = date
+        day, month, date_year, date_text = int(d), int(m), int(y), f"{d}/{m}/{y}"
+    partial_day = partial_month = None
+    if partial:
+        partial_day, partial_month = int(partial[0]), int(partial[1])
+
+    return BirthRecord(year, source, day, month, date_year, date_text,
+                       partial_day, partial_month, age, slang, text)
+
+
+def _starts_word(text, start):
+    return start == 0 or not _is_word(text[start - 1])
@@ -0,0 +1,320 @@
+"""
+Đường tắt cho câu hỏi "tính là ra": sao hạn, số chủ đạo, cung hoàng đạo, thần số học.
+
+Nhận diện bằng luật cố định (không gọi LLM), gọi thẳng tool rồi trả lời theo mẫu giọng Thầy Tư.
+Chỉ nhận khi chắc chắn: đúng một loại câu hỏi, đủ tham số, không kèm chủ đề khác hay
+ngữ cảnh hội thoại - còn lại để agent xử lý.
+"""
+import re
+import time
+import datetime
+import random
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+from .agent import (xem_sao_giai_han, xem_so_chu_dao, xem_cung_hoang_dao_tool, xem_than_so_hoc,
+                    _chuan_hoa_nam_sinh, _chuan_hoa_ngay_sinh)
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Kết quả nhận diện: tên ý định + tham số đã chuẩn hoá để gọi tool."""
+    name: str
+    args: tuple # ((tên tham số, giá trị), ...) - hashable để làm khoá cache
+
+
+@dataclass(frozen=True)
+class RoutedAnswer:
+    intent: Intent
+    reply: str
+    tool_result: dict
+
+
+_INTENT_PATTERNS = {
+    "sao_han": re.compile(r"\bsao\s*hạn\b|\bsao\s*chiếu\b|\bgiải\s*hạn\b"),
+    "so_chu_dao": re.compile(r"\bsố\s*chủ\s*đạo\b|\blife\s*path\b"),
+    "cung_hoang_dao": re.compile(r"\bcung\s*hoàng\s*đạo\b|\bzodiac\b"),
+    "than_so_hoc": re.compile(r"\bthần\s*số\s*học\b|\bnumerology\b"),
+}
+
+# Có mấy chữ này là câu hỏi vượt khỏi phép tính (xin lời khuyên, nhờ so sánh, hỏi tiếp ý trước...)
+_NEEDS_AGENT = re.compile(
+    r"\b(cưới|hôn nhân|làm ăn|kinh doanh|tình duyên|tình yêu|người yêu|sự nghiệp|công việc|tiền bạc|"
+    r"tài lộc|sức khỏe|sức khoẻ|con cái|nhà cửa|có nên|nên không|hợp|khắc|so sánh|biểu đồ|chi tiết|"
+    r"giải thích|tại sao|vì sao|như vậy|vậy còn|còn|thêm|nữa|vợ|chồng|ba|má|mẹ|anh|em)\b"
+)
+
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_FULL_DATE = re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})[/\-.]((?:19|20)\d{2})\b")
+_DAY_MONTH = re.compile(r"\b(\d{1,2})[/\-.](\d{1,2})\b")
+_MALE = re.compile(r"\b(nam|trai|male)\b")
+_FEMALE = re.compile(r"\b(nữ|gái|female)\b")
+_OTHER_YEAR_WORDS = re.compile(r"\bnăm\s+(sau|tới|ngoái|trước|kia)\b")
+
+MAX_MESSAGE_LENGTH = 120
+
+# Chủ đề rộng hơn (cho answer cache): câu hỏi vẫn cần agent nhưng trả lời chỉ phụ thuộc tham số
+_TOPIC_PATTERNS = {
+    **_INTENT_PATTERNS,
+    "chi_so": re.compile(r"\bbiểu\s*đồ\b|\bđiểm\s*số\b|\bchỉ\s*số\b|\bkhoa\s*học\b"),
+    "tu_vi": re.compile(r"\btử\s*vi\b|\bvận\s*hạn\b|\bxem\s*tuổi\b"),
+}
+_FIELDS = re.compile(r"\b(tài lộc|sự nghiệp|công việc|tình duyên|sức khỏe|sức khoẻ|gia đạo|học hành)\b")
+# Câu hỏi phụ làm đổi nội dung trả lời -> đưa vào khoá
+_MODIFIERS = re.compile(
+    r"\b(cưới|hôn nhân|làm ăn|kinh doanh|con cái|nhà cửa|mua nhà|xây nhà|đi xa|có nên|so sánh|"
+    r"chi tiết|ngắn gọn|tóm tắt|hợp|khắc|màu|hướng|số đẹp)\b"
+)
+# Chữ đệm không đổi nghĩa câu hỏi; còn sót chữ nào ngoài danh sách này thì không dám cache
+_FILLER_WORDS = frozenset(
+    "thầy ơi cho con hỏi xem coi giùm dùm giúp năm nay tuổi sinh về của là gì sao thế nào ra nha nhé nghen "
+    "ạ à với tui tôi mình em anh chị bị được có không hông ko thì và mạng tính luận giải bói nè đi mà cảm ơn "
+    "vui lòng mấy ngày tháng ở trong".split()
+)
+# Câu hỏi nối tiếp ý trước -> câu trả lời phụ thuộc lịch sử, không cache được
+_FOLLOW_UP = re.compile(r"\b(còn|vậy|nữa|như trên|lúc nãy|hồi nãy|ở trên|vừa rồi|tiếp|vợ|chồng|người đó|bạn đó)\b")
+
+_GOOD_STARS = {"Mộc Đức", "Thái Dương", "Thái Âm"}
+_BAD_STARS = {"La Hầu", "Kế Đô", "Thái Bạch"}
+
+_OPENERS = (
+    "Chà chà, ngồi xuống uống miếng nước trà đi cưng, để tui bấm độn coi liền nè.",
+    "Quẻ này ngộ à nghen, tui tính vầy nè.",
+    "Coi bộ con hỏi trúng nghề của tui rồi đó, nghe nè.",
+)
+_CLOSERS = (
+    "Thôi dặn vầy thôi, ráng sống tốt trời thương nghen!",
+    "Muốn coi kỹ hơn (biểu đồ, tài lộc, tình duyên...) thì hỏi tui thêm nghen.",
+    "Có gì thắc mắc cứ hỏi tiếp, tui ngồi đây tới tối lận.",
+)
+
+
+def _normalize(message: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", message).lower().split())
+
+
+def _valid_day_month(day: int, month: int) -> bool:
+    return 1 <= day <= 31 and 1 <= month <= 12
+
+
+class IntentRouter:
+    """Nhận diện + trả lời câu hỏi thuần tính toán, kèm thống kê tỉ lệ trúng và thời gian tiết kiệm."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "fall_through": 0, "tool_declined": 0, "fast_path_seconds": 0.0,
+                         "estimated_seconds_saved": 0.0}
+        self.by_intent = {name: 0 for name in _INTENT_PATTERNS}
+        self._agent_latency = None # EWMA thời gian một lượt agent, để ước lượng phần tiết kiệm
+
+    # --- Nhận diện ---
+    def classify(self, message: str):
+        """Trả về Intent nếu câu hỏi rõ ràng là một phép tính, ngược lại None."""
+        text = _normalize(message)
+        if not text or len(text) > MAX_MESSAGE_LENGTH or _NEEDS_AGENT.search(text):
+            return None
+
+        names = [name for name, pattern in _INTENT_PATTERNS.items() if pattern.search(text)]
+        if len(names) != 1:
+            return None
+        name = names[0]
+
+        if name == "sao_han":
+            return self._classify_sao_han(text)
+
+        full_dates = _FULL_DATE.findall(text)
+        if name in ("so_chu_dao", "than_so_hoc"):
+            if len(full_dates) != 1:
+                return None
+            day, month, year = (int(x) for x in full_dates[0])
+            if not _valid_day_month(day, month):
+                return None
+            return Intent(name, (("du_lieu_dau_vao", f"{day:02d}/{month:02d}/{year}"),))
+
+        # cung_hoang_dao: chỉ cần ngày/tháng, năm có cũng được
+        day_months = _DAY_MONTH.findall(_FULL_DATE.sub(lambda m: f"{m.group(1)}/{m.group(2)}", text))
+        if len(day_months) != 1:
+            return None
+        day, month = (int(x) for x in day_months[0])
+        if not _valid_day_month(day, month):
+            return None
+        return Intent(name, (("du_lieu_dau_vao", f"{day:02d}/{month:02d}"),))
+
+    @staticmethod
+    def _classify_sao_han(text):
+        # Sao hạn tính cho năm nay: hỏi năm khác / nhiều năm / thiếu giới tính thì để agent lo
+        years = _YEAR.findall(text)
+        if len(years) != 1 or _OTHER_YEAR_WORDS.search(text):
+            return None
+        male, female = bool(_MALE.search(text)), bool(_FEMALE.search(text))
+        if male == female:
+            return None
+        return Intent("sao_han", (("du_lieu_dau_vao", years[0]), ("gioi_tinh", "nam" if male else "nữ")))
+
+    def signature(self, message: str):
+        """
+        Khoá cho answer cache: các chủ đề được hỏi + tham số đầy đủ (năm sinh, giới tính, ngày sinh, lĩnh vực).
+        None nếu câu hỏi nối tiếp ngữ cảnh hoặc thiếu tham số (agent sẽ phải dựa vào lịch sử).
+        """
+        text = _normalize(message)
+        if not text or len(text) > MAX_MESSAGE_LENGTH * 2 or _FOLLOW_UP.search(text):
+            return None
+        topics = sorted(name for name, pattern in _TOPIC_PATTERNS.items() if pattern.search(text))
+        if not topics:
+            return None
+
+        residual = text
+        for pattern in (*_TOPIC_PATTERNS.values(), _FIELDS, _MODIFIERS, _FULL_DATE, _YEAR, _MALE, _FEMALE):
+            residual = pattern.sub(" ", residual)
+        if any(word not in _FILLER_WORDS for word in re.findall(r"\w+", residual)):
+            return None
+
+        args = {}
+        if {"sao_han", "tu_vi", "chi_so"} & set(topics):
+            years = set(_YEAR.findall(_FULL_DATE.sub(lambda m: m.group(3), text)))
+            male, female = bool(_MALE.search(text)), bool(_FEMALE.search(text))
+            if len(years) != 1 or male == female or _OTHER_YEAR_WORDS.search(text):
+                return None
+            args["nam_sinh"] = int(years.pop())
+            args["gioi_tinh"] = "nam" if male else "nữ"
+        if {"so_chu_dao", "than_so_hoc", "cung_hoang_dao"} & set(topics):
+            full_dates = set(_FULL_DATE.findall(text))
+            if len(full_dates) != 1:
+                return None
+            day, month, year = (int(x) for x in full_dates.pop())
+            if not _valid_day_month(day, month):
+                return None
+            args["ngay_sinh"] = f"{day:02d}/{month:02d}/{year}"
+        fields = sorted({field.replace("khoẻ", "khỏe") for field in _FIELDS.findall(text)})
+        if fields:
+            args["linh_vuc"] = ",".join(fields)
+        modifiers = sorted(set(_MODIFIERS.findall(text)))
+        if modifiers:
+            args["hoi_them"] = ",".join(modifiers)
+        # Nội dung trả lời gắn với năm hiện tại (sao hạn, năm cá nhân...)
+        args["nam_xem"] = datetime.datetime.now().year
+        return Intent("+".join(topics), tuple(sorted(args.items())))
+
+    @staticmethod
+    def matches_tool_calls(intent, tool_calls) -> bool:
+        """
+        Agent có gọi tool với đúng tham số trong khoá không? (ít nhất một lần gọi, mọi lần gọi đều khớp)
+        Lệch (agent hiểu khác, hoặc lấy thông tin từ lịch sử) thì không cache câu trả lời đó.
+        """
+        if not tool_calls:
+            return False
+        expected = dict(intent.args)
+        for name, call_args in tool_calls:
+            raw = str(call_args.get("du_lieu_dau_vao", call_args.get("nam_sinh_input", "")))
+            if "nam_sinh" in expected and name in ("xem_sao_giai_han", "tra_cuu_tu_vi_online", "phan_tich_chi_so_khoa_hoc"):
+                if _chuan_hoa_nam_sinh(raw) != expected["nam_sinh"]:
+                    return False
+                if "gioi_tinh" in call_args:
+                    is_nu = bool(_FEMALE.search(_normalize(str(call_args["gioi_tinh"]))))
+                    if is_nu != (expected["gioi_tinh"] == "nữ"):
+                        return False
+            elif "ngay_sinh" in expected and name in ("xem_so_chu_dao", "xem_than_so_hoc", "xem_cung_hoang_dao_tool"):
+                dob = _chuan_hoa_ngay_sinh(raw)
+                if dob is None or [int(x) for x in dob.split("/")] != [int(x) for x in expected["ngay_sinh"].split("/")]:
+                    return False
+            else:
+                return False
+        return True
+
+    # --- Trả lời ---
+    def answer(self, message: str):
+        """Trả về RoutedAnswer nếu xử lý được bằng đường tắt, ngược lại None (để agent trả lời)."""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        intent = self.classify(message)
+        if intent is None:
+            self._count("fall_through")
+            return None
+
+        result = _TOOLS[intent.name](**dict(intent.args))
+        if not isinstance(result, dict) or result.get("status") != "success":
+            self._count("tool_declined")
+            return None
+
+        reply = _RENDERERS[intent.name](result)
+        self._record_hit(intent, time.perf_counter() - start)
+        return RoutedAnswer(intent, reply, result)
+
+    # --- Thống kê ---
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _record_hit(self, intent, elapsed):
+        with self._lock:
+            self.counters["hits"] += 1
+            self.counters["fast_path_seconds"] += elapsed
+            self.by_intent[intent.name] += 1
+            if self._agent_latency is not None:
+                self.counters["estimated_seconds_saved"] += max(0.0, self._agent_latency - elapsed)
+
+    def record_agent_latency(self, seconds: float):
+        """Báo thời gian một lượt agent đầy đủ (để ước lượng thời gian đường tắt tiết kiệm được)."""
+        with self._lock:
+            if self._agent_latency is None:
+                self._agent_latency = seconds
+            else:
+                self._agent_latency = 0.9 * self._agent_latency + 0.1 * seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            by_intent = dict(self.by_intent)
+            agent_latency = self._agent_latency
+        routed = counters["hits"] + counters["fall_through"] + counters["tool_declined"]
+        return {
+            "enabled": self.enabled,
+            "hits": counters["hits"],
+            "fall_through": counters["fall_through"],
+            "tool_declined": counters["tool_declined"],
+            "hit_rate": round(counters["hits"] / routed, 4) if routed else 0.0,
+            "by_intent": by_intent,
+            "avg_fast_path_ms": round(counters["fast_path_seconds"] / counters["hits"] * 1000, 3) if counters["hits"] else None,
+            "avg_agent_turn_ms": round(agent_latency * 1000, 1) if agent_latency is not None else None,
+            "estimated_seconds_saved": round(counters["estimated_seconds_saved"], 2),
+        }
+
+
+def _render_sao_han(result):
+    sao = result["sao_han"].removeprefix("Sao ").strip()
+    if sao in _GOOD_STARS:
+        loi_phan = f"Sao {sao} là sao tốt, năm nay làm gì cũng thuận, có quý nhân phù trợ. Chúc mừng nghen!"
+    elif sao in _BAD_STARS:
+        loi_phan = (f"Sao {sao} là sao xấu đó nghen, năm nay ráng giữ gìn sức khỏe, đi đứng cẩn thận, "
+                    f"tiền bạc đừng cho ai mượn bừa. Rảnh thì đi chùa cúng giải hạn cho an tâm.")
+    else:
+        loi_phan = f"Sao {sao} thuộc loại trung tính, năm nay hông tốt hông xấu, cứ bình tĩnh mà sống."
+    return (
+        f"{random.choice(_OPENERS)}\n\n"
+        f"Tuổi **{result['can_chi']}** (sinh năm {result['nam_sinh']}), năm nay {result['tuoi_mu']} tuổi mụ, "
+        f"gặp **{result['sao_han']}**.\n\n"
+        f"👉 {loi_phan}\n\n"
+        f"{random.choice(_CLOSERS)}"
+    )
+
+
+def _render_message(result):
+    return f"{random.choice(_OPENERS)}\n\n{result['message']}\n\n{random.choice(_CLOSERS)}"
+
+
+_TOOLS = {
+    "sao_han": xem_sao_giai_han,
+    "so_chu_dao": xem_so_chu_dao,
+    "cung_hoang_dao": xem_cung_hoang_dao_tool,
+    "than_so_hoc": xem_than_so_hoc,
+}
+
+_RENDERERS = {
+    "sao_han": _render_sao_han,
+    "so_chu_dao": _render_message,
+    "cung_hoang_dao": _render_message,
+    "than_so_hoc": _render_message,
+}
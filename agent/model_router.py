@@ -0,0 +1,65 @@
+"""
+Chọn hạng model cho một lượt agent bằng tín hiệu rẻ, tính tại chỗ (không gọi LLM):
+độ dài câu, câu xã giao / hỏi tiếp, và câu có dấu hiệu cần tool (năm/ngày sinh, chủ đề tử vi, lĩnh vực) hay không.
+Lượt nhẹ đi model rẻ (AGENT_LIGHT_MODEL), còn lại dùng model chính.
+"""
+import re
+import threading
+from dataclasses import asdict, dataclass
+
+from core import metrics
+from core.model_tiers import LIGHT, STANDARD, ModelTierPolicy
+from .intent_router import _DAY_MONTH, _FIELDS, _FOLLOW_UP, _MODIFIERS, _TOPIC_PATTERNS, _YEAR, _normalize
+
+# Chào hỏi, cảm ơn, ừ hử... không cần suy luận gì
+_SMALL_TALK = re.compile(
+    r"\b(chào|xin chào|hello|hi|alo|cảm ơn|cám ơn|thank|thanks|tạm biệt|bye|ok|oke|dạ|vâng|ừ|hihi|haha|hehe)\b"
+)
+# Hỏi thẳng về tử vi / tính toán / lời khuyên cụ thể -> nhiều khả năng gọi tool hoặc cần luận giải dài
+_TOOL_HINTS = re.compile("|".join(p.pattern for p in _TOPIC_PATTERNS.values()) + r"|\btuổi\b|\bmệnh\b|\bquẻ\b")
+
+
+@dataclass(frozen=True)
+class Route:
+    tier: str
+    model: str
+    reason: str # small_talk, follow_up, short, long, tools_likely, advice, disabled
+
+
+class ModelRouter:
+    """Phân hạng model cho từng lượt, kèm thống kê số lượt theo hạng / lý do."""
+
+    def __init__(self, llm, policy: ModelTierPolicy):
+        self.llm = llm # TieredLlm của agent
+        self.policy = policy
+        self.enabled = LIGHT in llm.tiers
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def classify(self, message: str):
+        """Trả về (hạng, lý do) cho câu hỏi."""
+        text = _normalize(message)
+        if len(text) > self.policy.light_max_length:
+            return STANDARD, "long"
+        if _TOOL_HINTS.search(text) or _YEAR.search(text) or _DAY_MONTH.search(text):
+            return STANDARD, "tools_likely"
+        if _FIELDS.search(text) or _MODIFIERS.search(text):
+            return STANDARD, "advice"
+        if _SMALL_TALK.search(text):
+            return LIGHT, "small_talk"
+        if _FOLLOW_UP.search(text):
+            return LIGHT, "follow_up"
+        return LIGHT, "short"
+
+    def route(self, message: str) -> Route:
+        tier, reason = self.classify(message) if self.enabled else (STANDARD, "disabled")
+        with self._lock:
+            key = f"{tier}:{reason}"
+            self.counters[key] = self.counters.get(key, 0) + 1
+        metrics.MODEL_ROUTES.labels(tier, reason).inc()
+        return Route(tier, self.llm.model_for(tier), reason)
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = dict(self.counters)
+        return {"enabled": self.enabled, "routes": routes, "policy": asdict(self.policy)}
@@ -0,0 +1,74 @@
+"""
+Chấm điểm TuViMetrics hàng loạt bằng NumPy (phân tích offline cho cả triệu người).
+
+Mọi kết quả đều lấy từ bảng 60 x 2 của TuViMetrics (cùng nguồn với đường vô hướng),
+nên chấm điểm một mảng chỉ là một phép gather theo (năm sinh % 60, giới tính).
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError: # numpy là phụ thuộc tuỳ chọn - chỉ cần cho API batch
+    np = None
+
+from .tuvi_metrics import TuViMetrics
+
+METRIC_KEYS = ("than_menh", "tai_loc", "quan_loc", "tinh_duyen", "phuc_duc")
+ELEMENTS = ("Kim", "Thủy", "Hỏa", "Thổ", "Mộc")
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("tinh_chi_so_batch cần numpy: pip install numpy")
+
+
+@lru_cache(maxsize=1)
+def _bang_numpy():
+    """(điểm[60, 2, 5] int16, mã ngũ hành[60] int8) dựng từ TuViMetrics._BANG."""
+    diem = np.empty((60, 2, len(METRIC_KEYS)), dtype=np.int16)
+    ma_hanh = np.empty(60, dtype=np.int8)
+    for vi_tri, theo_gioi in enumerate(TuViMetrics._BANG):
+        for la_nam, ket_qua in enumerate(theo_gioi):
+            diem[vi_tri, la_nam] = [ket_qua["metrics"][k] for k in METRIC_KEYS]
+        # Nạp âm chỉ phụ thuộc can chi, không phụ thuộc giới tính
+        ma_hanh[vi_tri] = ELEMENTS.index(theo_gioi[1]["element"])
+    diem.setflags(write=False)
+    ma_hanh.setflags(write=False)
+    return diem, ma_hanh
+
+
+def _la_nam(gioi_tinh, n):
+    gioi_tinh = np.asarray(gioi_tinh)
+    if gioi_tinh.dtype == bool:
+        la_nam = gioi_tinh
+    elif gioi_tinh.dtype.kind in "UO":
+        la_nam = gioi_tinh == "nam" # Giống đường vô hướng: mọi giá trị khác "nam" là nữ
+    else:
+        raise TypeError(f"gioi_tinh phải là bool hoặc chuỗi, nhận {gioi_tinh.dtype}")
+    return np.broadcast_to(la_nam, (n,))
+
+
+def tinh_chi_so_batch(nam_sinh, gioi_tinh="nam") -> dict:
+    """
+    Chấm điểm một mảng năm sinh.
+
+    - nam_sinh: mảng số nguyên (N,)
+    - gioi_tinh: mảng (N,) bool (True = nam) hoặc chuỗi ("nam"/"nữ"), hoặc một giá trị dùng chung
+
+    Trả về dict gồm 5 mảng điểm int16 theo METRIC_KEYS, "element" (tên ngũ hành nạp âm)
+    và "element_code" (chỉ số trong ELEMENTS). Khớp tuyệt đối với TuViMetrics.tinh_chi_so.
+    """
+    _require_numpy()
+    diem, ma_hanh = _bang_numpy()
+
+    nam_sinh = np.asarray(nam_sinh)
+    if nam_sinh.ndim != 1 or nam_sinh.dtype.kind not in "iu":
+        raise TypeError("nam_sinh phải là mảng số nguyên một chiều")
+    vi_tri = np.mod(nam_sinh, 60) # np.mod giống % của Python với số âm
+    la_nam = _la_nam(gioi_tinh, len(nam_sinh)).astype(np.intp)
+
+    theo_hang = diem[vi_tri, la_nam] # (N, 5)
+    ket_qua = {key: theo_hang[:, i] for i, key in enumerate(METRIC_KEYS)}
+    ket_qua["element_code"] = ma_hanh[vi_tri]
+    ket_qua["element"] = np.asarray(ELEMENTS)[ket_qua["element_code"]]
+    return ket_qua
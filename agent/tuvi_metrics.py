@@ -1,51 +1,65 @@
 
 class TuViMetrics:
-    def __init__(self):
-        # Dữ liệu cơ bản
-        self.ThienCan = ["Canh", "Tân", "Nhâm", "Quý", "Giáp", "Ất", "Bính", "Đinh", "Mậu", "Kỷ"]
-        self.DiaChi = ["Thân", "Dậu", "Tuất", "Hợi", "Tý", "Sửu", "Dần", "Mão", "Thìn", "Tỵ", "Ngọ", "Mùi"]
-        self.NguHanh = ["Kim", "Thủy", "Hỏa", "Thổ", "Mộc"] # Mặc định, sẽ tính lại theo Nạp Âm
-        
-        # Bảng Nạp Âm Ngũ Hành (Rút gọn cho demo, ánh xạ CanChi -> Ngũ Hành)
-        # Quy ước: 0=Kim, 1=Thủy, 2=Hỏa, 3=Thổ, 4=Mộc
-        self.NapAm = {
-            # Giáp Tý/Ất Sửu = Hải Trung Kim (0) - ví dụ
-             "Giáp Tý": "Kim", "Ất Sửu": "Kim", "Bính Dần": "Hỏa", "Đinh Mão": "Hỏa",
-             "Mậu Thìn": "Mộc", "Kỷ Tỵ": "Mộc", "Canh Ngọ": "Thổ", "Tân Mùi": "Thổ",
-             "Nhâm Thân": "Kim", "Quý Dậu": "Kim", "Giáp Tuất": "Hỏa", "Ất Hợi": "Hỏa",
-             "Bính Tý": "Thủy", "Đinh Sửu": "Thủy", "Mậu Dần": "Thổ", "Kỷ Mão": "Thổ",
-             "Canh Thìn": "Kim", "Tân Tỵ": "Kim", "Nhâm Ngọ": "Mộc", "Quý Mùi": "Mộc",
-             "Giáp Thân": "Thủy", "Ất Dậu": "Thủy", "Bính Tuất": "Thổ", "Đinh Hợi": "Thổ",
-             "Mậu Tý": "Hỏa", "Kỷ Sửu": "Hỏa", "Canh Dần": "Mộc", "Tân Mão": "Mộc",
-             "Nhâm Thìn": "Thủy", "Quý Tỵ": "Thủy", "Giáp Ngọ": "Kim", "Ất Mùi": "Kim",
-             "Bính Thân": "Hỏa", "Đinh Dậu": "Hỏa", "Mậu Tuất": "Mộc", "Kỷ Hợi": "Mộc",
-             "Canh Tý": "Thổ", "Tân Sửu": "Thổ", "Nhâm Dần": "Kim", "Quý Mão": "Kim",
-             "Giáp Thìn": "Hỏa", "Ất Tỵ": "Hỏa", "Bính Ngọ": "Thủy", "Đinh Mùi": "Thủy",
-             "Mậu Thân": "Thổ", "Kỷ Dậu": "Thổ", "Canh Tuất": "Kim", "Tân Hợi": "Kim",
-             "Nhâm Tý": "Mộc", "Quý Sửu": "Mộc", "Giáp Dần": "Thủy", "Ất Mão": "Thủy",
-             "Bính Thìn": "Thổ", "Đinh Tỵ": "Thổ", "Mậu Ngọ": "Hỏa", "Kỷ Mùi": "Hỏa",
-             "Canh Thân": "Mộc", "Tân Dậu": "Mộc", "Nhâm Tuất": "Thủy", "Quý Hợi": "Thủy"
-        }
-        
-        # Ngũ hành sinh khắc (Key sinh Value)
-        self.Sinh = {"Kim": "Thủy", "Thủy": "Mộc", "Mộc": "Hỏa", "Hỏa": "Thổ", "Thổ": "Kim"}
-        self.Khac = {"Kim": "Mộc", "Mộc": "Thổ", "Thổ": "Thủy", "Thủy": "Hỏa", "Hỏa": "Kim"}
-        
-        # Tra cứu Lộc Tồn (Tài Lộc) theo Can
-        self.LocTon = {
-            "Giáp": "Dần", "Ất": "Mão", "Bính": "Tỵ", "Mậu": "Tỵ",
-            "Đinh": "Ngọ", "Kỷ": "Ngọ", "Canh": "Thân", "Tân": "Dậu",
-            "Nhâm": "Hợi", "Quý": "Tý"
-        }
-        
-        # Tra cứu Quý Nhân (Phúc Đức) theo Can (Lấy 1 chi đại diện)
-        self.QuyNhan = {
-            "Giáp": ["Sửu", "Mùi"], "Mậu": ["Sửu", "Mùi"], "Canh": ["Sửu", "Mùi"],
-            "Ất": ["Tý", "Thân"], "Kỷ": ["Tý", "Thân"],
-            "Bính": ["Hợi", "Dậu"], "Đinh": ["Hợi", "Dậu"],
-            "Nhâm": ["Tỵ", "Mão"], "Quý": ["Tỵ", "Mão"],
-            "Tân": ["Ngọ", "Dần"]
-        }
+    # Dữ liệu cơ bản (thuộc class: dùng chung, không dựng lại mỗi lần khởi tạo)
+    ThienCan = ["Canh", "Tân", "Nhâm", "Quý", "Giáp", "Ất", "Bính", "Đinh", "Mậu", "Kỷ"]
+    DiaChi = ["Thân", "Dậu", "Tuất", "Hợi", "Tý", "Sửu", "Dần", "Mão", "Thìn", "Tỵ", "Ngọ", "Mùi"]
+    NguHanh = ["Kim", "Thủy", "Hỏa", "Thổ", "Mộc"] # Mặc định, sẽ tính lại theo Nạp Âm
+    
+    # Bảng Nạp Âm Ngũ Hành (Rút gọn cho demo, ánh xạ CanChi -> Ngũ Hành)
+    # Quy ước: 0=Kim, 1=Thủy, 2=Hỏa, 3=Thổ, 4=Mộc
+    NapAm = {
+        # Giáp Tý/Ất Sửu = Hải Trung Kim (0) - ví dụ
+         "Giáp Tý": "Kim", "Ất Sửu": "Kim", "Bính Dần": "Hỏa", "Đinh Mão": "Hỏa",
+         "Mậu Thìn": "Mộc", "Kỷ Tỵ": "Mộc", "Canh Ngọ": "Thổ", "Tân Mùi": "Thổ",
+         "Nhâm Thân": "Kim", "Quý Dậu": "Kim", "Giáp Tuất": "Hỏa", "Ất Hợi": "Hỏa",
+         "Bính Tý": "Thủy", "Đinh Sửu": "Thủy", "Mậu Dần": "Thổ", "Kỷ Mão": "Thổ",
+         "Canh Thìn": "Kim", "Tân Tỵ": "Kim", "Nhâm Ngọ": "Mộc", "Quý Mùi": "Mộc",
+         "Giáp Thân": "Thủy", "Ất Dậu": "Thủy", "Bính Tuất": "Thổ", "Đinh Hợi": "Thổ",
+         "Mậu Tý": "Hỏa", "Kỷ Sửu": "Hỏa", "Canh Dần": "Mộc", "Tân Mão": "Mộc",
+         "Nhâm Thìn": "Thủy", "Quý Tỵ": "Thủy", "Giáp Ngọ": "Kim", "Ất Mùi": "Kim",
+         "Bính Thân": "Hỏa", "Đinh Dậu": "Hỏa", "Mậu Tuất": "Mộc", "Kỷ Hợi": "Mộc",
+         "Canh Tý": "Thổ", "Tân Sửu": "Thổ", "Nhâm Dần": "Kim", "Quý Mão": "Kim",
+         "Giáp Thìn": "Hỏa", "Ất Tỵ": "Hỏa", "Bính Ngọ": "Thủy", "Đinh Mùi": "Thủy",
+         "Mậu Thân": "Thổ", "Kỷ Dậu": "Thổ", "Canh Tuất": "Kim", "Tân Hợi": "Kim",
+         "Nhâm Tý": "Mộc", "Quý Sửu": "Mộc", "Giáp Dần": "Thủy", "Ất Mão": "Thủy",
+         "Bính Thìn": "Thổ", "Đinh Tỵ": "Thổ", "Mậu Ngọ": "Hỏa", "Kỷ Mùi": "Hỏa",
+         "Canh Thân": "Mộc", "Tân Dậu": "Mộc", "Nhâm Tuất": "Thủy", "Quý Hợi": "Thủy"
+    }
+    
+    # Ngũ hành sinh khắc (Key sinh Value)
+    Sinh = {"Kim": "Thủy", "Thủy": "Mộc", "Mộc": "Hỏa", "Hỏa": "Thổ", "Thổ": "Kim"}
+    Khac = {"Kim": "Mộc", "Mộc": "Thổ", "Thổ": "Thủy", "Thủy": "Hỏa", "Hỏa": "Kim"}
+    
+    # Tra cứu Lộc Tồn (Tài Lộc) theo Can
+    LocTon = {
+        "Giáp": "Dần", "Ất": "Mão", "Bính": "Tỵ", "Mậu": "Tỵ",
+        "Đinh": "Ngọ", "Kỷ": "Ngọ", "Canh": "Thân", "Tân": "Dậu",
+        "Nhâm": "Hợi", "Quý": "Tý"
+    }
+    
+    # Tra cứu Quý Nhân (Phúc Đức) theo Can (Lấy 1 chi đại diện)
+    QuyNhan = {
+        "Giáp": ["Sửu", "Mùi"], "Mậu": ["Sửu", "Mùi"], "Canh": ["Sửu", "Mùi"],
+        "Ất": ["Tý", "Thân"], "Kỷ": ["Tý", "Thân"],
+        "Bính": ["Hợi", "Dậu"], "Đinh": ["Hợi", "Dậu"],
+        "Nhâm": ["Tỵ", "Mão"], "Quý": ["Tỵ", "Mão"],
+        "Tân": ["Ngọ", "Dần"]
+    }
+
+    # Đào Hoa theo Tam Hợp Chi
+    # Thân Tý Thìn -> Dậu
+    # Dần Ngọ Tuất -> Mão
+    # Tỵ Dậu Sửu -> Ngọ
+    # Hợi Mão Mùi -> Tý
+    DaoHoa = {
+        "Thân": "Dậu", "Tý": "Dậu", "Thìn": "Dậu",
+        "Dần": "Mão", "Ngọ": "Mão", "Tuất": "Mão",
+        "Tỵ": "Ngọ", "Dậu": "Ngọ", "Sửu": "Ngọ",
+        "Hợi": "Tý", "Mão": "Tý", "Mùi": "Tý"
+    }
+
+    # Kết quả chỉ phụ thuộc (năm sinh % 60, có phải nam không) -> dựng sẵn 60 x 2 ô lúc import
+    _BANG = None
 
     def _get_element_can(self, can):
         # Quy ước ngũ hành của Thiên Can
@@ -67,7 +81,19 @@ class TuViMetrics:
 
     def tinh_chi_so(self, nam_sinh, gioi_tinh="nam"):
         """
-        Tính toán chỉ số dựa trên thuật toán Tử Vi cơ bản.
+        Tính toán chỉ số dựa trên thuật toán Tử Vi cơ bản (tra bảng dựng sẵn, O(1)).
+        Trả về bản sao để người gọi sửa thoải mái không ảnh hưởng bảng.
+        """
+        ket_qua = self._BANG[nam_sinh % 60][gioi_tinh == "nam"]
+        return {
+            "metrics": dict(ket_qua["metrics"]),
+            "insight": ket_qua["insight"],
+            "element": ket_qua["element"]
+        }
+
+    def _tinh_chi_so_goc(self, nam_sinh, gioi_tinh="nam"):
+        """
+        Thuật toán gốc (rẽ nhánh đầy đủ) - dùng để dựng bảng và làm chuẩn đối chiếu.
         """
         # 1. Xác định Can Chi
         can = self.ThienCan[nam_sinh % 10]
@@ -141,17 +167,7 @@ class TuViMetrics:
         # 6. Tính điểm TÌNH DUYÊN (Dựa vào Đào Hoa)
         score_tinh_duyen = 65
         # Tra Đào Hoa (theo Tam Hợp Chi)
-        # Thân Tý Thìn -> Dậu
-        # Dần Ngọ Tuất -> Mão
-        # Tỵ Dậu Sửu -> Ngọ
-        # Hợi Mão Mùi -> Tý
-        dao_hoa_map = {
-            "Thân": "Dậu", "Tý": "Dậu", "Thìn": "Dậu",
-            "Dần": "Mão", "Ngọ": "Mão", "Tuất": "Mão",
-            "Tỵ": "Ngọ", "Dậu": "Ngọ", "Sửu": "Ngọ",
-            "Hợi": "Tý", "Mão": "Tý", "Mùi": "Tý"
-        }
-        dao_hoa_chi = dao_hoa_map.get(chi)
+        dao_hoa_chi = self.DaoHoa.get(chi)
         
         # Nếu năm sinh trùng Đào Hoa (hiếm, vì Đào Hoa tính theo năm/ngày, xét Chi năm với năm hiện tại?) -> Logic đơn giản:
         # Người có Chi là Tý, Ngọ, Mão, Dậu thường đào hoa hơn (Tứ Chính)
@@ -198,4 +214,13 @@ class TuViMetrics:
             "metrics": metrics,
             "insight": insight,
             "element": menh_nap_am
-        }
\ No newline at end of file
+        }
+
+
+TuViMetrics._BANG = tuple(
+    (TuViMetrics()._tinh_chi_so_goc(vi_tri, "nữ"), TuViMetrics()._tinh_chi_so_goc(vi_tri, "nam"))
+    for vi_tri in range(60)
+)
+
+# Instance dùng chung (không có trạng thái riêng, an toàn giữa các thread)
+metrics_engine = TuViMetrics()
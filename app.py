@@ -1,41 +1,94 @@
 import os
-import asyncio
 import uuid
 import time
 import logging
 import traceback
 import json
 import tempfile
-from flask import Flask, render_template, request, jsonify, session, make_response, g, has_request_context
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+import atexit
+import math
+import contextvars
+from contextlib import asynccontextmanager, closing
+import hmac
+from flask import Flask, Response, render_template, request, jsonify, session, make_response, g, has_request_context, stream_with_context
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
 from google.adk.memory import InMemoryMemoryService
-from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
-from google.adk.apps import App
-from google.adk.apps.app import EventsCompactionConfig
-from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
-from google.adk.models import Gemini
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.agents.invocation_context import new_invocation_context_id
 from google.genai import types
-from google.genai.errors import ServerError
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from opentelemetry import trace
 import google.cloud.logging
-from agent.agent import root_agent
+from agent.agent import root_agent, search_cache, search_breaker
+from agent.intent_router import IntentRouter
+from agent.model_router import ModelRouter
+from core.admission import AdmissionLimiter, AdmissionPolicy, Overloaded
+from core.answer_cache import AnswerCache
+from core import metrics
+from core.model_tiers import ModelTierPlugin, ModelTierPolicy, use_tier
+from core.log_pipeline import CloudLoggingSink, ConsoleSink, LogPipeline, LogPolicy
+from core.deadline import Deadline, DeadlineExceeded, DeadlinePlugin, current_deadline, guard as deadline_guard, use_deadline
+from core.resilient_llm import retry_budget
+from core.rate_limit import Budget, MemoryBucketStore, RateLimiter, SqliteBucketStore
+from core.runtime import APP_NAME, AgentRuntime, AgentLoop, get_runtime, close_runtime
+from core.tool_reuse import ToolResultReusePlugin
+from core.session_store import SharedSqliteSessionService
+from core.session_lifecycle import SessionBudget, SessionSweeper
+from core.usage import UsageLedger, current_turn, record_event, tool_path, track_turn
+from core.tracing import (annotate, current_trace_ids, finish_request_span, setup_tracing, shutdown_tracing, span,
+                          start_request_span)
 
 load_dotenv()
 
+# Tracing (OpenTelemetry): TRACING_EXPORTER=console|otlp, mặc định tắt
+setup_tracing()
+atexit.register(shutdown_tracing)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SESSION_SECRET', 'dev-secret-key')
 
-# Security: Rate Limiting
-limiter = Limiter(
-    get_remote_address,
-    app=app,
-    default_limits=["100 per day", "30 per hour"],
-    storage_uri="memory://"
-)
+# Security: Rate Limiting - token bucket theo IP, dùng chung cho mọi worker trên máy (SQLite)
+DEFAULT_RATE_LIMITS = ["100 per day", "30 per hour"]
+ASK_RATE_LIMIT = "20 per minute" # Anti-spam: 20 msg/min per IP (chung cho /ask và /ask/stream)
+
+def build_rate_limiter():
+    if os.environ.get('RATELIMIT_BACKEND', 'sqlite').lower() == 'memory':
+        store = MemoryBucketStore()
+    else:
+        store = SqliteBucketStore(os.environ.get('RATELIMIT_DB_PATH', 'data/rate_limit.db'))
+    return RateLimiter(
+        store,
+        routes={'ask': Budget.parse(os.environ.get('RATELIMIT_ASK', ASK_RATE_LIMIT))},
+        default=Budget.parse(os.environ.get('RATELIMIT_DEFAULT', ";".join(DEFAULT_RATE_LIMITS))),
+        enabled=os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true', # false chỉ dùng khi load test nội bộ
+    )
+
+rate_limiter = build_rate_limiter()
+
+# Path không log, không trace, không rate limit (file tĩnh, Prometheus scrape)
+QUIET_PREFIXES = ('/static', '/metrics')
+
+def rate_limit_route(path: str):
+    """Tên ngân sách cho một path (None = không giới hạn). /ask và /ask/stream tiêu chung một ngân sách."""
+    if path.startswith(QUIET_PREFIXES):
+        return None
+    return 'ask' if path in ('/ask', '/ask/stream') else path
+
+# Nhãn route cho /metrics: chỉ các route có thật, path lạ (404, dò quét) gom về 'other' cho khỏi nổ số series
+METRIC_ROUTES = frozenset(('/', '/ask', '/ask/stream', '/health', '/reset', '/admin/usage'))
+
+def metrics_route(path: str) -> str:
+    return path if path in METRIC_ROUTES else 'other'
+
+RATE_LIMITED_ERROR = "Con hỏi nhanh quá, thầy theo hông kịp. Nghỉ chút rồi hỏi tiếp nghen!"
+
+# Deadline của mỗi request: phải ngắn hơn --timeout của gunicorn (120s) để trả fallback thay vì bị kill worker
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 60))
+DEADLINE_GRACE = 2.0 # Thread Flask chờ thêm chừng này sau deadline rồi mới bỏ (phòng loop nền kẹt)
+DEADLINE_REPLY = "Chà, quẻ này thầy coi lâu quá mà trời chưa chịu tỏ. Con chờ chút rồi hỏi lại thầy nghen!"
+BUSY_REPLY = "Thầy đang bận coi quẻ cho mấy người khác, con đợi chút xíu rồi hỏi lại nghen!"
 
 
 # --- Structured Logging Setup ---
@@ -51,15 +104,18 @@ class ProjectPrefixFilter(logging.Filter):
             # If filtering fails, allow the log through untouched rather than crashing
             return True
 
+# Ngữ cảnh log (trace_id, user_id) khi chạy ngoài Flask request context (chế độ ASGI)
+log_context = contextvars.ContextVar('log_context', default=None)
+
 # Use JSON logging if in Cloud, otherwise standard text
 class StructuredLogger:
     def __init__(self, name):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.INFO)
-        self.executor = ThreadPoolExecutor(max_workers=1) # Fire-and-forget worker
         
         # Check credentials
         self.cloud_logging = False
+        sink = ConsoleSink()
         try:
             # HF Deployment: Load JSON from env var
             google_creds_json = os.environ.get("GOOGLE_CREDENTIALS_JSON")
@@ -76,6 +132,7 @@ class StructuredLogger:
             # Initialize Cloud Logging
             log_client = google.cloud.logging.Client()
             log_client.setup_logging() # This attaches a handler to the root logger
+            sink = CloudLoggingSink(log_client.logger(name)) # Log của app đi theo lô, 1 lần gọi API mỗi lô
             self.cloud_logging = True
             self.logger.info("✅ Google Cloud Logging connected.")
         except Exception as e:
@@ -85,16 +142,9 @@ class StructuredLogger:
         for handler in logging.getLogger().handlers:
             handler.addFilter(ProjectPrefixFilter())
 
-    def _log_worker(self, level, payload_json, message_text):
-        """Background worker to perform the actual blocking I/O log call."""
-        try:
-            if self.cloud_logging:
-                getattr(self.logger, level)(payload_json)
-            else:
-                # Local dev: pretty print (errors/warnings visible)
-                 print(f"[{level.upper()}] [thay-tu-online] {message_text}")
-        except Exception as e:
-            print(f"[LOG_FAIL] {e}")
+        # Hàng đợi có trần + gửi theo lô ở thread nền; flush nốt khi tắt worker
+        self.pipeline = LogPipeline(sink, LogPolicy.from_env())
+        atexit.register(self.pipeline.close)
 
     def log(self, level, message, **kwargs):
         """
@@ -107,15 +157,14 @@ class StructuredLogger:
             if has_request_context():
                 if hasattr(g, 'trace_id'): payload['trace_id'] = g.trace_id
                 if hasattr(g, 'user_id'): payload['user_id'] = g.user_id
+            elif log_context.get():
+                payload.update(log_context.get())
+            payload.update(current_trace_ids()) # Nối log với span đang chạy
             
             payload.update(kwargs)
             
-            # 2. Serialize Payload (Fast, in Main Thread to catch serialization errors early if needed, but safe to offload too)
-            # We do it here to pass string to worker
-            log_entry_json = json.dumps(payload, ensure_ascii=False)
-            
-            # 3. Offload to Background Thread
-            self.executor.submit(self._log_worker, level, log_entry_json, message)
+            # 2. Enqueue: serialize + I/O happen in the pipeline thread, batched
+            self.pipeline.submit(level, message, payload)
                 
         except Exception as e:
             print(f"[LOGGING_ERROR] Failed to submit log: {message}. Error: {e}")
@@ -125,15 +174,22 @@ logger = StructuredLogger("thay_tu_app")
 # --- Middleware ---
 @app.before_request
 def before_request():
+    if session_sweeper:
+        session_sweeper.ensure_started()
     g.start_time = time.time()
     g.trace_id = request.headers.get('X-Trace-Id', str(uuid.uuid4()))
     g.user_id = session.get('user_id', 'anonymous')
+    g.deadline = Deadline(REQUEST_DEADLINE)
     
     # Log Start (Skip static)
-    if not request.path.startswith('/static'):
+    if not request.path.startswith(QUIET_PREFIXES):
+        g.otel_span, g.otel_token = start_request_span(request.method, request.path, request.headers, g.trace_id)
+        g.metrics_route = metrics_route(request.path)
+        metrics.request_started(g.metrics_route)
+
         # Try to capture body for /ask
         body = None
-        if request.path == '/ask' and request.is_json:
+        if request.path in ('/ask', '/ask/stream') and request.is_json:
             try:
                 body = request.get_json()
             except: 
@@ -144,9 +200,16 @@ def before_request():
                    method=request.method,
                    request_body=body)
 
+        route = rate_limit_route(request.path)
+        wait = rate_limiter.check(route, request.remote_addr) if route else 0
+        if wait:
+            resp = make_response(jsonify({'error': RATE_LIMITED_ERROR}), 429)
+            resp.headers['Retry-After'] = str(math.ceil(wait))
+            return resp
+
 @app.after_request
 def after_request(response):
-    if request.path.startswith('/static'): return response
+    if request.path.startswith(QUIET_PREFIXES): return response
         
     duration = round(time.time() - g.start_time, 4)
     ip = request.headers.get('X-Forwarded-For', request.remote_addr)
@@ -165,17 +228,103 @@ def after_request(response):
     elif response.status_code >= 400: level = 'warning'
     
     logger.log(level, f"⏹️ Completed {request.method} {request.path} [{response.status_code}]", **log_data)
+    g.status_code = response.status_code
     return response
 
+@app.teardown_request
+def teardown_request(error=None):
+    otel_span = g.pop('otel_span', None)
+    if otel_span is not None:
+        finish_request_span(otel_span, g.pop('otel_token'), g.get('status_code'), error)
+    route = g.pop('metrics_route', None)
+    if route is not None:
+        # Chạy sau khi stream SSE kết thúc -> thời gian đo là cả lượt trả lời
+        metrics.request_finished(route, request.method, g.get('status_code', 500), time.time() - g.start_time)
+    deadline = g.get('deadline')
+    if deadline is not None and deadline.tripped:
+        metrics.record_deadline(deadline.tripped)
+
 
 # Configure Session/Memory Services (Keep these global as they are storage)
-session_service = InMemorySessionService()
+def build_session_service():
+    # Mặc định lưu session ra SQLite dùng chung để mọi gunicorn worker cùng thấy lịch sử
+    if os.environ.get('SESSION_BACKEND', 'sqlite').lower() == 'memory':
+        return InMemorySessionService()
+    return SharedSqliteSessionService(os.environ.get('SESSION_DB_PATH', 'data/sessions.db'))
+
+session_service = build_session_service()
+
+# Bounded lifecycle: TTL nhàn rỗi + LRU + trần event mỗi session, dọn bằng thread nền
+session_sweeper = None
+if isinstance(session_service, SharedSqliteSessionService):
+    session_sweeper = SessionSweeper(session_service, SessionBudget.from_env(),
+                                     lock_path=session_service.db_path + '.sweeper.lock')
 memory_service = InMemoryMemoryService()
 
+# Sổ token/chi phí của agent theo user, ngày, chuỗi tool (SQLite dùng chung cho mọi worker)
+def build_usage_ledger():
+    return UsageLedger(os.environ.get('USAGE_DB_PATH', 'data/usage.db'),
+                       retention=float(os.environ.get('USAGE_RETENTION', 30 * 24 * 3600)))
+
+usage_ledger = build_usage_ledger()
+atexit.register(usage_ledger.close) # atexit chạy ngược thứ tự: ghi nốt sổ SAU khi loop agent đã dừng
+
+# --- Agent Runtime (1 bộ Gemini/App/Runner + 1 event loop nền cho mỗi worker) ---
+# Model gọi lại tool với đúng tham số trong cùng lượt -> trả kết quả cũ, không tra cứu lại
+tool_reuse = ToolResultReusePlugin()
+
+# Model theo hạng: lượt nhẹ (chào hỏi, hỏi tiếp, không cần tool) đi model rẻ, compaction đi SUMMARIZER_MODEL
+model_tiers = ModelTierPolicy.from_env()
+model_router = ModelRouter(root_agent.model, model_tiers)
+model_tier_plugin = ModelTierPlugin(root_agent.model)
+
+def build_runtime():
+    plugins = [DeadlinePlugin(DEADLINE_REPLY), model_tier_plugin, tool_reuse]
+    return AgentRuntime(root_agent, session_service, memory_service, tier_policy=model_tiers, plugins=plugins)
+
+agent_loop = AgentLoop()
+atexit.register(agent_loop.shutdown, close_runtime)
+
+# Đường tắt cho câu hỏi thuần tính toán (sao hạn, số chủ đạo...) - không tốn lượt gọi Gemini
+intent_router = IntentRouter(enabled=os.environ.get('FAST_PATH_ENABLED', 'true').lower() == 'true')
+
+def _record_usage(user_id, turn, tool_calls, elapsed):
+    metrics.record_tokens(turn)
+    usage_ledger.record(user_id, turn, tool_calls, elapsed)
+
+# Admission control: số lượt agent chạy cùng lúc mỗi worker + hàng chờ có trần, quá thì 503 "Thầy đang bận"
+admission = AdmissionLimiter(AdmissionPolicy.from_env())
+
+@asynccontextmanager
+async def agent_turn(user_message: str, user_id: str, tool_calls: list):
+    """
+    Phạm vi một lượt chạy agent: giữ suất chạy (ném Overloaded nếu hết), chọn hạng model, mở sổ token,
+    ngân sách retry cho các lần gọi Gemini; xong (kể cả lỗi / client ngắt) thì ghi usage.
+    """
+    async with admission.slot():
+        start = time.perf_counter()
+        route = model_router.route(user_message)
+        annotate(**{'model.tier': route.tier, 'model.route_reason': route.reason})
+        with use_tier(route.tier), track_turn(route.model) as turn, \
+                retry_budget(root_agent.model.policy.request_budget):
+            try:
+                yield turn
+            finally:
+                _record_usage(user_id, turn, tool_calls, time.perf_counter() - start)
+
+# Cache câu trả lời của agent cho câu hỏi lặp lại (tuỳ chọn, mặc định tắt)
+answer_cache = None
+if os.environ.get('ANSWER_CACHE_ENABLED', 'false').lower() == 'true':
+    answer_cache = AnswerCache(
+        ttl=float(os.environ.get('ANSWER_CACHE_TTL', 6 * 3600)),
+        max_keys=int(os.environ.get('ANSWER_CACHE_MAX_KEYS', 2000)),
+        variants=int(os.environ.get('ANSWER_CACHE_VARIANTS', 3)),
+    )
+
 async def get_or_create_session_async(user_id: str):
     try:
         existing = await session_service.get_session(
-            app_name="thay_tu_app",
+            app_name=APP_NAME,
             user_id=user_id,
             session_id=user_id
         )
@@ -184,43 +333,101 @@ async def get_or_create_session_async(user_id: str):
     except Exception:
         pass
     
-    return await session_service.create_session(
-        app_name="thay_tu_app",
-        user_id=user_id,
-        session_id=user_id
-    )
+    try:
+        return await session_service.create_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=user_id
+        )
+    except AlreadyExistsError:
+        # Worker khác vừa tạo cùng session (store dùng chung) -> đọc lại
+        return await session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=user_id
+        )
 
-@retry(
-    retry=retry_if_exception_type(ServerError),
-    stop=stop_after_attempt(5), # Increased to 5 to handle frequent overloads
-    wait=wait_exponential(multiplier=2, min=2, max=30), # Slower backoff (2s, 4s, 8s...)
-    reraise=True
-)
-async def run_agent_async(user_message: str, user_id: str):
-    # Initialize components inside the request loop to avoid Event Loop closed errors
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    llm_client = Gemini(model="gemini-2.5-flash", api_key=api_key)
-    
-    # Performance Optimization: Re-enabled with safe interval
-    summarizer = LlmEventSummarizer(llm=llm_client)
-    
-    compaction_config = EventsCompactionConfig(
-        summarizer=summarizer,
-        compaction_interval=50, # High interval to reduce load
-        overlap_size=2
-    )
-    
-    adk_app = App(
-        name="thay_tu_app",
-        root_agent=root_agent,
-        events_compaction_config=compaction_config 
-    )
+async def _append_turn_async(user_id: str, user_message: str, reply: str):
+    """Ghi cặp hỏi/đáp không đi qua agent vào session để lượt sau agent thấy đủ lịch sử."""
+    adk_session = await get_or_create_session_async(user_id)
+    invocation_id = new_invocation_context_id()
+    await session_service.append_event(adk_session, Event(
+        invocation_id=invocation_id,
+        author='user',
+        content=types.Content(role='user', parts=[types.Part(text=user_message)])
+    ))
+    await session_service.append_event(adk_session, Event(
+        invocation_id=invocation_id,
+        author=root_agent.name,
+        content=types.Content(role='model', parts=[types.Part(text=reply)])
+    ))
 
-    runner = Runner(
-        app=adk_app,
-        session_service=session_service,
-        memory_service=memory_service
-    )
+async def answer_fast_path_async(user_message: str, user_id: str):
+    """Trả lời bằng intent router nếu được (None nếu phải hỏi agent)."""
+    with span('ask.fast_path') as current:
+        routed = intent_router.answer(user_message)
+        current.set_attribute('fast_path.hit', routed is not None)
+    if routed is None:
+        return None
+    await _append_turn_async(user_id, user_message, routed.reply)
+    logger.log('info', "⚡ Fast path answered", intent=routed.intent.name)
+    return routed
+
+def _answer_cache_key(user_message: str):
+    """Khoá answer cache cho câu hỏi; None nếu cache tắt hoặc câu trả lời phụ thuộc ngữ cảnh."""
+    if answer_cache is None:
+        return None
+    key = intent_router.signature(user_message)
+    if key is None:
+        answer_cache.record_bypass('context_or_incomplete')
+    return key
+
+async def answer_from_cache_async(user_message: str, user_id: str, cache_key):
+    with span('ask.answer_cache', **{'answer_cache.intent': cache_key.name}) as current:
+        reply = answer_cache.get(cache_key)
+        current.set_attribute('answer_cache.hit', reply is not None)
+    if reply is None:
+        return None
+    await _append_turn_async(user_id, user_message, reply)
+    logger.log('info', "📦 Answer cache hit", intent=cache_key.name)
+    return reply
+
+def _remember_answer(cache_key, response: str, tool_calls: list, elapsed: float):
+    # Chỉ cache khi agent thực sự gọi tool với đúng tham số trong khoá
+    if cache_key is None or not response:
+        return
+    deadline = current_deadline()
+    if deadline is not None and deadline.tripped: # Câu trả lời dở dang / fallback vì hết giờ
+        answer_cache.record_bypass('deadline')
+        return
+    if not intent_router.matches_tool_calls(cache_key, tool_calls):
+        answer_cache.record_bypass('tool_args_mismatch')
+        return
+    answer_cache.put(cache_key, response, elapsed)
+
+async def answer_async(user_message: str, user_id: str):
+    """Một lượt /ask: đường tắt -> answer cache -> agent."""
+    routed = await answer_fast_path_async(user_message, user_id)
+    if routed:
+        return routed.reply
+
+    cache_key = _answer_cache_key(user_message)
+    if cache_key:
+        cached = await answer_from_cache_async(user_message, user_id, cache_key)
+        if cached:
+            return cached
+
+    tool_calls = []
+    start = time.perf_counter()
+    async with agent_turn(user_message, user_id, tool_calls):
+        response = await run_agent_async(user_message, user_id, tool_calls)
+    _remember_answer(cache_key, response, tool_calls, time.perf_counter() - start)
+    return response
+
+async def run_agent_async(user_message: str, user_id: str, tool_calls: list = None):
+    # Runner/Gemini client dùng chung cho cả worker, không dựng lại mỗi request
+    runner = get_runtime(build_runtime).runner
+    start = time.perf_counter()
     
     adk_session = await get_or_create_session_async(user_id)
     
@@ -230,25 +437,171 @@ async def run_agent_async(user_message: str, user_id: str):
     )
     
     response_text = ""
-    async for event in runner.run_async(
-        user_id=user_id,
-        session_id=adk_session.id,
-        new_message=content
-    ):
-        # Log significant agent events
-        # Note: This might be noisy, can refine later
-        # logger.log('info', f"Agent Event", event_type=str(type(event))) 
-        
-        if hasattr(event, 'content') and event.content:
-            for part in event.content.parts:
-                if hasattr(part, 'text') and part.text:
-                    response_text += part.text
+    answered = False # Đã có câu trả lời cuối; sau đó runner chỉ còn chạy compaction
+    with span('agent.run', **{'app.user_id': user_id, 'agent.stream': False}):
+        try:
+            async with deadline_guard('agent.run'):
+                async for event in runner.run_async(
+                    user_id=user_id,
+                    session_id=adk_session.id,
+                    new_message=content
+                ):
+                    # Log significant agent events
+                    # Note: This might be noisy, can refine later
+                    # logger.log('info', f"Agent Event", event_type=str(type(event))) 
+                    
+                    record_event(event)
+                    if tool_calls is not None:
+                        tool_calls.extend((call.name, call.args or {}) for call in event.get_function_calls())
+
+                    if hasattr(event, 'content') and event.content:
+                        for part in event.content.parts:
+                            if hasattr(part, 'text') and part.text:
+                                response_text += part.text
+                    answered = answered or event.is_final_response()
+        except DeadlineExceeded:
+            if not answered:
+                raise
+            # Hết giờ lúc đang compaction: câu trả lời đã đủ, lần sau compaction chạy lại
     
+    intent_router.record_agent_latency(time.perf_counter() - start)
+    turn = current_turn()
     logger.log('info', "🤖 Agent completed response", 
                response_length=len(response_text),
+               **(turn.log_fields() if turn else {}),
+               tool_path=tool_path(tool_calls or []),
                full_response=response_text[:2000] + "..." if len(response_text) > 2000 else response_text) # Log full response (truncated safety)
     return response_text
 
+async def stream_agent_async(user_message: str, user_id: str):
+    """
+    Bản streaming của run_agent_async: yield (event, payload) ngay khi agent sinh ra.
+    - token: từng mẩu chữ (partial) của Gemini
+    - tool: tiến độ gọi công cụ (running/done)
+    - chart: dữ liệu biểu đồ lấy thẳng từ kết quả phan_tich_chi_so_khoa_hoc
+    - done: toàn bộ câu trả lời (để frontend tách block JSON biểu đồ)
+    """
+    routed = await answer_fast_path_async(user_message, user_id)
+    if routed:
+        yield 'token', {'text': routed.reply}
+        yield 'done', {'response': routed.reply}
+        return
+
+    cache_key = _answer_cache_key(user_message)
+    if cache_key:
+        cached = await answer_from_cache_async(user_message, user_id, cache_key)
+        if cached:
+            yield 'token', {'text': cached}
+            yield 'done', {'response': cached}
+            return
+
+    tool_calls = []
+    async with agent_turn(user_message, user_id, tool_calls) as turn:
+        runner = get_runtime(build_runtime).runner
+        start = time.perf_counter()
+        adk_session = await get_or_create_session_async(user_id)
+
+        content = types.Content(
+            role="user",
+            parts=[types.Part(text=user_message)]
+        )
+
+        response_text = ""
+        streamed = False # Lượt model hiện tại đã gửi partial chưa (tránh gửi trùng bản tổng hợp)
+        answered = False
+        with span('agent.run', **{'app.user_id': user_id, 'agent.stream': True}):
+            try:
+                async with deadline_guard('agent.run'):
+                    async for event in runner.run_async(
+                        user_id=user_id,
+                        session_id=adk_session.id,
+                        new_message=content,
+                        run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+                    ):
+                        record_event(event)
+                        for call in ([] if event.partial else event.get_function_calls()):
+                            tool_calls.append((call.name, call.args or {}))
+                            yield 'tool', {'name': call.name, 'status': 'running'}
+
+                        for result in event.get_function_responses():
+                            yield 'tool', {'name': result.name, 'status': 'done'}
+                            data = result.response or {}
+                            if data.get('chart_config'):
+                                yield 'chart', {'type': 'chart_data', 'nam_sinh': data.get('nam_sinh'), 'chart_config': data['chart_config']}
+
+                        if not (event.content and event.content.parts):
+                            continue
+                        text = "".join(part.text for part in event.content.parts if part.text and not part.thought)
+                        if event.partial:
+                            if text:
+                                streamed = True
+                                yield 'token', {'text': text}
+                            continue
+
+                        if text:
+                            if not streamed:
+                                yield 'token', {'text': text}
+                            response_text += text
+                        streamed = False
+                        answered = answered or event.is_final_response()
+            except DeadlineExceeded:
+                if not answered:
+                    raise
+
+    intent_router.record_agent_latency(time.perf_counter() - start)
+    _remember_answer(cache_key, response_text, tool_calls, time.perf_counter() - start)
+    logger.log('info', "🤖 Agent completed streamed response",
+               response_length=len(response_text),
+               **turn.log_fields(),
+               tool_path=tool_path(tool_calls),
+               full_response=response_text[:2000] + "..." if len(response_text) > 2000 else response_text)
+    yield 'done', {'response': response_text}
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def validate_user_message(data):
+    """Kiểm tra câu hỏi trong body JSON (dùng chung cho Flask và ASGI). Trả về (message, None) hoặc (None, lỗi)."""
+    if not isinstance(data, dict):
+        data = {}
+    user_message = data.get('message', '')
+
+    if not user_message or not isinstance(user_message, str):
+        return None, 'Vui lòng nhập câu hỏi'
+
+    # Security: Input Validation
+    if len(user_message) > 500:
+        return None, 'Câu hỏi dài quá, thầy đọc hông kịp. Con tóm tắt lại dưới 500 chữ nghen!'
+
+    # Security: Basic XSS/Injection sanitize (Mock)
+    return user_message.strip(), None
+
+def _read_user_message():
+    """Đọc + kiểm tra câu hỏi từ body JSON. Trả về (message, None) hoặc (None, error_response)."""
+    user_message, error = validate_user_message(request.get_json(silent=True))
+    if error:
+        return None, (jsonify({'error': error}), 400)
+    return user_message, None
+
+def _current_user_id():
+    user_id = session.get('user_id')
+    if not user_id:
+        user_id = str(uuid.uuid4())
+        session['user_id'] = user_id
+    return user_id
+
+# Return a friendly "Thầy Tư" style error message instead of the raw error
+FRIENDLY_ERROR = "Chà, thiên cơ lúc mờ lúc tỏ, hoặc là mạng mẽo nó cà chớn rồi. Con thông cảm hỏi lại dìa cái khác dùm Thầy nghen!"
+
+
+def busy_payload(e: Overloaded):
+    logger.log('warning', f"🚦 Agent busy, rejected: {e.reason}", reason=e.reason, retry_after=e.retry_after)
+    return {'error': BUSY_REPLY, 'retry_after': e.retry_after}
+
+def _busy_response(e: Overloaded):
+    resp = make_response(jsonify(busy_payload(e)), 503)
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp
 
 
 @app.route('/')
@@ -256,28 +609,18 @@ def index():
     return render_template('index.html')
 
 @app.route('/ask', methods=['POST'])
-@limiter.limit("20 per minute") # Anti-spam: 20 msg/min per IP
-async def ask():
+def ask():
     try:
-        data = request.get_json()
-        user_message = data.get('message', '')
+        user_message, error = _read_user_message()
+        if error:
+            return error
         
-        if not user_message:
-            return jsonify({'error': 'Vui lòng nhập câu hỏi'}), 400
+        user_id = _current_user_id()
         
-        # Security: Input Validation
-        if len(user_message) > 500:
-            return jsonify({'error': 'Câu hỏi dài quá, thầy đọc hông kịp. Con tóm tắt lại dưới 500 chữ nghen!'}), 400
-        
-        # Security: Basic XSS/Injection sanitize (Mock)
-        user_message = user_message.strip()
-        
-        user_id = session.get('user_id')
-        if not user_id:
-            user_id = str(uuid.uuid4())
-            session['user_id'] = user_id
-        
-        response = await run_agent_async(user_message, user_id)
+        # Chạy trên event loop nền của worker để tái sử dụng kết nối tới Gemini, trong deadline của request
+        with use_deadline(g.deadline):
+            response = agent_loop.run(answer_async(user_message, user_id),
+                                      timeout=g.deadline.remaining() + DEADLINE_GRACE)
         
         if not response:
             response = "Xin lỗi, thầy chưa thể trả lời lúc này. Bạn thử hỏi lại nhé!"
@@ -288,21 +631,118 @@ async def ask():
         resp.headers['X-Frame-Options'] = 'SAMEORIGIN'
         return resp
     
+    except Overloaded as e:
+        return _busy_response(e)
+    except TimeoutError as e: # DeadlineExceeded, hoặc hết DEADLINE_GRACE mà loop nền chưa trả
+        g.deadline.trip(getattr(e, 'stage', 'agent_loop'))
+        logger.log('warning', f"⏱️ Deadline exceeded in /ask: {e}", stage=g.deadline.tripped, deadline=REQUEST_DEADLINE)
+        return jsonify({'error': DEADLINE_REPLY}), 504
     except Exception as e:
         logger.log('error', f"❌ Exception in /ask: {e}", error=str(e), traceback=traceback.format_exc())
-        
-        # Return a friendly "Thầy Tư" style error message instead of the raw error
-        friendly_error = "Chà, thiên cơ lúc mờ lúc tỏ, hoặc là mạng mẽo nó cà chớn rồi. Con thông cảm hỏi lại dìa cái khác dùm Thầy nghen!"
-        return jsonify({'error': friendly_error}), 500
+        return jsonify({'error': FRIENDLY_ERROR}), 500
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Server-Sent Events: gửi chữ, tiến độ tool và biểu đồ ngay khi có, thay vì chờ hết lượt."""
+    user_message, error = _read_user_message()
+    if error:
+        return error
+
+    user_id = _current_user_id()
+    try:
+        admission.check_capacity() # Mở stream rồi thì không trả 503 được nữa -> từ chối sớm ở đây
+    except Overloaded as e:
+        return _busy_response(e)
+    request_span = trace.get_current_span() # Generator chạy sau khi view trả về -> mang span request theo
+    deadline = g.deadline
+
+    def generate():
+        with trace.use_span(request_span, end_on_exit=False), use_deadline(deadline):
+            try:
+                # Client ngắt -> Flask đóng generate() -> closing() đóng iterate() -> huỷ lượt agent trên loop nền
+                with closing(agent_loop.iterate(stream_agent_async(user_message, user_id))) as events:
+                    for event, payload in events:
+                        yield _sse(event, payload)
+            except Overloaded as e:
+                yield _sse('busy', busy_payload(e))
+            except DeadlineExceeded as e:
+                logger.log('warning', f"⏱️ Deadline exceeded in /ask/stream: {e}", stage=e.stage, deadline=REQUEST_DEADLINE)
+                yield _sse('error', {'error': DEADLINE_REPLY})
+            except Exception as e:
+                logger.log('error', f"❌ Exception in /ask/stream: {e}", error=str(e), traceback=traceback.format_exc())
+                yield _sse('error', {'error': FRIENDLY_ERROR})
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no' # Không cho proxy gom buffer
+    resp.headers['X-Content-Type-Options'] = 'nosniff'
+    resp.headers['X-Frame-Options'] = 'SAMEORIGIN'
+    return resp
+
+def health_payload():
+    payload = {'status': 'healthy', 'agent': 'Thầy Tư'}
+    payload['rate_limit'] = rate_limiter.stats()
+    payload['logging'] = logger.pipeline.stats()
+    if session_sweeper:
+        payload['sessions'] = session_sweeper.stats()
+    payload['search_cache'] = search_cache.stats()
+    payload['search_breaker'] = search_breaker.snapshot()
+    payload['fast_path'] = intent_router.stats()
+    payload['usage'] = usage_ledger.stats()
+    if answer_cache:
+        payload['answer_cache'] = answer_cache.stats()
+    payload['model'] = {**root_agent.model.stats(), 'routing': model_router.stats(),
+                        'escalations': model_tier_plugin.escalations}
+    payload['tool_reuse'] = tool_reuse.stats()
+    payload['admission'] = admission.stats()
+    return payload
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy', 'agent': 'Thầy Tư'})
+    return jsonify(health_payload())
+
+def refresh_scrape_gauges():
+    """Gauge đọc từ store dùng chung, cập nhật ngay lúc Prometheus scrape."""
+    if isinstance(session_service, SharedSqliteSessionService):
+        metrics.LIVE_SESSIONS.set(session_service.storage_stats()['live_sessions'])
+
+@app.route('/metrics')
+def prometheus_metrics():
+    body, content_type = metrics.render(refresh_scrape_gauges)
+    return Response(body, headers={'Content-Type': content_type})
+
+def usage_report(authorization, args):
+    """
+    Báo cáo token/chi phí cho /admin/usage (dùng chung cho Flask và ASGI). Trả về (status, body).
+    Chỉ bật khi có ADMIN_TOKEN, gọi kèm header `Authorization: Bearer <ADMIN_TOKEN>`.
+    Tham số: scope=all|day|user|tool_path, order=cost_usd|input_tokens|..., limit (tối đa 500).
+    """
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return 404, {'error': 'Not found'}
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), admin_token.encode()):
+        return 401, {'error': 'Unauthorized'}
+    try:
+        limit = min(max(int(args.get('limit', 50)), 1), 500)
+        return 200, usage_ledger.report(args.get('scope', 'user'), args.get('order', 'cost_usd'), limit)
+    except ValueError as e:
+        return 400, {'error': str(e)}
+
+@app.route('/admin/usage')
+def admin_usage():
+    status, body = usage_report(request.headers.get('Authorization'), request.args)
+    return jsonify(body), status
 
 @app.route('/reset', methods=['POST'])
 def reset_session():
     if 'user_id' in session:
-        del session['user_id']
+        user_id = session.pop('user_id')
+        # Xoá luôn lịch sử trong store thay vì để mồ côi chờ hết TTL
+        try:
+            agent_loop.run(session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=user_id))
+        except Exception as e:
+            logger.log('warning', f"⚠️ Could not delete session on reset: {e}", error=str(e))
     return jsonify({'status': 'reset', 'message': 'Phiên đã được làm mới'})
 
 if __name__ == '__main__':
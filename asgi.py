@@ -0,0 +1,249 @@
+"""
+Chế độ chạy ASGI (FastAPI) cho cùng các route của app.py.
+
+Mỗi worker giữ MỘT event loop suốt đời (của uvicorn): các lượt /ask chen nhau trên loop khi chờ
+Gemini / SQLite / tra cứu, không chiếm mỗi request một thread như Flask + gunicorn sync/gthread.
+Logic hỏi đáp (đường tắt, answer cache, agent), session store, logger đều dùng chung với app.py.
+
+Chạy:
+    gunicorn asgi:api -k uvicorn.workers.UvicornWorker -b 0.0.0.0:7860 --workers 2
+    uvicorn asgi:api --host 0.0.0.0 --port 7860
+"""
+import os
+import math
+import time
+import uuid
+import traceback
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from itsdangerous import BadSignature
+
+import app as flask_module
+from app import (APP_NAME, DEADLINE_REPLY, FRIENDLY_ERROR, QUIET_PREFIXES, RATE_LIMITED_ERROR, REQUEST_DEADLINE,
+                 admission, answer_async, busy_payload, close_runtime,
+                 health_payload, log_context, logger, metrics_route, rate_limit_route, rate_limiter,
+                 refresh_scrape_gauges, session_service, session_sweeper, stream_agent_async, usage_report,
+                 validate_user_message, _sse)
+from core import metrics
+from core.admission import Overloaded
+from core.deadline import Deadline, DeadlineExceeded, use_deadline
+from core.tracing import finish_request_span, start_request_span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SECURITY_HEADERS = {'X-Content-Type-Options': 'nosniff', 'X-Frame-Options': 'SAMEORIGIN'}
+
+
+# --- Session: đọc/ghi đúng cookie ký của Flask -> đổi qua lại giữa hai chế độ không mất phiên ---
+flask_app = flask_module.app
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+_SESSION_COOKIE = flask_app.config['SESSION_COOKIE_NAME']
+_SESSION_MAX_AGE = int(flask_app.permanent_session_lifetime.total_seconds())
+
+
+def _load_session(request: Request) -> dict:
+    cookie = request.cookies.get(_SESSION_COOKIE)
+    if not cookie:
+        return {}
+    try:
+        return dict(_session_serializer.loads(cookie, max_age=_SESSION_MAX_AGE))
+    except BadSignature:
+        return {}
+
+
+def _save_session(response, data: dict):
+    if data:
+        response.set_cookie(_SESSION_COOKIE, _session_serializer.dumps(data), httponly=True,
+                            samesite=flask_app.config['SESSION_COOKIE_SAMESITE'],
+                            secure=flask_app.config['SESSION_COOKIE_SECURE'])
+    else:
+        response.delete_cookie(_SESSION_COOKIE)
+
+
+def _current_user_id(request: Request) -> str:
+    session = request.state.session
+    if not session.get('user_id'):
+        session['user_id'] = str(uuid.uuid4())
+        request.state.session_modified = True
+    return session['user_id']
+
+
+@asynccontextmanager
+async def lifespan(_api):
+    yield
+    # Runner/Gemini client của worker gắn với loop này -> đóng trên chính loop này
+    await close_runtime()
+
+
+api = FastAPI(title="Thầy Tư Online", docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
+api.mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static')
+
+
+# --- Middleware: session + trace_id + log giống before_request/after_request của Flask ---
+@api.middleware('http')
+async def request_context(request: Request, call_next):
+    if session_sweeper:
+        session_sweeper.ensure_started()
+    path = request.url.path
+    if path.startswith(QUIET_PREFIXES):
+        return await call_next(request)
+
+    start = time.time()
+    request.state.deadline = deadline = Deadline(REQUEST_DEADLINE)
+    request.state.session = _load_session(request)
+    request.state.session_modified = False
+    trace_id = request.headers.get('X-Trace-Id', str(uuid.uuid4()))
+    token = log_context.set({'trace_id': trace_id, 'user_id': request.state.session.get('user_id', 'anonymous')})
+    otel_span, otel_token = start_request_span(request.method, path, request.headers, trace_id)
+    metric_route = metrics_route(path)
+    metrics.request_started(metric_route)
+    status, error = None, None
+    try:
+        body = None
+        if path in ('/ask', '/ask/stream'):
+            try:
+                body = await request.json()
+            except ValueError:
+                pass
+        logger.log('info', f"▶️ Incoming {request.method} {path}", path=path, method=request.method, request_body=body)
+
+        # Cùng token bucket (SQLite dùng chung) với bản Flask
+        route = rate_limit_route(path)
+        wait = rate_limiter.check(route, request.client.host if request.client else 'unknown') if route else 0
+        if wait:
+            response = JSONResponse({'error': RATE_LIMITED_ERROR}, status_code=429,
+                                    headers={'Retry-After': str(math.ceil(wait))})
+        else:
+            response = await call_next(request)
+        if request.state.session_modified:
+            _save_session(response, request.state.session)
+
+        status = response.status_code
+        level = 'error' if status >= 500 else 'warning' if status >= 400 else 'info'
+        logger.log(level, f"⏹️ Completed {request.method} {path} [{status}]",
+                   path=path, method=request.method, status=status, duration=round(time.time() - start, 4),
+                   ip=request.headers.get('X-Forwarded-For', request.client.host if request.client else None),
+                   user_agent=request.headers.get('User-Agent'))
+        return response
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        finish_request_span(otel_span, otel_token, status, error)
+        # /ask/stream: response trả về lúc bắt đầu stream -> ở chế độ ASGI đo tới lúc gửi header
+        metrics.request_finished(metric_route, request.method, status or 500, time.time() - start)
+        if deadline.tripped:
+            metrics.record_deadline(deadline.tripped)
+        log_context.reset(token)
+
+
+async def _read_user_message(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    user_message, error = validate_user_message(data)
+    if error:
+        return None, JSONResponse({'error': error}, status_code=400)
+    return user_message, None
+
+
+def _busy_response(e: Overloaded):
+    return JSONResponse(busy_payload(e), status_code=503, headers={'Retry-After': str(e.retry_after)})
+
+
+# --- Routes (giống app.py) ---
+@api.get('/')
+async def index():
+    return FileResponse(os.path.join(BASE_DIR, 'templates', 'index.html'))
+
+
+@api.post('/ask')
+async def ask(request: Request):
+    try:
+        user_message, error = await _read_user_message(request)
+        if error:
+            return error
+
+        # Chạy thẳng trên loop của worker, không cần đẩy sang loop nền như bản Flask
+        with use_deadline(request.state.deadline):
+            response = await answer_async(user_message, _current_user_id(request))
+        if not response:
+            response = "Xin lỗi, thầy chưa thể trả lời lúc này. Bạn thử hỏi lại nhé!"
+        return JSONResponse({'response': response}, headers=SECURITY_HEADERS)
+
+    except Overloaded as e:
+        return _busy_response(e)
+    except DeadlineExceeded as e:
+        logger.log('warning', f"⏱️ Deadline exceeded in /ask: {e}", stage=e.stage, deadline=REQUEST_DEADLINE)
+        return JSONResponse({'error': DEADLINE_REPLY}, status_code=504)
+    except Exception as e:
+        logger.log('error', f"❌ Exception in /ask: {e}", error=str(e), traceback=traceback.format_exc())
+        return JSONResponse({'error': FRIENDLY_ERROR}, status_code=500)
+
+
+@api.post('/ask/stream')
+async def ask_stream(request: Request):
+    """Server-Sent Events: như /ask/stream của Flask; client ngắt thì generator bị huỷ theo."""
+    user_message, error = await _read_user_message(request)
+    if error:
+        return error
+    user_id = _current_user_id(request)
+    try:
+        admission.check_capacity() # Mở stream rồi thì không trả 503 được nữa -> từ chối sớm ở đây
+    except Overloaded as e:
+        return _busy_response(e)
+    deadline = request.state.deadline
+
+    async def generate():
+        try:
+            with use_deadline(deadline):
+                async for event, payload in stream_agent_async(user_message, user_id):
+                    yield _sse(event, payload)
+        except Overloaded as e:
+            yield _sse('busy', busy_payload(e))
+        except DeadlineExceeded as e:
+            logger.log('warning', f"⏱️ Deadline exceeded in /ask/stream: {e}", stage=e.stage, deadline=REQUEST_DEADLINE)
+            yield _sse('error', {'error': DEADLINE_REPLY})
+        except Exception as e:
+            logger.log('error', f"❌ Exception in /ask/stream: {e}", error=str(e), traceback=traceback.format_exc())
+            yield _sse('error', {'error': FRIENDLY_ERROR})
+        finally:
+            if deadline.tripped: # Middleware đã xong từ lúc gửi header -> tự đếm ở đây
+                metrics.record_deadline(deadline.tripped)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **SECURITY_HEADERS}
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=headers)
+
+
+@api.get('/health')
+async def health():
+    return JSONResponse(health_payload())
+
+
+@api.get('/metrics')
+async def prometheus_metrics():
+    body, content_type = metrics.render(refresh_scrape_gauges)
+    return Response(body, headers={'Content-Type': content_type})
+
+
+@api.get('/admin/usage')
+async def admin_usage(request: Request):
+    status, body = usage_report(request.headers.get('authorization'), request.query_params)
+    return JSONResponse(body, status_code=status)
+
+
+@api.post('/reset')
+async def reset_session(request: Request):
+    session = request.state.session
+    if 'user_id' in session:
+        user_id = session.pop('user_id')
+        request.state.session_modified = True
+        # Xoá luôn lịch sử trong store thay vì để mồ côi chờ hết TTL
+        try:
+            await session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=user_id)
+        except Exception as e:
+            logger.log('warning', f"⚠️ Could not delete session on reset: {e}", error=str(e))
+    return JSONResponse({'status': 'reset', 'message': 'Phiên đã được làm mới'})
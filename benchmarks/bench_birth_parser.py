@@ -0,0 +1,107 @@
+"""
+Kiểm tra + đo tốc độ bộ tách ngày sinh (agent.birth_parser.parse_birth).
+
+1. Đối chiếu corpus benchmarks/fixtures/birth_inputs.jsonl (kết quả chuẩn lấy từ
+   _chuan_hoa_nam_sinh/_chuan_hoa_ngay_sinh cũ; dòng có "age" thì năm = năm nay - tuổi + 1).
+2. So throughput khi tách cùng một lượng thông tin (năm sinh, ngày sinh đầy đủ, ngày/tháng):
+   cách cũ quét lại nhiều lượt bằng các regex rời, parse_birth quét một lượt (+ LRU cho câu lặp lại).
+
+Chạy: python -m benchmarks.bench_birth_parser [so_vong]
+"""
+import os
+import re
+import sys
+import json
+import time
+import datetime
+
+from agent.birth_parser import parse_birth, _parse
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "birth_inputs.jsonl")
+
+
+def load_corpus():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# --- Cách cũ (giữ nguyên từ agent.py trước khi có birth_parser) ---
+def _legacy_nam_sinh(text_input):
+    text = str(text_input).lower().strip()
+    current_year = datetime.datetime.now().year
+    match_4 = re.search(r'\b(19|20)\d{2}\b', text)
+    if match_4: return int(match_4.group(0))
+    match_2k = re.search(r'\b2k(\d*)\b', text)
+    if match_2k:
+        suffix = match_2k.group(1)
+        return 2000 if suffix == "" else 2000 + int(suffix)
+    match_tuoi = re.search(r'(\d{1,3})\s*(tuổi|t)', text)
+    if match_tuoi:
+        tuoi = int(match_tuoi.group(1))
+        if 0 < tuoi < 120:
+            return current_year - tuoi + 1
+    match_2 = re.search(r'\b\d{2}\b', text)
+    if match_2:
+        val = int(match_2.group(0))
+        if 10 < val <= 99:
+            return 1900 + val if val > 40 else 2000 + val
+    return None
+
+
+def _legacy_ngay_sinh(text_input):
+    text = str(text_input).lower().strip()
+    match = re.search(r'\b(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{4})\b', text)
+    if match:
+        return f"{match.group(1)}/{match.group(2)}/{match.group(3)}"
+    return None
+
+
+def _legacy_ngay_thang(text_input):
+    # Nhánh dự phòng dd/mm của xem_cung_hoang_dao_tool cũ
+    match = re.search(r'\b(\d{1,2})[\/\-\.](\d{1,2})\b', text_input)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def kiem_tra_corpus(corpus):
+    current_year = datetime.datetime.now().year
+    for row in corpus:
+        record = parse_birth(row["input"])
+        expected_year = current_year - row["age"] + 1 if "age" in row else row["year"]
+        assert record.year == expected_year, (row, record)
+        assert record.ngay_sinh == row["ngay_sinh"], (row, record)
+    print(f"OK: {len(corpus)} câu trong corpus khớp kết quả cũ")
+
+
+def main(rounds=2000):
+    corpus = load_corpus()
+    kiem_tra_corpus(corpus)
+    inputs = [row["input"] for row in corpus] * rounds
+
+    start = time.perf_counter()
+    for text in inputs:
+        _legacy_nam_sinh(text)
+        _legacy_ngay_sinh(text)
+        _legacy_ngay_thang(text)
+    legacy = time.perf_counter() - start
+
+    # Không qua LRU: đo đúng chi phí một lượt quét
+    current_year = datetime.datetime.now().year
+    start = time.perf_counter()
+    for text in inputs:
+        _parse(text, current_year)
+    single = time.perf_counter() - start
+
+    # Qua LRU: router, answer cache và tool cùng parse một câu trong một lượt hỏi
+    start = time.perf_counter()
+    for text in inputs:
+        parse_birth(text)
+    cached = time.perf_counter() - start
+
+    for label, elapsed in (("cũ (năm + ngày + dd/mm, 3 hàm)", legacy), ("một lượt quét (không cache)", single),
+                           ("parse_birth (có LRU)", cached)):
+        print(f"{label:<34} {len(inputs) / elapsed:12,.0f} câu/s  ({elapsed / len(inputs) * 1e6:.2f}µs/câu)  "
+              f"x{legacy / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
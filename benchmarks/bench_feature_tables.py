@@ -0,0 +1,224 @@
+"""
+Kiểm tra + đo tốc độ các bảng dựng sẵn của cung hoàng đạo, số chủ đạo và thần số học.
+
+1. Đối chiếu kết quả với cách tính cũ (dò khoảng ngày tuần tự, cộng chữ số qua chuỗi) trên
+   mọi ngày 1900-2100, cộng thêm các ngày không có thật (0/5, 31/4, 45/13...).
+2. So throughput khi gọi thẳng hàm tính (không qua parse_birth). Cách cũ ở đây đã bỏ phần dựng lại
+   dict dữ liệu mỗi lần gọi, nên mức chênh đo được là cận dưới.
+
+Chạy: python -m benchmarks.bench_feature_tables [so_vong]
+"""
+import sys
+import time
+import datetime
+
+from agent.birth_parser import BirthRecord
+from agent.feature_zodiac import xem_cung_hoang_dao
+from agent.feature_life_path import tinh_con_so_chu_dao, _DESCRIPTIONS
+from agent.feature_numerology import luan_giai_than_so_hoc, _PY_MEANINGS
+
+
+# --- Cách cũ (giữ nguyên thuật toán trước khi có bảng dựng sẵn) ---
+# Chép nguyên dữ liệu + vòng dò khoảng ngày của xem_cung_hoang_dao bản gốc, KHÔNG dùng gì từ
+# agent.feature_zodiac - để đối chiếu thật với code cũ chứ không phải với chính nguồn dựng bảng
+_LEGACY_ZODIAC_DB = {
+    "BachDuong": {
+        "name": "Bạch Dương (Aries)", "icon": "♈",
+        "range": ((3, 21), (4, 19)),
+        "element": "Lửa", "planet": "Sao Hỏa",
+        "traits": "Lãnh đạo, dũng cảm, nhiệt huyết, nhưng đôi khi nóng tính và bốc đồng.",
+        "match": ["Sư Tử", "Nhân Mã"], "clash": ["Thiên Bình"]
+    },
+    "KimNguu": {
+        "name": "Kim Ngưu (Taurus)", "icon": "♉",
+        "range": ((4, 20), (5, 20)),
+        "element": "Đất", "planet": "Sao Kim",
+        "traits": "Điềm tĩnh, thực tế, kiên định. Thích tiền tài và đồ ăn ngon. Hơi bướng bỉnh.",
+        "match": ["Xử Nữ", "Ma Kết"], "clash": ["Bọ Cạp"]
+    },
+    "SongTu": {
+        "name": "Song Tử (Gemini)", "icon": "♊",
+        "range": ((5, 21), (6, 21)),
+        "element": "Khí", "planet": "Sao Thủy",
+        "traits": "Thông minh, linh hoạt, giao tiếp giỏi. Sáng nắng chiều mưa, hay thay đổi.",
+        "match": ["Thiên Bình", "Bảo Bình"], "clash": ["Nhân Mã"]
+    },
+    "CuGiai": {
+        "name": "Cự Giải (Cancer)", "icon": "♋",
+        "range": ((6, 22), (7, 22)),
+        "element": "Nước", "planet": "Mặt Trăng",
+        "traits": "Nhạy cảm, sống tình cảm, yêu gia đình. Trực giác tốt nhưng hay suy diễn.",
+        "match": ["Bọ Cạp", "Song Ngư"], "clash": ["Ma Kết"]
+    },
+    "SuTu": {
+        "name": "Sư Tử (Leo)", "icon": "♌",
+        "range": ((7, 23), (8, 22)),
+        "element": "Lửa", "planet": "Mặt Trời",
+        "traits": "Tự tin, hào phóng, có tố chất lãnh đạo. Thích được khen ngợi và là trung tâm.",
+        "match": ["Bạch Dương", "Nhân Mã"], "clash": ["Bảo Bình"]
+    },
+    "XuNu": {
+        "name": "Xử Nữ (Virgo)", "icon": "♍",
+        "range": ((8, 23), (9, 22)),
+        "element": "Đất", "planet": "Sao Thủy",
+        "traits": "Tỉ mỉ, cầu toàn, phân tích sắc bén. Chăm chỉ nhưng hay soi mói.",
+        "match": ["Kim Ngưu", "Ma Kết"], "clash": ["Song Ngư"]
+    },
+    "ThienBinh": {
+        "name": "Thiên Bình (Libra)", "icon": "♎",
+        "range": ((9, 23), (10, 23)),
+        "element": "Khí", "planet": "Sao Kim",
+        "traits": "Thanh lịch, công bằng, yêu cái đẹp. Giỏi ngoại giao nhưng hay do dự.",
+        "match": ["Song Tử", "Bảo Bình"], "clash": ["Bạch Dương"]
+    },
+    "BoCap": {
+        "name": "Bọ Cạp (Scorpio)", "icon": "♏",
+        "range": ((10, 24), (11, 21)),
+        "element": "Nước", "planet": "Sao Diêm Vương",
+        "traits": "Bí ẩn, sâu sắc, quyết đoán. Nội tâm phức tạp và hay ghen.",
+        "match": ["Cự Giải", "Song Ngư"], "clash": ["Kim Ngưu"]
+    },
+    "NhanMa": {
+        "name": "Nhân Mã (Sagittarius)", "icon": "♐",
+        "range": ((11, 22), (12, 21)),
+        "element": "Lửa", "planet": "Sao Mộc",
+        "traits": "Lạc quan, yêu tự do, thích phiêu lưu. Thẳng thắn đến mức vô tâm.",
+        "match": ["Bạch Dương", "Sư Tử"], "clash": ["Song Tử"]
+    },
+    "MaKet": {
+        "name": "Ma Kết (Capricorn)", "icon": "♑",
+        "range": ((12, 22), (1, 19)),
+        "element": "Đất", "planet": "Sao Thổ",
+        "traits": "Nghiêm túc, tham vọng, có trách nhiệm. Thực tế nhưng hơi khô khan.",
+        "match": ["Kim Ngưu", "Xử Nữ"], "clash": ["Cự Giải"]
+    },
+    "BaoBinh": {
+        "name": "Bảo Bình (Aquarius)", "icon": "♒",
+        "range": ((1, 20), (2, 18)),
+        "element": "Khí", "planet": "Sao Thiên Vương",
+        "traits": "Sáng tạo, độc lập, tư duy khác biệt. Thân thiện nhưng khó nắm bắt.",
+        "match": ["Song Tử", "Thiên Bình"], "clash": ["Sư Tử"]
+    },
+    "SongNgu": {
+        "name": "Song Ngư (Pisces)", "icon": "♓",
+        "range": ((2, 19), (3, 20)),
+        "element": "Nước", "planet": "Sao Hải Vương",
+        "traits": "Mơ mộng, lãng mạn, giàu lòng trắc ẩn. Nhạy cảm nghệ sĩ.",
+        "match": ["Cự Giải", "Bọ Cạp"], "clash": ["Xử Nữ"]
+    }
+}
+
+
+def _legacy_zodiac(day, month):
+    found_sign = None
+    for key, data in _LEGACY_ZODIAC_DB.items():
+        (start_month, start_day) = data['range'][0]
+        (end_month, end_day) = data['range'][1]
+
+        # Logic check date range carefully (including year wrap for Capricorn)
+        is_match = False
+        if start_month == end_month:
+            if month == start_month and start_day <= day <= end_day: is_match = True
+        elif start_month < end_month:
+            if (month == start_month and day >= start_day) or (month == end_month and day <= end_day):
+                is_match = True
+        else: # Wrap around year (Capricorn: Dec to Jan)
+            if (month == start_month and day >= start_day) or (month == end_month and day <= end_day):
+                is_match = True
+
+        if is_match:
+            found_sign = data
+            break
+
+    if not found_sign:
+        return {"status": "error", "message": "Ngày sinh này lạ quá, thầy tìm không ra chòm sao."}
+
+    msg = (
+        f"🌟 **Cung Hoàng Đạo**: {found_sign['icon']} **{found_sign['name']}**\n"
+        f"- **Nguyên tố**: {found_sign['element']} | **Sao chiếu mệnh**: {found_sign['planet']}\n"
+        f"- **Tính cách**: {found_sign['traits']}\n"
+        f"- **Hợp**: {', '.join(found_sign['match'])} | **Khắc**: {', '.join(found_sign['clash'])}"
+    )
+    return {"status": "success", "zodiac": found_sign['name'], "message": msg}
+
+
+def _legacy_reduce(n, keep_master=False):
+    while n > 9:
+        if keep_master and n in [11, 22, 33]: break
+        n = sum(int(x) for x in str(n))
+    return n
+
+
+def _legacy_life_path(day, month, year):
+    so = _legacy_reduce(sum(int(d) for d in f"{day}{month}{year}"), keep_master=True)
+    description = _DESCRIPTIONS.get(so)
+    return {"status": "success", "so_chu_dao": so,
+            "message": f"🔢 **Số Chủ Đạo (Life Path)**: Số **{so}**\n\n👉 {description}"}
+
+
+def _legacy_numerology(d, m, y):
+    lp = _legacy_reduce(sum(int(x) for x in str(d) + str(m) + str(y)), keep_master=True)
+    att = _legacy_reduce(d + m)
+    cur_year = datetime.datetime.now().year
+    py = _legacy_reduce(d + m + cur_year)
+    return {
+        "status": "success",
+        "message": (
+            f"📐 **Hồ Sơ Thần Số Học (Pythagoras)**\n"
+            f"────────────────────────\n"
+            f"🔹 **Số Chủ Đạo: {lp}**\n"
+            f"   (Con số định hướng cả cuộc đời bạn)\n\n"
+            f"🔹 **Số Thái Độ: {att}**\n"
+            f"   (Cách bạn phản ứng với thế giới: {'Quyết liệt' if att in [1,8] else 'Hòa nhã' if att in [2,6,9] else 'Sôi nổi'})\n\n"
+            f"🔹 **Năm Cá Nhân {cur_year}: Số {py}**\n"
+            f"   💡 *Lời khuyên:* {_PY_MEANINGS.get(py)}"
+        )
+    }
+
+
+def _record(day, month, year):
+    return BirthRecord(day=day, month=month, date_year=year)
+
+
+def kiem_tra_tuong_duong():
+    # Ngày/tháng: parse_birth nhận tới 2 chữ số nên thử cả 0..99 (gồm mọi ngày/tháng sai như 0/5, 32/13, 31/4)
+    for month in range(100):
+        for day in range(100):
+            record = BirthRecord(partial_day=day, partial_month=month)
+            assert xem_cung_hoang_dao(record) == _legacy_zodiac(day, month), (day, month)
+    dates = 0
+    for year in list(range(1900, 2101)) + [1000, 1899, 2101, 2999, 9999]:
+        for month in range(0, 14):
+            for day in range(0, 33):
+                record = _record(day, month, year)
+                assert tinh_con_so_chu_dao(record) == _legacy_life_path(day, month, year), (day, month, year)
+                assert luan_giai_than_so_hoc(record) == _legacy_numerology(day, month, year), (day, month, year)
+                dates += 1
+    print(f"OK: 10,000 cặp ngày/tháng (cung, so với vòng dò khoảng ngày gốc) và {dates:,} ngày (số chủ đạo, thần số học) khớp cách cũ")
+
+
+def _do(fn, inputs):
+    start = time.perf_counter()
+    for args in inputs:
+        fn(*args)
+    return time.perf_counter() - start
+
+
+def main(rounds=20):
+    kiem_tra_tuong_duong()
+    dates = [(d, m, y) for y in range(1950, 2011, 3) for m in range(1, 13) for d in range(1, 29)] * rounds
+    records = [(_record(d, m, y),) for d, m, y in dates]
+
+    for label, legacy_fn, new_fn in (
+        ("cung hoàng đạo", lambda d, m, y: _legacy_zodiac(d, m), xem_cung_hoang_dao),
+        ("số chủ đạo", _legacy_life_path, tinh_con_so_chu_dao),
+        ("thần số học", _legacy_numerology, luan_giai_than_so_hoc),
+    ):
+        legacy = _do(legacy_fn, dates)
+        new = _do(new_fn, records)
+        print(f"{label:<16} cũ {legacy / len(dates) * 1e6:6.2f}µs  bảng dựng sẵn {new / len(dates) * 1e6:6.2f}µs  "
+              f"x{legacy / new:.1f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
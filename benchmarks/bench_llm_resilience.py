@@ -0,0 +1,82 @@
+"""
+Đo ResilientLlm với model giả (ReplayLlm, độ trễ log-chuẩn đuôi dài như Gemini thật):
+  1. Hedging: p50/p99 của từng lần gọi model khi tắt / bật hedge ở p90, và số bản sao phải gửi thêm.
+  2. Retry: tỉ lệ lỗi 503 giả lập -> bao nhiêu lần gọi vẫn thành công, tốn bao nhiêu lần gọi lại.
+
+Chạy: python -m benchmarks.bench_llm_resilience [so_lan_goi]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench-dummy-key")
+
+from google.adk.models import LlmRequest
+from google.genai import types
+from google.genai.errors import ServerError
+
+from core.replay_llm import DEFAULT_CASSETTE, ReplayLlm
+from core.resilient_llm import LlmRetryPolicy, ResilientLlm
+
+LATENCY = "lognormal:-3,1" # median ~50ms, đuôi dài
+QUESTION = "sao hạn năm nay của nam 1990"
+
+
+class FlakyLlm(ReplayLlm):
+    """ReplayLlm trả 503 với xác suất `error_rate` (trước khi gửi phản hồi nào)."""
+    error_rate: float = 0.0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        if random.random() < self.error_rate:
+            raise ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+
+def _request():
+    return LlmRequest(contents=[types.Content(role="user", parts=[types.Part(text=QUESTION)])])
+
+
+async def _run(llm, n):
+    latencies, failures = [], 0
+    request = _request()
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            [r async for r in llm.generate_content_async(request)]
+        except ServerError:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies, failures
+
+
+def _build(policy, error_rate=0.0):
+    inner = FlakyLlm(model="gemini-2.5-flash", cassette_path=DEFAULT_CASSETTE, latency=LATENCY, error_rate=error_rate)
+    return ResilientLlm(model="gemini-2.5-flash", inner=inner, policy=policy)
+
+
+def main(n=400):
+    random.seed(0)
+    print(f"{n} lần gọi model, độ trễ {LATENCY}\n")
+    print(f"{'cấu hình':<28} {'p50':>8} {'p99':>8} {'max':>8} {'bản sao':>8} {'sao thắng':>9}")
+    for name, policy in (("không hedge", LlmRetryPolicy()), ("hedge sau p90", LlmRetryPolicy(hedge_percentile=90))):
+        llm = _build(policy)
+        lat, _ = asyncio.run(_run(llm, n))
+        stats = llm.stats()
+        print(f"{name:<28} {lat[len(lat) // 2] * 1000:>6.0f}ms {lat[int(len(lat) * 0.99)] * 1000:>6.0f}ms "
+              f"{lat[-1] * 1000:>6.0f}ms {stats['hedges']:>8} {stats['hedge_wins']:>9}")
+
+    print(f"\n{'lỗi 503 giả lập':<28} {'thất bại':>8} {'gọi lại':>8} {'bỏ cuộc':>8} {'p99':>8}")
+    for error_rate in (0.05, 0.2, 0.5):
+        llm = _build(LlmRetryPolicy(base_delay=0.01, max_delay=0.05), error_rate)
+        lat, failures = asyncio.run(_run(llm, n))
+        stats = llm.stats()
+        print(f"{error_rate:<28.0%} {failures:>8} {stats['retries']:>8} {stats['gave_up']:>8} "
+              f"{lat[int(len(lat) * 0.99)] * 1000:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
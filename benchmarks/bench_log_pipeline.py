@@ -0,0 +1,111 @@
+"""
+So pipeline log mới (hàng đợi có trần, gửi theo lô) với cách cũ (ThreadPoolExecutor 1 thread,
+hàng đợi không trần, mỗi bản ghi một lần gọi API) khi có một đợt log dồn dập.
+
+Sink giả lập Cloud Logging: mỗi lần gọi API tốn `CALL_MS` (khứ hồi mạng) + một chút cho mỗi bản ghi.
+Báo: thời gian phía request (submit), RAM đỉnh, thời gian tới khi gửi xong, số bản ghi gửi/bỏ.
+
+Chạy: python -m benchmarks.bench_log_pipeline [so_ban_ghi] [so_thread]
+"""
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from core.log_pipeline import LogPipeline, LogPolicy
+
+CALL_MS = 0.5
+RECORD_US = 2
+
+
+class FakeCloudApi:
+    def __init__(self):
+        self.calls = 0
+        self.records = 0
+
+    def write(self, entries):
+        time.sleep(CALL_MS / 1000 + RECORD_US * len(entries) / 1e6)
+        for entry in entries:
+            json.dumps(entry, ensure_ascii=False, default=str)
+        self.calls += 1
+        self.records += len(entries)
+
+
+def _payload(i):
+    return {"project": "thay-tu-online", "trace_id": f"trace-{i}", "user_id": "u-1",
+            "path": "/ask", "method": "POST", "status": 200, "duration": 0.123}
+
+
+def _burst(submit, n, threads):
+    def producer(start):
+        for i in range(start, n, threads):
+            submit("warning" if i % 50 == 0 else "info", f"⏹️ Completed POST /ask [200] #{i}", _payload(i))
+
+    workers = [threading.Thread(target=producer, args=(t,)) for t in range(threads)]
+    begin = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - begin
+
+
+def run_legacy(n, threads):
+    api = FakeCloudApi()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def worker(level, payload_json, message):
+        api.write([payload_json])
+
+    def submit(level, message, payload):
+        executor.submit(worker, level, json.dumps(payload, ensure_ascii=False), message)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    submit_s = _burst(submit, n, threads)
+    _, peak = tracemalloc.get_traced_memory()
+    queued = executor._work_queue.qsize()
+    executor.shutdown(wait=True)
+    drain_s = time.perf_counter() - start
+    tracemalloc.stop()
+    return {"submit_s": submit_s, "peak_mb": peak / 2**20, "queued_after_burst": queued,
+            "drain_s": drain_s, "delivered": api.records, "dropped": n - api.records, "api_calls": api.calls}
+
+
+def run_pipeline(n, threads, policy):
+    api = FakeCloudApi()
+    pipeline = LogPipeline(lambda batch: api.write([{"message": m, **p} for _, _, m, p in batch]), policy)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    submit_s = _burst(pipeline.submit, n, threads)
+    _, peak = tracemalloc.get_traced_memory()
+    queued = pipeline.stats()["queued"]
+    pipeline.close(timeout=60)
+    drain_s = time.perf_counter() - start
+    tracemalloc.stop()
+    stats = pipeline.stats()
+    dropped = stats["sampled_out"] + stats["dropped_pressure"] + stats["dropped_full"] + stats["dropped_sink"]
+    return {"submit_s": submit_s, "peak_mb": peak / 2**20, "queued_after_burst": queued,
+            "drain_s": drain_s, "delivered": api.records, "dropped": dropped, "api_calls": api.calls}
+
+
+def main(n=20000, threads=4):
+    print(f"Đợt {n:,} bản ghi từ {threads} thread, mỗi lần gọi API {CALL_MS}ms + {RECORD_US}µs/bản ghi\n")
+    rows = [
+        ("cũ: executor, 1 bản ghi/lần gọi", run_legacy(n, threads)),
+        ("mới: lô 200, hàng đợi 10k", run_pipeline(n, threads, LogPolicy())),
+        ("mới: hàng đợi 2k, lấy mẫu info 25%", run_pipeline(n, threads, LogPolicy(max_queue=2000, info_sample_rate=0.25))),
+    ]
+    print(f"{'cấu hình':<38} {'submit':>8} {'RAM đỉnh':>9} {'tồn đọng':>9} {'gửi xong':>9} "
+          f"{'đã gửi':>8} {'bỏ':>7} {'gọi API':>8}")
+    for name, r in rows:
+        print(f"{name:<38} {r['submit_s']:>7.2f}s {r['peak_mb']:>7.1f}MB {r['queued_after_burst']:>9,} "
+              f"{r['drain_s']:>8.2f}s {r['delivered']:>8,} {r['dropped']:>7,} {r['api_calls']:>8,}")
+        assert r["delivered"] + r["dropped"] == n, r
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,70 @@
+"""
+Đo chi phí kiểm tra rate limit (token bucket) và kiểm tra ngân sách được chia sẻ đúng giữa các process.
+
+1. Throughput một process: SqliteBucketStore (dùng chung giữa worker) so với MemoryBucketStore.
+2. N process cùng bắn vào một file SQLite với cùng một IP: tổng số lượt được cho qua phải bằng đúng
+   dung lượng bucket (không nhân lên theo số worker như Flask-Limiter memory:// trước đây),
+   và throughput gộp khi nhiều worker cùng kiểm tra.
+
+Chạy: python -m benchmarks.bench_rate_limit [so_lan_kiem_tra] [so_process]
+"""
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+from core.rate_limit import Budget, MemoryBucketStore, RateLimiter, SqliteBucketStore
+
+
+def _throughput(limiter, n):
+    clients = [f"10.0.{i // 256}.{i % 256}" for i in range(5000)]
+    start = time.perf_counter()
+    for i in range(n):
+        limiter.check("ask", clients[i % len(clients)])
+    return n / (time.perf_counter() - start)
+
+
+def _worker(db_path, n, start_at, results):
+    limiter = RateLimiter(SqliteBucketStore(db_path), routes={"ask": Budget.parse("20 per minute")})
+    while time.time() < start_at:
+        time.sleep(0.001)
+    allowed = 0
+    begin = time.perf_counter()
+    for i in range(n):
+        # Nửa lượt cùng một IP (kiểm tra chia sẻ ngân sách), nửa lượt rải nhiều IP (đo throughput)
+        if i % 2 == 0:
+            allowed += limiter.check("ask", "203.0.113.7") == 0
+        else:
+            limiter.check("ask", f"10.{os.getpid() % 256}.{i // 256 % 256}.{i % 256}")
+    results.put((allowed, n / (time.perf_counter() - begin)))
+
+
+def main(n=20000, processes=4):
+    with tempfile.TemporaryDirectory() as tmp:
+        budget = {"ask": Budget.parse("20 per minute")}
+        sqlite_rate = _throughput(RateLimiter(SqliteBucketStore(os.path.join(tmp, "single.db")), routes=budget), n)
+        memory_rate = _throughput(RateLimiter(MemoryBucketStore(), routes=budget), n)
+        print(f"1 process, SQLite   {sqlite_rate:12,.0f} lượt kiểm tra/s  ({1e6 / sqlite_rate:.1f}µs/lượt)")
+        print(f"1 process, RAM      {memory_rate:12,.0f} lượt kiểm tra/s  ({1e6 / memory_rate:.1f}µs/lượt)")
+
+        db_path = os.path.join(tmp, "shared.db")
+        SqliteBucketStore(db_path) # Tạo bảng trước khi các process cùng mở
+        results = multiprocessing.Queue()
+        start_at = time.time() + 0.5
+        procs = [multiprocessing.Process(target=_worker, args=(db_path, n, start_at, results)) for _ in range(processes)]
+        for p in procs:
+            p.start()
+        stats = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        allowed = sum(a for a, _ in stats)
+        total_rate = sum(r for _, r in stats)
+        print(f"{processes} process, SQLite {total_rate:12,.0f} lượt kiểm tra/s gộp")
+        # Cả lượt chạy chỉ vài giây -> bucket hồi thêm tối đa vài token
+        assert 20 <= allowed <= 25, allowed
+        print(f"OK: cùng một IP từ {processes} process chỉ được {allowed} lượt (ngân sách 20/phút dùng chung)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
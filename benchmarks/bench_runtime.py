@@ -0,0 +1,64 @@
+"""
+Đo chi phí dựng agent runtime cho mỗi request: cách cũ (dựng lại Gemini/App/Runner
+trên một event loop mới mỗi lần) so với runtime dùng chung trên loop nền của worker.
+
+Chạy: python -m benchmarks.bench_runtime [so_lan]
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench-dummy-key")
+
+from google.adk.memory import InMemoryMemoryService
+from google.adk.sessions import InMemorySessionService
+
+from agent.agent import root_agent
+from core.runtime import AgentRuntime, AgentLoop, get_runtime, close_runtime
+
+
+def _summary(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean={statistics.mean(samples) * 1000:8.3f}ms  "
+          f"p50={statistics.median(samples) * 1000:8.3f}ms  p95={p95 * 1000:8.3f}ms")
+    return statistics.mean(samples)
+
+
+def main(n=200):
+    session_service = InMemorySessionService()
+    memory_service = InMemoryMemoryService()
+
+    async def per_request_setup():
+        # Giống run_agent_async trước đây: mỗi request một bộ mới + genai Client mới
+        runtime = AgentRuntime(root_agent, session_service, memory_service)
+        runtime.llm.api_client
+
+    async def shared_setup():
+        runtime = get_runtime(lambda: AgentRuntime(root_agent, session_service, memory_service))
+        runtime.llm.api_client
+
+    before = []
+    for _ in range(n):
+        start = time.perf_counter()
+        asyncio.run(per_request_setup())  # Flask async view = 1 event loop mới / request
+        before.append(time.perf_counter() - start)
+
+    loop = AgentLoop()
+    after = []
+    for _ in range(n):
+        start = time.perf_counter()
+        loop.run(shared_setup())
+        after.append(time.perf_counter() - start)
+    loop.shutdown(close_runtime)
+
+    print(f"Per-request agent setup overhead ({n} lần)")
+    old = _summary("before (rebuild per request)", before)
+    new = _summary("after (shared runtime)", after)
+    print(f"speedup: x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
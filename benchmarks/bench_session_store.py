@@ -0,0 +1,98 @@
+"""
+Đo độ trễ đọc session / ghi event của SharedSqliteSessionService khi store đã có sẵn
+nhiều session (mặc định 100k session, mỗi session vài event).
+
+Chạy: python -m benchmarks.bench_session_store [so_session] [event_moi_session]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+import statistics
+
+from google.adk.events import Event
+from google.genai import types
+
+from core.session_store import SharedSqliteSessionService
+
+APP = "thay_tu_app"
+
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1e6
+
+
+def _report(label, samples):
+    print(f"{label:<22} n={len(samples):<6} p50={_pct(samples, 0.50):8.1f}µs  "
+          f"p95={_pct(samples, 0.95):8.1f}µs  p99={_pct(samples, 0.99):8.1f}µs  "
+          f"mean={statistics.mean(samples) * 1e6:8.1f}µs")
+
+
+def _sample_event(i):
+    role, author = ("user", "user") if i % 2 == 0 else ("model", "thay_tu_refined")
+    return Event(
+        invocation_id=f"inv-{i // 2}",
+        author=author,
+        content=types.Content(role=role, parts=[types.Part(text="Thầy ơi coi giùm con tuổi Canh Ngọ năm nay sao hạn gì? " * 3)]),
+    )
+
+
+def seed(service, n_sessions, events_per_session):
+    """Nạp nhanh dữ liệu bằng executemany (không tính vào thời gian đo)."""
+    conn = service._conn()
+    now = time.time()
+    payloads = [_sample_event(i).model_dump_json(exclude_none=True) for i in range(events_per_session)]
+    conn.execute("BEGIN")
+    batch = 10_000
+    for start in range(0, n_sessions, batch):
+        ids = [f"user-{k}" for k in range(start, min(start + batch, n_sessions))]
+        conn.executemany(
+            "INSERT INTO sessions (app_name, user_id, session_id, state, create_time, update_time) VALUES (?, ?, ?, '{}', ?, ?)",
+            [(APP, sid, sid, now, now) for sid in ids],
+        )
+        conn.executemany(
+            "INSERT INTO events (app_name, user_id, session_id, event_id, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(APP, sid, sid, f"{sid}-{j}", now + j, payloads[j]) for sid in ids for j in range(events_per_session)],
+        )
+    conn.execute("COMMIT")
+
+
+async def measure(service, n_sessions, iterations=2000):
+    reads, appends, creates = [], [], []
+    for i in range(iterations):
+        sid = f"user-{random.randrange(n_sessions)}"
+
+        start = time.perf_counter()
+        session = await service.get_session(app_name=APP, user_id=sid, session_id=sid)
+        reads.append(time.perf_counter() - start)
+
+        event = _sample_event(i)
+        start = time.perf_counter()
+        await service.append_event(session, event)
+        appends.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await service.create_session(app_name=APP, user_id=f"new-{i}", session_id=f"new-{i}")
+        creates.append(time.perf_counter() - start)
+    return reads, appends, creates
+
+
+def main(n_sessions=100_000, events_per_session=4):
+    with tempfile.TemporaryDirectory() as tmp:
+        service = SharedSqliteSessionService(os.path.join(tmp, "sessions.db"))
+        start = time.perf_counter()
+        seed(service, n_sessions, events_per_session)
+        print(f"Seeded {n_sessions:,} sessions x {events_per_session} events in {time.perf_counter() - start:.1f}s")
+
+        reads, appends, creates = asyncio.run(measure(service, n_sessions))
+        _report("get_session", reads)
+        _report("append_event", appends)
+        _report("create_session", creates)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
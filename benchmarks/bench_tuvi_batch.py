@@ -0,0 +1,41 @@
+"""
+So sánh chấm điểm từng người (metrics_engine.tinh_chi_so trong vòng lặp Python)
+với tinh_chi_so_batch (NumPy) trên N dòng (mặc định 1 triệu), và đối chiếu khớp tuyệt đối.
+
+Chạy: python -m benchmarks.bench_tuvi_batch [so_dong]
+"""
+import sys
+import time
+
+import numpy as np
+
+from agent.tuvi_metrics import metrics_engine
+from agent.tuvi_batch import METRIC_KEYS, tinh_chi_so_batch
+
+
+def main(n=1_000_000):
+    rng = np.random.default_rng(42)
+    nam_sinh = rng.integers(1900, 2025, size=n)
+    la_nam = rng.random(n) < 0.5
+
+    start = time.perf_counter()
+    batch = tinh_chi_so_batch(nam_sinh, la_nam)
+    t_batch = time.perf_counter() - start
+
+    years, genders = nam_sinh.tolist(), ["nam" if g else "nữ" for g in la_nam.tolist()]
+    start = time.perf_counter()
+    scalar = [metrics_engine.tinh_chi_so(y, g) for y, g in zip(years, genders)]
+    t_scalar = time.perf_counter() - start
+
+    for key in METRIC_KEYS:
+        assert batch[key].tolist() == [r["metrics"][key] for r in scalar], key
+    assert batch["element"].tolist() == [r["element"] for r in scalar]
+    print(f"OK: {n:,} dòng khớp tuyệt đối với đường vô hướng")
+
+    print(f"vô hướng (vòng lặp Python) {t_scalar * 1000:9.1f}ms  ({n / t_scalar:,.0f} dòng/s)")
+    print(f"batch NumPy                {t_batch * 1000:9.1f}ms  ({n / t_batch:,.0f} dòng/s)")
+    print(f"Nhanh hơn x{t_scalar / t_batch:.0f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
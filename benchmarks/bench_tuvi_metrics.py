@@ -0,0 +1,46 @@
+"""
+So sánh TuViMetrics.tinh_chi_so trước/sau khi dựng sẵn bảng 60 x 2:
+- truoc: tạo TuViMetrics() mới mỗi lần rồi chạy thuật toán gốc như agent.py cũ
+  (bảng dữ liệu nay nằm ở class nên con số này còn lạc quan hơn code cũ)
+- sau:   instance dùng chung, tra bảng O(1)
+
+Đồng thời đối chiếu kết quả hai đường cho mọi năm 1800..2200 và cả hai giới tính.
+
+Chạy: python -m benchmarks.bench_tuvi_metrics [so_lan]
+"""
+import sys
+import time
+import random
+
+from agent.tuvi_metrics import TuViMetrics, metrics_engine
+
+
+def kiem_tra_tuong_duong():
+    reference = TuViMetrics()
+    for nam_sinh in range(1800, 2201):
+        for gioi_tinh in ("nam", "nữ", "nu", "female"):
+            expected = reference._tinh_chi_so_goc(nam_sinh, gioi_tinh)
+            actual = metrics_engine.tinh_chi_so(nam_sinh, gioi_tinh)
+            assert actual == expected, (nam_sinh, gioi_tinh, actual, expected)
+    print("OK: bảng dựng sẵn khớp thuật toán gốc cho 1800..2200")
+
+
+def _do(label, fn, inputs):
+    start = time.perf_counter()
+    for nam_sinh, gioi_tinh in inputs:
+        fn(nam_sinh, gioi_tinh)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / len(inputs) * 1e6:8.2f}µs/lần  ({len(inputs) / elapsed:,.0f} lần/s)")
+    return elapsed
+
+
+def main(n=200_000):
+    kiem_tra_tuong_duong()
+    inputs = [(random.randint(1940, 2010), random.choice(("nam", "nữ"))) for _ in range(n)]
+    truoc = _do("truoc (instance mới + thuật toán gốc)", lambda y, g: TuViMetrics()._tinh_chi_so_goc(y, g), inputs)
+    sau = _do("sau (instance chung + tra bảng)", metrics_engine.tinh_chi_so, inputs)
+    print(f"Nhanh hơn x{truoc / sau:.1f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
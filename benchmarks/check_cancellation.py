@@ -0,0 +1,163 @@
+"""
+Kiểm tra huỷ lượt chạy trên AgentLoop: bên gọi bỏ cuộc (hết timeout, đóng stream) thì coroutine /
+async generator trên loop nền phải bị huỷ, không được chạy tiếp tới cuối.
+Hai mục cuối chạy app thật (Gemini phát lại cassette, mỗi lần gọi model 1s): /ask hết DEADLINE_GRACE
+và client ngắt /ask/stream thì lượt agent phải dừng và trả suất admission ngay.
+
+Chạy: python -m benchmarks.check_cancellation   (exit code 1 nếu có mục sai)
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+
+_TMP = tempfile.mkdtemp(prefix="thay-tu-check-")
+os.environ.setdefault("GOOGLE_API_KEY", "check-dummy-key")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(_TMP, "search_cache.db")
+os.environ["RATELIMIT_DB_PATH"] = os.path.join(_TMP, "rate_limit.db")
+os.environ["USAGE_DB_PATH"] = os.path.join(_TMP, "usage.db")
+os.environ["RATELIMIT_ENABLED"] = "false"
+os.environ["FAST_PATH_ENABLED"] = "false"
+os.environ["THAY_TU_MODEL_BACKEND"] = "replay"
+os.environ["THAY_TU_MODEL_LATENCY"] = "fixed:1"
+
+from core.runtime import AgentLoop
+
+QUESTION = "sao hạn năm nay của nam 1990" # Cassette: gọi tool rồi mới trả lời -> 2 lần gọi model
+
+
+class Probe:
+    """Ghi lại coroutine đã bị huỷ hay đã chạy xong."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    async def slow(self, seconds=2.0):
+        try:
+            await asyncio.sleep(seconds)
+            self.finished.set()
+            return "done"
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+def check_run_timeout(loop):
+    probe = Probe()
+    try:
+        loop.run(probe.slow(), timeout=0.2)
+        return False, "run() không ném TimeoutError"
+    except TimeoutError:
+        pass
+    if not probe.cancelled.wait(1.0):
+        return False, "coroutine không bị huỷ sau timeout"
+    return not probe.finished.is_set(), "coroutine bị huỷ khi run() hết timeout"
+
+
+def check_run_result(loop):
+    probe = Probe()
+    return loop.run(probe.slow(0.05), timeout=1.0) == "done", "run() vẫn trả kết quả khi không hết giờ"
+
+
+def check_iterate_close(loop):
+    probe = Probe()
+    produced = []
+
+    async def stream():
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+                await asyncio.sleep(0.01)
+            probe.finished.set()
+        except asyncio.CancelledError:
+            probe.cancelled.set()
+            raise
+        except GeneratorExit: # aclose() sau khi bên đọc bỏ đi
+            probe.cancelled.set()
+            raise
+
+    events = loop.iterate(stream())
+    next(events)
+    events.close() # Như Flask đóng generator khi client ngắt SSE
+    if not probe.cancelled.wait(1.0):
+        return False, "generator vẫn chạy sau khi close()"
+    count = len(produced)
+    time.sleep(0.1)
+    return len(produced) == count and not probe.finished.is_set(), "close() huỷ generator, không sinh thêm"
+
+
+def check_iterate_timeout(loop):
+    probe = Probe()
+
+    async def stream():
+        yield await probe.slow()
+
+    try:
+        next(loop.iterate(stream(), timeout=0.2))
+        return False, "iterate() không hết giờ"
+    except TimeoutError:
+        pass
+    if not probe.cancelled.wait(1.0):
+        return False, "generator không bị huỷ sau timeout"
+    return not probe.finished.is_set(), "iterate() hết timeout ném TimeoutError như run(), huỷ generator"
+
+
+def _released(admission, within=1.0):
+    """Suất admission được trả (lượt agent đã thoát) trong `within` giây."""
+    stop = time.monotonic() + within
+    while time.monotonic() < stop:
+        if admission.stats()["active"] == 0:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def check_ask_grace_expiry(_loop):
+    import app
+    from core.deadline import Deadline, use_deadline
+
+    # Như /ask khi loop nền không trả kịp trong deadline + DEADLINE_GRACE
+    try:
+        with use_deadline(Deadline(60)):
+            app.agent_loop.run(app.answer_async(QUESTION, "check-ask"), timeout=0.3)
+        return False, "run() không hết giờ"
+    except TimeoutError:
+        pass
+    return _released(app.admission), "/ask hết hạn chót: lượt agent bị huỷ, trả suất admission"
+
+
+def check_stream_disconnect(_loop):
+    import app
+
+    client = app.app.test_client()
+    response = client.post("/ask/stream", json={"message": QUESTION}, buffered=False)
+    chunks = iter(response.response)
+    next(chunks) # Sự kiện đầu tiên (tool) sau lần gọi model thứ nhất
+    if app.admission.stats()["active"] != 1:
+        return False, "lượt agent không chạy"
+    response.close() # Client ngắt SSE
+    return _released(app.admission, within=0.5), "client ngắt /ask/stream: lượt agent bị huỷ, trả suất admission"
+
+
+CHECKS = [check_run_timeout, check_run_result, check_iterate_close, check_iterate_timeout, check_ask_grace_expiry, check_stream_disconnect]
+
+
+def main():
+    loop = AgentLoop(name="check-cancellation")
+    failed = 0
+    for check in CHECKS:
+        start = time.perf_counter()
+        ok, label = check(loop)
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {check.__name__:<32} {label} ({time.perf_counter() - start:.2f}s)")
+    loop.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
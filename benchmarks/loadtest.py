@@ -0,0 +1,333 @@
+"""
+Load test /ask, /reset, /health trên app thật chạy bằng gunicorn (model giả ReplayLlm, không cần mạng),
+quét nhiều cấu hình worker / thread / worker-class và báo p50/p95/p99, throughput, RSS cho từng cấu hình.
+
+Mỗi người dùng ảo (cookie riêng = session riêng) lặp: chọn một kịch bản hội thoại trong
+benchmarks/fixtures/conversations.jsonl, hỏi từng câu (có thời gian "suy nghĩ" giữa các câu) rồi /reset.
+Song song có một probe gọi /health mỗi giây như health check của k8s.
+
+Chạy:
+    python -m benchmarks.loadtest                                   # gthread: 1,2,4 worker x 4 thread
+    python -m benchmarks.loadtest --workers 1,2 --threads 1,4,8 --worker-class sync,gthread
+    python -m benchmarks.loadtest --users 32 --duration 60 --model-latency lognormal:-0.4,0.35 --json out.json
+    python -m benchmarks.loadtest --worker-class gthread,uvicorn.workers.UvicornWorker   # so Flask với ASGI
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import itertools
+import importlib.util
+import subprocess
+import statistics
+import tempfile
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+CASSETTE = os.path.join(FIXTURES, "cassettes", "ask.jsonl")
+
+
+def _load_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- Bộ nhớ: cộng RSS của master + mọi process con (đọc /proc, chỉ Linux) ---
+def _children(pid):
+    kids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Trường thứ 4 là ppid; tên process nằm trong ngoặc, có thể chứa khoảng trắng
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            kids.append(int(entry))
+    return kids
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def tree_rss_mb(pid):
+    """(tổng RSS của cả cây process, RSS lớn nhất của một worker) tính bằng MB."""
+    workers = _children(pid)
+    worker_rss = [_rss_mb(w) for w in workers]
+    return _rss_mb(pid) + sum(worker_rss), max(worker_rss, default=0.0)
+
+
+# --- Server ---
+def seed_search_cache(db_path):
+    """
+    Nạp sẵn cache tra cứu cho các lượt tra_cuu_tu_vi_online có trong cassette,
+    để load test không gọi DuckDuckGo thật (giống trạng thái ổn định trên production: cache nóng).
+    """
+    os.environ.setdefault("SEARCH_CACHE_PATH", db_path) # import agent.agent dựng cache mặc định, đừng đụng data/
+    from core.search_cache import SearchCache, make_search_key
+    from agent.agent import _chuan_hoa_nam_sinh, _tinh_can_chi
+
+    cache = SearchCache(db_path)
+    year = time.localtime().tm_year + 1 # tra_cuu_tu_vi_online tra cho năm sau, như trong agent
+    knowledge = ["- Năm nay công việc có nhiều cơ hội mới, tài lộc ổn định, nên giữ sức khoẻ và tránh đầu tư mạo hiểm."]
+    for entry in _load_jsonl(CASSETTE):
+        for response in entry["responses"]:
+            for part in response.get("content", {}).get("parts", []):
+                call = part.get("function_call")
+                if call and call["name"] == "tra_cuu_tu_vi_online":
+                    ns = _chuan_hoa_nam_sinh(call["args"]["du_lieu_dau_vao"])
+                    linh_vuc = call["args"].get("linh_vuc", "tổng quát")
+                    cache.get_or_load(make_search_key(_tinh_can_chi(ns), ns, year, linh_vuc), lambda: knowledge)
+
+
+class GunicornServer:
+    """Chạy `gunicorn app:app` ở process con với một cấu hình, dữ liệu (SQLite) nằm trong thư mục tạm riêng."""
+
+    def __init__(self, workers, threads, worker_class, model_latency, data_dir, extra_env=None):
+        self.workers, self.threads, self.worker_class = workers, threads, worker_class
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ)
+        self.env.update({
+            "THAY_TU_MODEL_BACKEND": "replay",
+            "THAY_TU_CASSETTE": CASSETTE,
+            "THAY_TU_MODEL_LATENCY": model_latency,
+            "RATELIMIT_ENABLED": "false",
+            "GOOGLE_API_KEY": self.env.get("GOOGLE_API_KEY", "loadtest-dummy-key"),
+            "SESSION_DB_PATH": os.path.join(data_dir, "sessions.db"),
+            "SEARCH_CACHE_PATH": os.path.join(data_dir, "search_cache.db"),
+            "RATELIMIT_DB_PATH": os.path.join(data_dir, "rate_limit.db"),
+            "USAGE_DB_PATH": os.path.join(data_dir, "usage.db"),
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(data_dir, "prometheus"),
+            "PYTHONUNBUFFERED": "1",
+        })
+        self.env.update(extra_env or {})
+        self.process = None
+
+    @property
+    def label(self):
+        return f"{self.worker_class.rsplit('.', 1)[-1]} w={self.workers} t={self.threads}"
+
+    def start(self, timeout=90):
+        seed_search_cache(self.env["SEARCH_CACHE_PATH"])
+        # Worker uvicorn chạy bản ASGI (asgi.py), còn lại chạy bản Flask
+        target = "asgi:api" if "uvicorn" in self.worker_class.lower() else "app:app"
+        cmd = [sys.executable, "-m", "gunicorn", target, "-b", f"127.0.0.1:{self.port}",
+               "--workers", str(self.workers), "--threads", str(self.threads),
+               "--worker-class", self.worker_class, "--timeout", "120", "--log-level", "warning"]
+        self.process = subprocess.Popen(cmd, cwd=ROOT, env=self.env, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + timeout
+        ready = 0
+        # Chờ đủ mọi worker trả lời /health (mỗi worker nạp ADK mất vài giây)
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited early ({self.label})")
+            try:
+                if httpx.get(self.base_url + "/health", timeout=2).status_code == 200:
+                    ready += 1
+                    if ready >= self.workers * 2:
+                        return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError(f"gunicorn not ready after {timeout}s ({self.label})")
+
+    def rss(self):
+        return tree_rss_mb(self.process.pid)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+
+
+# --- Tải ---
+class Recorder:
+    def __init__(self):
+        self.latencies = {} # endpoint -> [giây]
+        self.errors = {}
+        self.recording = False
+
+    def add(self, endpoint, seconds, ok):
+        if not self.recording:
+            return
+        if ok:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+        else:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+async def _timed(recorder, endpoint, coro):
+    start = time.perf_counter()
+    try:
+        resp = await coro
+        ok = resp.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    recorder.add(endpoint, time.perf_counter() - start, ok)
+
+
+async def virtual_user(base_url, conversations, recorder, stop_at, think, rng):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        while time.monotonic() < stop_at:
+            for message in rng.choice(conversations)["turns"]:
+                if time.monotonic() >= stop_at:
+                    return
+                await _timed(recorder, "/ask", client.post("/ask", json={"message": message}))
+                await asyncio.sleep(rng.uniform(0, 2 * think))
+            await _timed(recorder, "/reset", client.post("/reset"))
+
+
+async def health_probe(base_url, recorder, stop_at, interval=1.0):
+    async with httpx.AsyncClient(base_url=base_url, timeout=10) as client:
+        while time.monotonic() < stop_at:
+            await _timed(recorder, "/health", client.get("/health"))
+            await asyncio.sleep(interval)
+
+
+async def drive(server, conversations, users, duration, warmup, think, seed):
+    recorder = Recorder()
+    stop_at = time.monotonic() + warmup + duration
+    rss_samples = []
+
+    async def sample_rss():
+        while time.monotonic() < stop_at:
+            rss_samples.append(server.rss())
+            await asyncio.sleep(0.5)
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    rngs = [random.Random(seed + i) for i in range(users)]
+    tasks = [virtual_user(server.base_url, conversations, recorder, stop_at, think, rngs[i]) for i in range(users)]
+    await asyncio.gather(*tasks, health_probe(server.base_url, recorder, stop_at), sample_rss(), start_recording())
+    return recorder, rss_samples
+
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000 if samples else float("nan")
+
+
+def summarize(server, recorder, rss_samples, duration):
+    ask = recorder.latencies.get("/ask", [])
+    total = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "config": server.label,
+        "worker_class": server.worker_class,
+        "workers": server.workers,
+        "threads": server.threads,
+        "requests": total,
+        "errors": dict(recorder.errors),
+        "throughput_rps": round(total / duration, 2),
+        "ask_rps": round(len(ask) / duration, 2),
+        "latency_ms": {
+            endpoint: {"p50": round(_pct(v, 0.50), 1), "p95": round(_pct(v, 0.95), 1),
+                       "p99": round(_pct(v, 0.99), 1), "mean": round(statistics.mean(v) * 1000, 1)}
+            for endpoint, v in sorted(recorder.latencies.items())
+        },
+        "rss_mb_peak": round(max((t for t, _ in rss_samples), default=0.0), 1),
+        "rss_mb_per_worker_peak": round(max((w for _, w in rss_samples), default=0.0), 1),
+    }
+
+
+def print_report(results):
+    print(f"\n{'cấu hình':<24} {'req/s':>7} {'ask/s':>7} {'ask p50':>9} {'ask p95':>9} {'ask p99':>9} "
+          f"{'lỗi':>5} {'RSS MB':>8} {'MB/worker':>10}")
+    for r in results:
+        ask = r["latency_ms"].get("/ask", {})
+        errors = sum(r["errors"].values())
+        print(f"{r['config']:<24} {r['throughput_rps']:7.1f} {r['ask_rps']:7.1f} {ask.get('p50', float('nan')):7.0f}ms "
+              f"{ask.get('p95', float('nan')):7.0f}ms {ask.get('p99', float('nan')):7.0f}ms {errors:5d} "
+              f"{r['rss_mb_peak']:8.0f} {r['rss_mb_per_worker_peak']:10.0f}")
+
+
+def configurations(workers, threads, worker_classes):
+    seen = set()
+    for worker_class, w, t in itertools.product(worker_classes, workers, threads):
+        if worker_class == "sync" and t != 1:
+            continue # gunicorn tự đổi sync -> gthread khi threads > 1, trùng cấu hình gthread
+        if "uvicorn" in worker_class.lower():
+            t = 1 # Worker ASGI không dùng thread, mọi request chen nhau trên một event loop
+        if (worker_class, w, t) in seen:
+            continue
+        seen.add((worker_class, w, t))
+        if worker_class in ("gevent", "eventlet") and importlib.util.find_spec(worker_class) is None:
+            print(f"Bỏ qua {worker_class}: chưa cài thư viện", file=sys.stderr)
+            continue
+        yield w, t, worker_class
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=_ints, default=[1, 2, 4])
+    parser.add_argument("--threads", type=_ints, default=[4])
+    parser.add_argument("--worker-class", default="gthread", help="danh sách, ví dụ sync,gthread,gevent")
+    parser.add_argument("--users", type=int, default=16, help="số người dùng ảo đồng thời")
+    parser.add_argument("--duration", type=float, default=30, help="thời gian đo (giây) cho mỗi cấu hình")
+    parser.add_argument("--warmup", type=float, default=5, help="thời gian làm nóng (không tính) trước khi đo")
+    parser.add_argument("--think", type=float, default=0.5, help="thời gian suy nghĩ trung bình giữa hai câu (giây)")
+    parser.add_argument("--model-latency", default="lognormal:-0.4,0.35",
+                        help="độ trễ model giả, cú pháp THAY_TU_MODEL_LATENCY (mặc định ~0.7s/lần gọi)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="ghi kết quả chi tiết ra file JSON")
+    args = parser.parse_args(argv)
+
+    conversations = _load_jsonl(os.path.join(FIXTURES, "conversations.jsonl"))
+    results = []
+    for workers, threads, worker_class in configurations(args.workers, args.threads, args.worker_class.split(",")):
+        with tempfile.TemporaryDirectory(prefix="thay-tu-load-") as data_dir:
+            server = GunicornServer(workers, threads, worker_class, args.model_latency, data_dir,
+                                    extra_env={"THAY_TU_MODEL_SEED": str(args.seed)})
+            print(f"▶ {server.label}: {args.users} người dùng, {args.duration:.0f}s", file=sys.stderr)
+            try:
+                server.start()
+                recorder, rss_samples = asyncio.run(drive(server, conversations, args.users, args.duration,
+                                                          args.warmup, args.think, args.seed))
+            finally:
+                server.stop()
+            results.append(summarize(server, recorder, rss_samples, args.duration))
+
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json_path"}, "results": results},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
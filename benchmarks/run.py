@@ -0,0 +1,372 @@
+"""
+Bộ benchmark offline cho các hàm tool, bộ tách ngày sinh, TuViMetrics và /ask (Gemini phát lại từ cassette, DDGS giả).
+
+Mỗi benchmark đo thời gian một lượt gọi (µs/lần, lấy lần nhanh nhất trong nhiều vòng cho ổn định),
+so với baseline đã lưu và trả exit code 1 nếu có mục chậm hơn ngưỡng cho phép.
+
+Chạy:
+    python -m benchmarks.run                      # so với benchmarks/baseline.json
+    python -m benchmarks.run -k tool.             # chỉ chạy các mục có tên chứa "tool."
+    python -m benchmarks.run --save-baseline      # ghi lại baseline (chạy trên máy tham chiếu)
+    python -m benchmarks.run --threshold 0.3      # cho phép chậm hơn tối đa 30%
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+
+# Cô lập khỏi dữ liệu thật: session trong RAM, cache tra cứu ở thư mục tạm, không cần API key thật
+_TMP = tempfile.mkdtemp(prefix="thay-tu-bench-")
+os.environ.setdefault("GOOGLE_API_KEY", "bench-dummy-key")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(_TMP, "search_cache.db")
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+os.environ["RATELIMIT_DB_PATH"] = os.path.join(_TMP, "rate_limit.db")
+os.environ["USAGE_DB_PATH"] = os.path.join(_TMP, "usage.db")
+# Model giả phát lại cassette, không chờ độ trễ mạng: chỉ đo chi phí CPU của pipeline
+os.environ["THAY_TU_MODEL_BACKEND"] = "replay"
+os.environ["THAY_TU_CASSETTE"] = os.path.join(os.path.dirname(__file__), "fixtures", "cassettes", "ask.jsonl")
+os.environ["THAY_TU_MODEL_LATENCY"] = "fixed:0"
+os.environ["THAY_TU_REPLAY_STRICT"] = "true"
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+BENCHMARKS = {} # tên -> factory trả về hàm không tham số, mỗi lần gọi = một lượt đo
+
+
+def benchmark(name):
+    """Đăng ký một benchmark. Factory làm phần chuẩn bị (không tính giờ) rồi trả về hàm cần đo."""
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def _load_jsonl(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _birth_inputs():
+    return [row["input"] for row in _load_jsonl("birth_inputs.jsonl")]
+
+
+def _ask_rows():
+    return _load_jsonl("ask_messages.jsonl")
+
+
+def _cycle_call(fn, inputs):
+    items = itertools.cycle(inputs)
+    return lambda: fn(next(items))
+
+
+# --- Giả lập mạng ---
+_FAKE_RESULTS = [
+    {"title": "Tử vi", "body": "Năm nay tuổi này gặp nhiều thuận lợi trong công việc, tài lộc ổn định, nên giữ sức khoẻ và tránh đầu tư mạo hiểm."},
+    {"title": "Tử vi", "body": "Tình duyên có bước tiến triển tốt, người độc thân dễ gặp được người hợp ý vào nửa cuối năm, gia đạo yên ấm."},
+    {"title": "Tử vi", "body": "Ngắn"},
+]
+
+
+class _FakeDDGS:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def text(self, keywords, region=None, max_results=None):
+        return list(_FAKE_RESULTS)
+
+
+def _patch_network():
+    import agent.agent as agent_module
+    agent_module.DDGS = _FakeDDGS
+    return agent_module
+
+
+# --- Parser ---
+@benchmark("parser.parse_birth_uncached")
+def _bench_parse_uncached():
+    from agent.birth_parser import _parse
+    current_year = time.localtime().tm_year
+    return _cycle_call(lambda text: _parse(text, current_year), _birth_inputs())
+
+
+@benchmark("parser.parse_birth_cached")
+def _bench_parse_cached():
+    from agent.birth_parser import parse_birth
+    return _cycle_call(parse_birth, _birth_inputs())
+
+
+@benchmark("parser.intent_classify")
+def _bench_intent_classify():
+    from agent.intent_router import IntentRouter
+    router = IntentRouter(enabled=True)
+    return _cycle_call(router.classify, [row["message"] for row in _ask_rows()])
+
+
+@benchmark("parser.intent_signature")
+def _bench_intent_signature():
+    from agent.intent_router import IntentRouter
+    router = IntentRouter(enabled=True)
+    return _cycle_call(router.signature, [row["message"] for row in _ask_rows()])
+
+
+# --- Tool (gọi thẳng hàm như ADK gọi) ---
+@benchmark("tool.xem_sao_giai_han")
+def _bench_sao_han():
+    agent_module = _patch_network()
+    return _cycle_call(agent_module.xem_sao_giai_han, _birth_inputs())
+
+
+@benchmark("tool.phan_tich_chi_so_khoa_hoc")
+def _bench_chi_so():
+    agent_module = _patch_network()
+    return _cycle_call(agent_module.phan_tich_chi_so_khoa_hoc, _birth_inputs())
+
+
+@benchmark("tool.xem_so_chu_dao")
+def _bench_so_chu_dao():
+    agent_module = _patch_network()
+    return _cycle_call(agent_module.xem_so_chu_dao, _birth_inputs())
+
+
+@benchmark("tool.xem_cung_hoang_dao_tool")
+def _bench_cung_hoang_dao():
+    agent_module = _patch_network()
+    return _cycle_call(agent_module.xem_cung_hoang_dao_tool, _birth_inputs())
+
+
+@benchmark("tool.xem_than_so_hoc")
+def _bench_than_so_hoc():
+    agent_module = _patch_network()
+    return _cycle_call(agent_module.xem_than_so_hoc, _birth_inputs())
+
+
+@benchmark("tool.tra_cuu_tu_vi_online_cached")
+def _bench_tra_cuu_cached():
+    agent_module = _patch_network()
+    loop = asyncio.new_event_loop()
+    inputs = _birth_inputs()
+    for text in inputs: # Làm nóng cache: đo đường trả ngay từ RAM
+        loop.run_until_complete(agent_module.tra_cuu_tu_vi_online(text))
+    return _cycle_call(lambda text: loop.run_until_complete(agent_module.tra_cuu_tu_vi_online(text)), inputs)
+
+
+@benchmark("tool.tra_cuu_tu_vi_online_miss")
+def _bench_tra_cuu_miss():
+    agent_module = _patch_network()
+    loop = asyncio.new_event_loop()
+    counter = itertools.count()
+    # Mỗi lượt một lĩnh vực mới -> luôn trượt cache: thread pool + SQLite + DDGS giả
+    return lambda: loop.run_until_complete(agent_module.tra_cuu_tu_vi_online("1990", f"lĩnh vực {next(counter)}"))
+
+
+# --- Rate limit ---
+@benchmark("ratelimit.check_sqlite")
+def _bench_rate_limit_sqlite():
+    from core.rate_limit import Budget, RateLimiter, SqliteBucketStore
+    limiter = RateLimiter(SqliteBucketStore(os.path.join(_TMP, "bench_rate_limit.db")),
+                          routes={"ask": Budget.parse("20 per minute")})
+    clients = itertools.cycle([f"10.0.{i // 256}.{i % 256}" for i in range(5000)])
+    return lambda: limiter.check("ask", next(clients))
+
+
+@benchmark("ratelimit.check_memory")
+def _bench_rate_limit_memory():
+    from core.rate_limit import Budget, MemoryBucketStore, RateLimiter
+    limiter = RateLimiter(MemoryBucketStore(), routes={"ask": Budget.parse("20 per minute")})
+    clients = itertools.cycle([f"10.0.{i // 256}.{i % 256}" for i in range(5000)])
+    return lambda: limiter.check("ask", next(clients))
+
+
+# --- Log pipeline ---
+@benchmark("log.submit")
+def _bench_log_submit():
+    from core.log_pipeline import LogPipeline
+    pipeline = LogPipeline(lambda batch: None)
+    payload = {"project": "thay-tu-online", "trace_id": "bench", "path": "/ask", "status": 200}
+    return lambda: pipeline.submit("info", "⏹️ Completed POST /ask [200]", payload)
+
+
+# --- TuViMetrics ---
+@benchmark("metrics.tinh_chi_so")
+def _bench_metrics():
+    from agent.tuvi_metrics import metrics_engine
+    pairs = itertools.cycle([(year, gender) for year in range(1940, 2020) for gender in ("nam", "nữ")])
+    return lambda: metrics_engine.tinh_chi_so(*next(pairs))
+
+
+@benchmark("metrics.tinh_chi_so_goc")
+def _bench_metrics_goc():
+    from agent.tuvi_metrics import metrics_engine
+    pairs = itertools.cycle([(year, gender) for year in range(1940, 2020) for gender in ("nam", "nữ")])
+    return lambda: metrics_engine._tinh_chi_so_goc(*next(pairs))
+
+
+@benchmark("metrics.tinh_chi_so_batch_10k")
+def _bench_metrics_batch():
+    from agent.tuvi_batch import tinh_chi_so_batch, np
+    if np is None:
+        return None
+    years = np.arange(10_000) % 125 + 1900
+    return lambda: tinh_chi_so_batch(years, "nam")
+
+
+# --- /ask đầu-cuối (Flask test client, Gemini được thay bằng ReplayLlm phát lại cassette) ---
+def _ask_client():
+    _patch_network()
+    import app as app_module
+    app_module.rate_limiter.enabled = False
+    app_module.app.config["TESTING"] = True
+    return app_module
+
+
+def _ask_op(app_module, messages):
+    # Mỗi client (cookie -> user_id) hỏi tối đa 10 câu rồi đổi người, session không phình tới ngưỡng nén
+    messages = itertools.cycle(messages)
+    state = {"client": None, "asked": 0}
+
+    def op():
+        if state["client"] is None or state["asked"] >= 10:
+            state["client"], state["asked"] = app_module.app.test_client(), 0
+        state["asked"] += 1
+        resp = state["client"].post("/ask", json={"message": next(messages)})
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    return op
+
+
+@benchmark("e2e.ask_fast_path")
+def _bench_ask_fast():
+    rows = _ask_rows()
+    app_module = _ask_client()
+    return _ask_op(app_module, [row["message"] for row in rows if app_module.intent_router.answer(row["message"])])
+
+
+@benchmark("e2e.ask_agent")
+def _bench_ask_agent():
+    rows = _ask_rows()
+    app_module = _ask_client()
+    return _ask_op(app_module, [row["message"] for row in rows if not app_module.intent_router.answer(row["message"])])
+
+
+# --- Bộ chạy ---
+def measure(op, min_time=0.2, repeats=5):
+    """Tự chọn số lần gọi để mỗi vòng chạy >= min_time/repeats giây, trả về µs/lần của vòng nhanh nhất."""
+    op() # Làm nóng (import lười, cache lần đầu)
+    number, target = 1, min_time / repeats
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(target / elapsed * 1.2) + 1))
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def run(names, min_time, repeats):
+    results = {}
+    for name in names:
+        # Tool và app in log ra stdout/stderr -> tắt tiếng trong lúc đo
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            op = BENCHMARKS[name]()
+            value = measure(op, min_time, repeats) if op is not None else None
+            if "app" in sys.modules: # Log của app đi qua thread nền -> xả hết khi còn đang tắt tiếng
+                sys.modules["app"].logger.pipeline.flush()
+        results[name] = value
+        print(f"  {name:<38} {'bỏ qua' if value is None else f'{value:12.2f}µs'}", file=sys.stderr)
+    return results
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(path, results):
+    previous = load_baseline(path)
+    previous.update({name: round(value, 3) for name, value in results.items() if value is not None})
+    payload = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(terse=True),
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": dict(sorted(previous.items())),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    """In bảng so sánh, trả về danh sách mục chậm hơn baseline quá ngưỡng."""
+    regressions = []
+    print(f"{'benchmark':<38} {'hiện tại':>12} {'baseline':>12} {'chênh':>8}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if value is None:
+            print(f"{name:<38} {'bỏ qua':>12}")
+            continue
+        if base is None:
+            print(f"{name:<38} {value:10.2f}µs {'-':>12} {'mới':>8}")
+            continue
+        change = value / base - 1
+        flag = ""
+        if change > threshold:
+            flag = "  CHẬM HƠN"
+            regressions.append(name)
+        print(f"{name:<38} {value:10.2f}µs {base:10.2f}µs {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="pattern", default="", help="chỉ chạy benchmark có tên chứa chuỗi này")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="file baseline (mặc định benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="ghi kết quả lần chạy này làm baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="tỉ lệ chậm hơn cho phép (mặc định 0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="thời gian đo tối thiểu cho mỗi benchmark (giây)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--list", action="store_true", help="liệt kê tên benchmark rồi thoát")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.pattern in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print(f"Không có benchmark nào khớp '{args.pattern}'", file=sys.stderr)
+        return 2
+
+    results = run(names, args.min_time, args.repeats)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Đã lưu baseline: {args.baseline}")
+        return 0
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark chậm hơn baseline quá {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
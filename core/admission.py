@@ -0,0 +1,137 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+
+from core import metrics
+from core.deadline import clamp
+
+
+class Overloaded(Exception):
+    """Worker đã đủ lượt agent đang chạy và hàng chờ: trả 503 + Retry-After thay vì xếp hàng vô hạn."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Agent admission rejected ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    """Số lượt agent chạy song song mỗi worker, độ dài hàng chờ và thời gian chờ tối đa trong hàng."""
+    max_concurrent: int = 8
+    max_queue: int = 16
+    queue_timeout: float = 5.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrent=int(os.environ.get('AGENT_MAX_CONCURRENCY', cls.max_concurrent)),
+            max_queue=int(os.environ.get('AGENT_MAX_QUEUE', cls.max_queue)),
+            queue_timeout=float(os.environ.get('AGENT_QUEUE_TIMEOUT', cls.queue_timeout)),
+        )
+
+
+class AdmissionLimiter:
+    """
+    Giới hạn lượt agent chạy cùng lúc trên event loop của worker (FIFO, hàng chờ có trần).
+    Hàng chờ đầy, hoặc chờ quá `queue_timeout` (hay quá deadline của request) -> Overloaded ngay,
+    để các lượt đã nhận vẫn giữ được độ trễ thay vì mọi lượt cùng chậm và Gemini trả quá tải.
+    Mọi thao tác chạy trên MỘT event loop nên không cần khoá.
+    """
+
+    def __init__(self, policy: AdmissionPolicy = None):
+        self.policy = policy or AdmissionPolicy()
+        self._active = 0
+        self._waiters = deque()
+        self._avg_run = None # EWMA thời gian một lượt agent (giây), để ước lượng Retry-After
+        self.counters = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    @property
+    def saturated(self) -> bool:
+        """Hết suất chạy và hết chỗ trong hàng chờ (đọc được từ thread khác để từ chối sớm)."""
+        return self._active >= self.policy.max_concurrent and len(self._waiters) >= self.policy.max_queue
+
+    def check_capacity(self):
+        """Từ chối sớm (vd trước khi mở stream SSE, lúc đó chưa trả được mã 503) khi hàng chờ đã đầy."""
+        if self.saturated:
+            raise self._reject("queue_full")
+
+    def retry_after(self) -> int:
+        """Ước lượng số giây tới khi có suất trống: (hàng chờ + 1) / số suất * thời gian một lượt, 1..30."""
+        per_turn = self._avg_run or 5.0
+        estimate = (len(self._waiters) + 1) / self.policy.max_concurrent * per_turn
+        return max(1, min(30, math.ceil(estimate)))
+
+    def _reject(self, reason):
+        self.counters[f"rejected_{reason}"] += 1
+        metrics.ADMISSION_REJECTED.labels(reason).inc()
+        return Overloaded(reason, self.retry_after())
+
+    def _release(self):
+        # Trao suất cho người chờ lâu nhất còn đang chờ; không ai chờ thì trả suất
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._active -= 1
+
+    async def _acquire(self):
+        if self._active < self.policy.max_concurrent and not self._waiters:
+            self._active += 1
+            return
+        if len(self._waiters) >= self.policy.max_queue:
+            raise self._reject("queue_full")
+        timeout = clamp(self.policy.queue_timeout)
+        if timeout <= 0:
+            raise self._reject("queue_timeout")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters["queued"] += 1
+        metrics.AGENT_WAITING.inc()
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                if isinstance(e, TimeoutError):
+                    return # Suất tới đúng lúc hết giờ -> vẫn chạy
+                self._release() # Bị huỷ (client ngắt, deadline) sau khi đã nhận suất -> trao tiếp
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, TimeoutError):
+                raise self._reject("queue_timeout") from None
+            raise
+        finally:
+            metrics.AGENT_WAITING.dec()
+
+    @asynccontextmanager
+    async def slot(self):
+        """`async with admission.slot():` giữ một suất chạy agent; ném Overloaded nếu bị từ chối."""
+        queued_at = time.monotonic()
+        await self._acquire()
+        started = time.monotonic()
+        self.counters["admitted"] += 1
+        metrics.ADMISSION_QUEUE_TIME.observe(started - queued_at)
+        metrics.AGENT_ACTIVE.inc()
+        try:
+            yield
+        finally:
+            metrics.AGENT_ACTIVE.dec()
+            elapsed = time.monotonic() - started
+            self._avg_run = elapsed if self._avg_run is None else 0.8 * self._avg_run + 0.2 * elapsed
+            self._release()
+
+    def stats(self) -> dict:
+        return {**self.counters, "active": self._active, "waiting": len(self._waiters),
+                "avg_run_s": round(self._avg_run, 3) if self._avg_run is not None else None,
+                "policy": asdict(self.policy)}
@@ -0,0 +1,89 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """
+    Cache câu trả lời của agent cho các lượt hỏi lặp lại (trong RAM, mỗi worker một bản).
+
+    - Khoá: ý định đã chuẩn hoá + tham số tool đã phân giải (do IntentRouter.signature tạo).
+    - Mỗi khoá giữ tối đa `variants` câu trả lời khác nhau; chỉ bắt đầu trả từ cache khi
+      đã gom đủ số biến thể đó, rồi chọn ngẫu nhiên -> người hỏi vẫn thấy câu chữ thay đổi.
+    - Mỗi biến thể có TTL riêng; số khoá bị chặn bởi LRU (`max_keys`).
+    """
+
+    def __init__(self, ttl=6 * 3600, max_keys=2000, variants=3):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.variants = variants
+        self._entries = OrderedDict() # key -> [(stored_at, answer, generation_seconds), ...]
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "warming": 0, "stored": 0, "evictions": 0,
+                         "hit_seconds": 0.0, "estimated_seconds_saved": 0.0}
+        self.bypassed = {}
+
+    def _live_variants(self, key, now):
+        variants = [v for v in self._entries.get(key, ()) if now - v[0] < self.ttl]
+        if variants:
+            self._entries[key] = variants
+        else:
+            self._entries.pop(key, None)
+        return variants
+
+    def get(self, key):
+        """Trả về một câu trả lời đã cache, hoặc None nếu chưa có / chưa đủ biến thể."""
+        start = time.perf_counter()
+        with self._lock:
+            variants = self._live_variants(key, time.time())
+            if len(variants) < self.variants:
+                self.counters["warming" if variants else "misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            answer = random.choice(variants)[1]
+            elapsed = time.perf_counter() - start
+            generation = sum(v[2] for v in variants) / len(variants)
+            self.counters["hits"] += 1
+            self.counters["hit_seconds"] += elapsed
+            self.counters["estimated_seconds_saved"] += max(0.0, generation - elapsed)
+            return answer
+
+    def put(self, key, answer, generation_seconds=0.0):
+        """Thêm một biến thể cho khoá (bỏ qua nếu trùng chữ hoặc đã đủ biến thể)."""
+        if not answer:
+            return
+        with self._lock:
+            variants = self._live_variants(key, time.time())
+            if len(variants) >= self.variants or any(v[1] == answer for v in variants):
+                return
+            variants.append((time.time(), answer, generation_seconds))
+            self._entries[key] = variants
+            self._entries.move_to_end(key)
+            self.counters["stored"] += 1
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def record_bypass(self, reason):
+        with self._lock:
+            self.bypassed[reason] = self.bypassed.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            bypassed = dict(self.bypassed)
+            keys = len(self._entries)
+        lookups = counters["hits"] + counters["misses"] + counters["warming"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "warming": counters["warming"],
+            "stored": counters["stored"],
+            "evictions": counters["evictions"],
+            "bypassed": bypassed,
+            "keys": keys,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_hit_us": round(counters["hit_seconds"] / counters["hits"] * 1e6, 1) if counters["hits"] else None,
+            "estimated_seconds_saved": round(counters["estimated_seconds_saved"], 2),
+        }
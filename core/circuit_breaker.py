@@ -0,0 +1,82 @@
+import time
+import threading
+
+
+class CircuitOpenError(Exception):
+    """Breaker đang mở: bỏ qua lời gọi ra ngoài, dùng phương án dự phòng."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho dịch vụ ngoài (thread-safe):
+    - closed: gọi bình thường, đếm lỗi liên tiếp
+    - open: đủ `failure_threshold` lỗi liên tiếp -> chặn mọi lời gọi trong `cooldown` giây
+    - half_open: hết cooldown -> cho đúng một lời gọi thử; thành công thì đóng lại, lỗi thì mở tiếp
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=3, cooldown=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """True nếu được phép gọi. Lời gọi được phép phải báo lại bằng record_success/record_failure."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED or (state == self.HALF_OPEN and not self._probe_in_flight):
+                if state == self.HALF_OPEN:
+                    self._probe_in_flight = True
+                self.counters["calls"] += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.counters["successes"] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.counters["opened"] += 1
+                    print(f"[CIRCUIT] '{self.name}' opened after {self._failures} failure(s), cooldown {self.cooldown}s")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at)) if state == self.OPEN else 0.0
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in_seconds": round(retry_in, 1),
+                **self.counters,
+            }
@@ -0,0 +1,130 @@
+import time
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+
+from google.adk.models import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+
+class DeadlineExceeded(TimeoutError):
+    """Hết thời gian của request; `stage` = chỗ phát hiện (agent.run, model, tool:..., search...)."""
+
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded at {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Mốc hết hạn của một request (đồng hồ monotonic)."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+        self.tripped = None # Bước đầu tiên bị cắt vì hết hạn (câu trả lời khi đó là fallback, không cache)
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def trip(self, stage):
+        if self.tripped is None:
+            self.tripped = stage
+
+    def check(self, stage):
+        if self.expired:
+            self.trip(stage)
+            raise DeadlineExceeded(stage)
+
+    def clamp(self, timeout, reserve=0.0) -> float:
+        """Thời gian chờ cho một bước: không quá `timeout`, chừa `reserve` giây cho các bước sau."""
+        return max(0.0, min(timeout, self.remaining() - reserve))
+
+
+_current = contextvars.ContextVar("request_deadline", default=None)
+
+
+def current_deadline():
+    return _current.get()
+
+
+@contextmanager
+def use_deadline(deadline):
+    """Đặt deadline cho mọi thứ chạy trong context (AgentLoop.submit / task con mang theo)."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def clamp(timeout, reserve=0.0) -> float:
+    deadline = _current.get()
+    return timeout if deadline is None else deadline.clamp(timeout, reserve)
+
+
+def trip(stage):
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.trip(stage)
+
+
+def check(stage):
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+@asynccontextmanager
+async def guard(stage):
+    """
+    Huỷ (cancel) công việc bên trong khi hết deadline và ném DeadlineExceeded(stage).
+    Task bị huỷ dừng ở lần await kế tiếp: lời gọi Gemini, chờ tra cứu, sleep của retry...
+    """
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    deadline.check(stage)
+    try:
+        async with asyncio.timeout(deadline.remaining()):
+            yield
+    except DeadlineExceeded:
+        raise
+    except TimeoutError as e:
+        if not deadline.expired: # TimeoutError của bước bên trong, không phải của deadline
+            raise
+        deadline.trip(stage)
+        raise DeadlineExceeded(stage) from e
+
+
+class DeadlinePlugin(BasePlugin):
+    """
+    Plugin ADK: không bắt đầu việc mới khi request sắp hết hạn.
+    - Còn dưới `model_reserve` giây: không gọi model nữa, kết thúc lượt bằng câu `fallback_reply`.
+    - Còn dưới `tool_reserve` giây: bỏ qua tool, trả kết quả lỗi cho model.
+    """
+
+    def __init__(self, fallback_reply, model_reserve=2.0, tool_reserve=3.0):
+        super().__init__(name="thay_tu_deadline")
+        self.fallback_reply = fallback_reply
+        self.model_reserve = model_reserve
+        self.tool_reserve = tool_reserve
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        deadline = _current.get()
+        if deadline is None or deadline.remaining() >= self.model_reserve:
+            return None
+        deadline.trip("model")
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=self.fallback_reply)]))
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        deadline = _current.get()
+        if deadline is None or deadline.remaining() >= self.tool_reserve:
+            return None
+        deadline.trip(f"tool:{tool.name}")
+        return {"status": "error", "message": "Hết thời gian xử lý, không chạy công cụ này."}
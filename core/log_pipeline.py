@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+
+# Mức "ồn" được lấy mẫu và bỏ trước khi hàng đợi đầy; warning/error chỉ bỏ khi hết chỗ hẳn
+NOISE_LEVELS = frozenset(("debug", "info"))
+
+
+@dataclass(frozen=True)
+class LogPolicy:
+    """Giới hạn của pipeline log: kích thước hàng đợi, lô gửi đi, chu kỳ flush và chính sách bỏ bớt log info."""
+    max_queue: int = 10_000
+    batch_size: int = 200
+    flush_interval: float = 1.0
+    info_sample_rate: float = 1.0 # 0.25 = chỉ giữ 1/4 log info
+    shed_info_at: float = 0.8 # Hàng đợi đầy quá tỉ lệ này thì bỏ hết log info, giữ chỗ cho warning/error
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_queue=int(os.environ.get('LOG_QUEUE_MAX', cls.max_queue)),
+            batch_size=int(os.environ.get('LOG_BATCH_SIZE', cls.batch_size)),
+            flush_interval=float(os.environ.get('LOG_FLUSH_INTERVAL', cls.flush_interval)),
+            info_sample_rate=float(os.environ.get('LOG_INFO_SAMPLE_RATE', cls.info_sample_rate)),
+            shed_info_at=float(os.environ.get('LOG_SHED_INFO_AT', cls.shed_info_at)),
+        )
+
+
+class ConsoleSink:
+    """Local dev: in mỗi lô bằng MỘT lần ghi ra stdout."""
+
+    def __init__(self, stream=None, prefix="[thay-tu-online]"):
+        self.stream = stream
+        self.prefix = prefix
+
+    def __call__(self, batch):
+        stream = self.stream or sys.stdout
+        stream.write("".join(f"[{level.upper()}] {self.prefix} {message}\n" for _, level, message, _ in batch))
+        stream.flush()
+
+
+class CloudLoggingSink:
+    """Google Cloud Logging: cả lô đi trong MỘT lần gọi API (entries.write) thay vì mỗi bản ghi một lần."""
+
+    def __init__(self, cloud_logger):
+        self.cloud_logger = cloud_logger
+
+    def __call__(self, batch):
+        entries = self.cloud_logger.batch()
+        for created, level, message, payload in batch:
+            # Qua JSON một lượt: giá trị lạ (datetime, exception...) thành chuỗi, không làm hỏng cả lô
+            info = json.loads(json.dumps({"message": message, **payload}, ensure_ascii=False, default=str))
+            entries.log_struct(info, severity=level.upper(),
+                               timestamp=datetime.fromtimestamp(created, tz=timezone.utc))
+        entries.commit()
+
+
+class LogPipeline:
+    """
+    Pipeline log chạy nền: `submit` chỉ đẩy vào hàng đợi có trần (không chặn request),
+    thread nền gom theo lô (đủ `batch_size` hoặc sau `flush_interval`) rồi gửi cho sink một lần.
+
+    Quá tải thì bỏ bớt thay vì để RAM phình: log info bị lấy mẫu / bỏ khi hàng đợi gần đầy,
+    hàng đợi đầy hẳn thì bỏ cả warning/error. Mọi lượt bỏ đều được đếm trong stats().
+    """
+
+    def __init__(self, sink, policy: LogPolicy = None):
+        self.sink = sink
+        self.policy = policy or LogPolicy()
+        self._shed_depth = max(1, int(self.policy.max_queue * self.policy.shed_info_at))
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._closing = False
+        self._flushing = 0 # Số lời gọi flush() đang chờ -> thread gửi ngay, không đợi đủ lô
+        self._thread = None
+        self._pid = None
+        self._rng = random.Random()
+        self.counters = {"accepted": 0, "flushed": 0, "batches": 0, "sampled_out": 0,
+                         "dropped_pressure": 0, "dropped_full": 0, "dropped_sink": 0, "sink_errors": 0}
+
+    def ensure_started(self):
+        """Khởi động thread (lười, theo pid) - sau khi gunicorn fork, worker tự có thread riêng."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                # Bản ghi chép từ process cha đã do process cha gửi -> bỏ, không gửi trùng
+                self._queue.clear()
+                self._inflight = 0
+                self._closing = False
+                self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, level, message, payload=None) -> bool:
+        """Đưa một bản ghi vào hàng đợi. Trả về False nếu bị bỏ (lấy mẫu / quá tải / đã đóng)."""
+        self.ensure_started()
+        noise = level in NOISE_LEVELS
+        policy = self.policy
+        with self._cond:
+            if noise and policy.info_sample_rate < 1.0 and self._rng.random() >= policy.info_sample_rate:
+                self.counters["sampled_out"] += 1
+                return False
+            depth = len(self._queue)
+            if depth >= policy.max_queue or self._closing:
+                self.counters["dropped_full"] += 1
+                return False
+            if noise and depth >= self._shed_depth:
+                self.counters["dropped_pressure"] += 1
+                return False
+            self._queue.append((time.time(), level, message, payload or {}))
+            self.counters["accepted"] += 1
+            if depth + 1 >= policy.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _next_batch(self):
+        with self._cond:
+            deadline = time.monotonic() + self.policy.flush_interval
+            while len(self._queue) < self.policy.batch_size and not self._closing \
+                    and not (self._flushing and self._queue):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(self.policy.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(size)]
+            self._inflight = size
+            return batch, self._closing and not self._queue
+
+    def _run(self):
+        while True:
+            batch, done = self._next_batch()
+            if batch:
+                try:
+                    self.sink(batch)
+                    flushed = len(batch)
+                except Exception as e:
+                    print(f"[LOG_FAIL] Sink failed, dropped {len(batch)} records: {e}")
+                    flushed = 0
+                with self._cond:
+                    self.counters["flushed"] += flushed
+                    self.counters["batches"] += 1
+                    if not flushed:
+                        self.counters["sink_errors"] += 1
+                        self.counters["dropped_sink"] += len(batch)
+                    self._inflight = 0
+                    self._cond.notify_all()
+            if done:
+                return
+
+    def flush(self, timeout=5.0) -> bool:
+        """Chờ tới khi mọi bản ghi đang chờ đã qua sink. Trả về False nếu hết giờ."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return not self._queue
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout=5.0):
+        """Tắt máy: gửi nốt hàng đợi rồi dừng thread (gọi từ atexit)."""
+        with self._cond:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._closing = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self.counters, "queued": len(self._queue), "policy": asdict(self.policy)}
@@ -0,0 +1,146 @@
+import os
+import time
+
+from google.adk.plugins.base_plugin import BasePlugin
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# Chạy dưới gunicorn (gunicorn.conf.py đặt PROMETHEUS_MULTIPROC_DIR): mỗi worker ghi số đo ra file mmap,
+# /metrics ở worker nào cũng gộp file của mọi worker -> số liệu là của cả pod, không phải của một worker.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Lượt /ask gồm cả Gemini + tool nên đuôi dài (tới vài chục giây)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8)
+
+REQUESTS = Counter("thay_tu_http_requests_total", "Số request HTTP theo route, method, mã trả về",
+                   ["route", "method", "status"])
+REQUEST_LATENCY = Histogram("thay_tu_http_request_duration_seconds", "Thời gian xử lý request (kể cả stream SSE)",
+                            ["route", "method"], buckets=REQUEST_BUCKETS)
+IN_FLIGHT = Gauge("thay_tu_http_requests_in_flight", "Số request đang xử lý", ["route"],
+                  multiprocess_mode="livesum")
+
+TOOL_CALLS = Counter("thay_tu_tool_calls_total", "Số lần agent gọi tool, theo trạng thái kết quả",
+                     ["tool", "status"])
+TOOL_LATENCY = Histogram("thay_tu_tool_duration_seconds", "Thời gian chạy một tool", ["tool"],
+                         buckets=TOOL_BUCKETS)
+LLM_CALLS = Counter("thay_tu_llm_calls_total", "Số lần gọi model", ["model", "status"])
+LLM_LATENCY = Histogram("thay_tu_llm_call_duration_seconds", "Thời gian một lần gọi model (tới phản hồi cuối)",
+                        ["model"], buckets=REQUEST_BUCKETS)
+LLM_TOKENS = Counter("thay_tu_llm_tokens_total", "Token đã dùng theo nguồn (agent, summarizer) và loại",
+                     ["source", "type"])
+LLM_COST = Counter("thay_tu_llm_cost_usd_total", "Chi phí ước tính (USD) theo bảng giá trong core/usage.py")
+MODEL_TIER_LATENCY = Histogram("thay_tu_llm_tier_duration_seconds",
+                               "Thời gian một lần gọi model theo hạng (standard, light, summary) để so sánh các model",
+                               ["tier", "model"], buckets=REQUEST_BUCKETS)
+MODEL_ROUTES = Counter("thay_tu_model_routes_total", "Lượt agent theo hạng model được chọn và lý do", ["tier", "reason"])
+MODEL_TIER_ESCALATIONS = Counter("thay_tu_model_tier_escalations_total",
+                                 "Lượt nhẹ chuyển sang model chính giữa chừng vì model đã gọi tool", ["tier"])
+LLM_RETRIES = Counter("thay_tu_llm_retries_total", "Số lần gọi lại model sau lỗi 5xx/429 (từng lần gọi, không cả lượt)",
+                      ["model", "error"])
+LLM_HEDGES = Counter("thay_tu_llm_hedges_total", "Bản sao gửi thêm khi lần gọi model chậm (launched) và số lần bản sao về trước (won)",
+                     ["model", "outcome"])
+DEADLINE_EXCEEDED = Counter("thay_tu_deadline_exceeded_total",
+                            "Request bị cắt / trả fallback vì hết deadline, theo bước phát hiện", ["stage"])
+AGENT_ACTIVE = Gauge("thay_tu_agent_runs_active", "Số lượt agent đang chạy (đã qua admission)", multiprocess_mode="livesum")
+AGENT_WAITING = Gauge("thay_tu_agent_runs_waiting", "Số lượt agent đang chờ suất chạy", multiprocess_mode="livesum")
+ADMISSION_QUEUE_TIME = Histogram("thay_tu_agent_queue_seconds", "Thời gian chờ suất chạy agent của các lượt được nhận",
+                                 buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10))
+ADMISSION_REJECTED = Counter("thay_tu_agent_rejected_total", "Lượt agent bị từ chối (503) theo lý do", ["reason"])
+TOOL_REUSED = Counter("thay_tu_tool_results_reused_total", "Lần gọi tool trả lại kết quả đã tính trong cùng lượt", ["tool"])
+
+SEARCH_CACHE = Counter("thay_tu_search_cache_events_total",
+                       "Sự kiện của cache tra cứu online (hits, stale_hits, misses, refreshes, ...)", ["event"])
+LIVE_SESSIONS = Gauge("thay_tu_live_sessions", "Số session đang lưu (đọc từ store lúc scrape)",
+                      multiprocess_mode="mostrecent")
+
+
+def request_started(route):
+    IN_FLIGHT.labels(route).inc()
+
+
+def request_finished(route, method, status, duration):
+    IN_FLIGHT.labels(route).dec()
+    REQUESTS.labels(route, method, str(status)).inc()
+    REQUEST_LATENCY.labels(route, method).observe(duration)
+
+
+def record_llm_retry(model, error):
+    LLM_RETRIES.labels(model, type(error).__name__ if error else "unknown").inc()
+
+
+def record_tokens(turn):
+    for source, usage in (("agent", turn.agent), ("summarizer", turn.summarizer)):
+        for kind in ("input", "output", "cached", "thought"):
+            amount = getattr(usage, f"{kind}_tokens")
+            if amount:
+                LLM_TOKENS.labels(source, kind).inc(amount)
+    if turn.cost_usd:
+        LLM_COST.inc(turn.cost_usd)
+
+
+def record_deadline(stage):
+    DEADLINE_EXCEEDED.labels(stage).inc()
+
+
+def record_search_cache(event, amount=1):
+    """Gắn vào SearchCache(on_count=...)."""
+    SEARCH_CACHE.labels(event).inc(amount)
+
+
+def render(refresh=None):
+    """Nội dung cho /metrics: (body, content_type). `refresh()` cập nhật các gauge đọc lúc scrape."""
+    if refresh is not None:
+        try:
+            refresh()
+        except Exception as e:
+            print(f"[METRICS] Refresh failed: {e}")
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsPlugin(BasePlugin):
+    """Plugin ADK: đếm và đo thời gian từng lần gọi tool / model của mọi lượt agent."""
+
+    def __init__(self):
+        super().__init__(name="thay_tu_metrics")
+        self._tool_started = {} # function_call_id -> perf_counter
+        self._model_started = {} # invocation_id -> (perf_counter, model)
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._tool_started[tool_context.function_call_id] = time.perf_counter()
+
+    def _finish_tool(self, tool, tool_context, status):
+        start = self._tool_started.pop(tool_context.function_call_id, None)
+        TOOL_CALLS.labels(tool.name, status).inc()
+        if start is not None:
+            TOOL_LATENCY.labels(tool.name).observe(time.perf_counter() - start)
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        # Tool của Thầy Tư trả lỗi trong dict {"status": "error"|"missing_info"|"fallback_internal"...}
+        status = result.get("status", "success") if isinstance(result, dict) else "success"
+        self._finish_tool(tool, tool_context, str(status))
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self._finish_tool(tool, tool_context, "exception")
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        self._model_started[callback_context.invocation_id] = (time.perf_counter(), llm_request.model or "unknown")
+
+    def _finish_model(self, callback_context, status):
+        start, model = self._model_started.pop(callback_context.invocation_id, (None, "unknown"))
+        LLM_CALLS.labels(model, status).inc()
+        if start is not None:
+            LLM_LATENCY.labels(model).observe(time.perf_counter() - start)
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial: # Stream: chỉ tính khi có phản hồi cuối
+            return
+        self._finish_model(callback_context, "error" if llm_response.error_code else "success")
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        self._finish_model(callback_context, type(error).__name__)
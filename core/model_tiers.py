@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from pydantic import PrivateAttr
+from google.adk.models import BaseLlm
+from google.adk.plugins.base_plugin import BasePlugin
+from opentelemetry import trace
+
+from core import metrics
+from core.replay_llm import build_model
+
+STANDARD = "standard"
+LIGHT = "light"
+SUMMARY = "summary"
+
+
+@dataclass(frozen=True)
+class ModelTierPolicy:
+    """Model cho từng hạng: lượt thường, lượt nhẹ (chào hỏi, hỏi tiếp, không cần tool) và tóm tắt compaction."""
+    standard_model: str = "gemini-2.5-flash"
+    light_model: str = "gemini-2.5-flash-lite" # Rỗng = mọi lượt dùng standard_model
+    summarizer_model: str = "gemini-2.5-flash-lite"
+    light_max_length: int = 80 # Câu dài hơn thì không coi là lượt nhẹ
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            standard_model=os.environ.get('AGENT_MODEL', cls.standard_model),
+            light_model=os.environ.get('AGENT_LIGHT_MODEL', cls.light_model),
+            summarizer_model=os.environ.get('SUMMARIZER_MODEL', cls.summarizer_model),
+            light_max_length=int(os.environ.get('MODEL_LIGHT_MAX_LENGTH', cls.light_max_length)),
+        )
+
+
+_current_tier = contextvars.ContextVar("model_tier", default=None)
+
+
+def current_tier():
+    return _current_tier.get()
+
+
+@contextmanager
+def use_tier(tier):
+    """Hạng model cho mọi lần gọi model của agent trong context (một lượt /ask)."""
+    token = _current_tier.set(tier)
+    try:
+        yield tier
+    finally:
+        _current_tier.reset(token)
+
+
+class TieredLlm(BaseLlm):
+    """
+    Gom các model theo hạng sau MỘT model của agent: lần gọi đi tới model có tên trùng `llm_request.model`
+    (ModelTierPlugin đặt theo hạng của lượt), không trùng thì dùng hạng mặc định.
+    Đo độ trễ từng lần gọi theo hạng để so sánh các model.
+    """
+
+    model: str = "tiered"
+    tiers: dict
+    default_tier: str = STANDARD
+
+    _lock: threading.Lock = PrivateAttr(default=None)
+    _counters: dict = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        self._lock = threading.Lock()
+        self._counters = {tier: {"calls": 0, "errors": 0, "seconds": 0.0} for tier in self.tiers}
+
+    @property
+    def policy(self):
+        """Chính sách retry của hạng mặc định (ngân sách retry cho cả lượt)."""
+        return self.tiers[self.default_tier].policy
+
+    def model_for(self, tier) -> str:
+        return self.tiers[tier if tier in self.tiers else self.default_tier].model
+
+    def _tier_of(self, model_name):
+        for tier, llm in self.tiers.items():
+            if llm.model == model_name:
+                return tier
+        return self.default_tier
+
+    async def generate_content_async(self, llm_request, stream=False):
+        tier = self._tier_of(llm_request.model)
+        llm = self.tiers[tier]
+        llm_request.model = llm.model
+        started = time.monotonic()
+        failed = False
+        try:
+            async for response in llm.generate_content_async(llm_request, stream=stream):
+                yield response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.MODEL_TIER_LATENCY.labels(tier, llm.model).observe(elapsed)
+            with self._lock:
+                counters = self._counters[tier]
+                counters["calls"] += 1
+                counters["errors"] += failed
+                counters["seconds"] += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {tier: dict(c) for tier, c in self._counters.items()}
+        tiers = {}
+        for tier, llm in self.tiers.items():
+            c = counters[tier]
+            tiers[tier] = {"model": llm.model, "calls": c["calls"], "errors": c["errors"],
+                           "avg_ms": round(c["seconds"] / c["calls"] * 1000, 1) if c["calls"] else None}
+            if hasattr(llm, "stats"):
+                tiers[tier]["llm"] = llm.stats()
+        return {"default_tier": self.default_tier, "tiers": tiers}
+
+
+def _has_tool_result(llm_request) -> bool:
+    """Lượt hiện tại đã có kết quả tool (nội dung cuối là function_response)."""
+    contents = llm_request.contents or []
+    return bool(contents) and any(part.function_response for part in contents[-1].parts or [])
+
+
+class ModelTierPlugin(BasePlugin):
+    """
+    Plugin ADK: đặt model cho từng lần gọi theo hạng của lượt (use_tier).
+    Lượt nhẹ mà model vẫn gọi tool thì các lần gọi sau trong lượt lên hạng mặc định,
+    để câu luận giải dựa trên kết quả tool do model chính viết.
+    """
+
+    def __init__(self, llm: TieredLlm):
+        super().__init__(name="thay_tu_model_tier")
+        self.llm = llm
+        self.escalations = 0
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        tier = _current_tier.get()
+        if tier is None or tier not in self.llm.tiers:
+            return None
+        if tier != self.llm.default_tier and _has_tool_result(llm_request):
+            self.escalations += 1
+            metrics.MODEL_TIER_ESCALATIONS.labels(tier).inc()
+            trace.get_current_span().add_event("llm.tier_escalated", {"from": tier, "to": self.llm.default_tier})
+            tier = self.llm.default_tier
+        llm_request.model = self.llm.model_for(tier)
+        return None
+
+
+def build_tiered_model(policy: ModelTierPolicy, **gemini_kwargs) -> TieredLlm:
+    """Model của agent: hạng standard, thêm hạng light nếu AGENT_LIGHT_MODEL khác model chính."""
+    tiers = {STANDARD: build_model(policy.standard_model, **gemini_kwargs)}
+    if policy.light_model and policy.light_model != policy.standard_model:
+        tiers[LIGHT] = build_model(policy.light_model, **gemini_kwargs)
+    return TieredLlm(model=policy.standard_model, tiers=tiers, default_tier=STANDARD)
+
+
+def build_summarizer_model(policy: ModelTierPolicy, **gemini_kwargs) -> TieredLlm:
+    """Model riêng cho tóm tắt compaction (SUMMARIZER_MODEL), đo độ trễ dưới hạng `summary`."""
+    return TieredLlm(model=policy.summarizer_model, tiers={SUMMARY: build_model(policy.summarizer_model, **gemini_kwargs)},
+                     default_tier=SUMMARY)
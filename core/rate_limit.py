@@ -0,0 +1,193 @@
+import os
+import time
+import sqlite3
+import threading
+
+from limits import parse_many
+
+
+class Budget:
+    """Ngân sách của một token bucket: tối đa `capacity` lượt, hồi đầy sau `period` giây (nạp đều)."""
+
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity)
+        self.period = float(period)
+        self.rate = self.capacity / self.period # token / giây
+
+    @classmethod
+    def parse(cls, text):
+        """'20 per minute; 100/day' -> [Budget, ...] (cú pháp của thư viện limits, như Flask-Limiter)."""
+        return [cls(item.amount, item.get_expiry()) for item in parse_many(text)]
+
+    def __repr__(self):
+        return f"{self.capacity:g}/{self.period:g}s"
+
+
+class MemoryBucketStore:
+    """Token bucket trong RAM của một process (chạy 1 worker hoặc khi không cần chia sẻ giữa worker)."""
+
+    def __init__(self):
+        self._buckets = {} # key -> (tokens, updated)
+        self._limited = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, budget, now):
+        """Lấy 1 token. Trả về 0 nếu được đi, ngược lại số giây phải chờ tới khi có token."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (budget.capacity, now))
+            tokens = min(budget.capacity, tokens + (now - updated) * budget.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / budget.rate
+
+    def record_limited(self, route):
+        with self._lock:
+            self._limited[route] = self._limited.get(route, 0) + 1
+
+    def limited_totals(self):
+        with self._lock:
+            return dict(self._limited)
+
+    def prune(self, older_than):
+        with self._lock:
+            for key in [k for k, (_, updated) in self._buckets.items() if updated < older_than]:
+                del self._buckets[key]
+
+
+class SqliteBucketStore:
+    """
+    Token bucket dùng chung cho mọi worker trên một máy (file SQLite, WAL).
+    Mỗi lần kiểm tra là MỘT câu UPSERT ... RETURNING theo khoá chính: nạp token theo thời gian trôi qua,
+    trừ 1 nếu đủ, nguyên tử nhờ SQLite tự khoá ghi -> O(1), không cần transaction nhiều bước.
+    """
+
+    _TAKE = (
+        "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?1, ?2 - 1, ?4) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        "tokens = MIN(?2, tokens + (?4 - updated) * ?3) - 1, updated = ?4 "
+        "WHERE MIN(?2, tokens + (?4 - updated) * ?3) >= 1 "
+        "RETURNING tokens"
+    )
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets ("
+                     "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID")
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_limited ("
+                     "route TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=2000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, budget, now):
+        conn = self._conn()
+        if conn.execute(self._TAKE, (key, budget.capacity, budget.rate, now)).fetchone() is not None:
+            return 0.0
+        # Bị chặn (hiếm): đọc lại số token để tính Retry-After
+        row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key=?", (key,)).fetchone()
+        tokens = min(budget.capacity, row[0] + (now - row[1]) * budget.rate) if row else 0.0
+        return max(0.0, (1 - tokens) / budget.rate)
+
+    def record_limited(self, route):
+        self._conn().execute("INSERT INTO rate_limited (route, count) VALUES (?, 1) "
+                             "ON CONFLICT(route) DO UPDATE SET count = count + 1", (route,))
+
+    def limited_totals(self):
+        return dict(self._conn().execute("SELECT route, count FROM rate_limited").fetchall())
+
+    def prune(self, older_than):
+        # Bucket không đụng tới lâu hơn chu kỳ dài nhất thì đã đầy lại -> xoá cũng như không
+        self._conn().execute("DELETE FROM rate_buckets WHERE updated < ?", (older_than,))
+
+
+class RateLimiter:
+    """
+    Giới hạn tần suất theo (route, IP) bằng token bucket, ngân sách riêng cho từng route.
+
+    - `routes`: {path: [Budget, ...]}; route không khai báo thì dùng `default`, [] = không giới hạn.
+    - Store: SqliteBucketStore (mọi worker trên máy dùng chung ngân sách) hoặc MemoryBucketStore.
+    - Lỗi store (SQLite bận/hỏng) thì cho qua: thà tốn thêm vài lượt còn hơn chặn nhầm người dùng.
+    """
+
+    def __init__(self, store, routes=None, default=None, enabled=True, prune_every=10000):
+        self.store = store
+        self.routes = dict(routes or {})
+        self.default = list(default or [])
+        self.enabled = enabled
+        self.prune_every = prune_every
+        self._longest = max((b.period for budgets in [self.default, *self.routes.values()] for b in budgets),
+                            default=0)
+        self._lock = threading.Lock()
+        self._checks = 0
+        self.counters = {} # route -> {"allowed", "limited", "errors"} của worker này
+
+    def budgets_for(self, route):
+        return self.routes.get(route, self.default)
+
+    def _count(self, route, name):
+        with self._lock:
+            counts = self.counters.setdefault(route, {"allowed": 0, "limited": 0, "errors": 0})
+            counts[name] += 1
+            self._checks += 1
+            return self._checks
+
+    def check(self, route, client_id, now=None):
+        """Trả về 0 nếu cho qua, ngược lại số giây nên chờ (dùng cho header Retry-After)."""
+        budgets = self.budgets_for(route) if self.enabled else ()
+        if not budgets:
+            return 0.0
+        now = time.time() if now is None else now
+        try:
+            wait = 0.0
+            for i, budget in enumerate(budgets):
+                wait = self.store.take(f"{route}|{i}|{client_id}", budget, now)
+                if wait:
+                    break
+            if wait:
+                self.store.record_limited(route)
+        except sqlite3.Error as e:
+            print(f"[RATE_LIMIT] Store failed, allowing request: {e}")
+            self._count(route, "errors")
+            return 0.0
+
+        checks = self._count(route, "limited" if wait else "allowed")
+        if checks % self.prune_every == 0:
+            try:
+                self.store.prune(now - self._longest)
+            except sqlite3.Error:
+                pass
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {route: dict(c) for route, c in self.counters.items()}
+        try:
+            limited_totals = self.store.limited_totals()
+        except sqlite3.Error:
+            limited_totals = {}
+        routes = {}
+        for route in sorted(set(self.routes) | set(counters) | set(limited_totals)):
+            routes[route] = {
+                "budget": [repr(b) for b in self.budgets_for(route)],
+                **counters.get(route, {"allowed": 0, "limited": 0, "errors": 0}),
+                "limited_all_workers": limited_totals.get(route, 0),
+            }
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.store).__name__,
+            "default_budget": [repr(b) for b in self.default],
+            "routes": routes,
+        }
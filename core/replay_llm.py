@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from pydantic import PrivateAttr
+from google.adk.models import BaseLlm, Gemini, LlmResponse
+from google.genai import types
+
+from core.resilient_llm import LlmRetryPolicy, ResilientLlm
+from core.search_cache import make_search_key
+
+logger = logging.getLogger(__name__)
+
+# Cassette mẫu đi kèm repo (các câu trong benchmarks/fixtures/ask_messages.jsonl)
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "benchmarks", "fixtures", "cassettes", "ask.jsonl")
+FALLBACK_REPLY = "Thầy nghe rồi nè con. Chuyện này con cứ bình tĩnh, từ từ thầy coi kỹ rồi nói tiếp nghen."
+
+
+def request_key(llm_request):
+    """
+    Khoá tra cassette cho một lần gọi model: (câu hỏi gần nhất của người dùng, bước).
+    Bước = số lượt trả kết quả tool sau câu hỏi đó (0 = lần gọi đầu của lượt hỏi).
+    """
+    contents = llm_request.contents or []
+    question, step = "", 0
+    for content in reversed(contents):
+        parts = content.parts or []
+        if any(part.function_response for part in parts):
+            step += 1
+            continue
+        if content.role == "user":
+            text = "".join(part.text for part in parts if part.text)
+            if text:
+                question = text
+                break
+    return make_search_key(question), step
+
+
+class LatencyModel:
+    """
+    Phân phối độ trễ giả lập (giây), cấu hình bằng chuỗi:
+      recorded              -> dùng đúng độ trễ đã ghi trong cassette (mặc định)
+      fixed:0.8             -> cố định
+      uniform:0.3,1.5       -> đều trong khoảng
+      normal:0.9,0.25       -> chuẩn (mean, std), cắt ở 0
+      lognormal:-0.2,0.5    -> log-chuẩn (mu, sigma của ln giây), có đuôi dài như API thật
+    """
+
+    KINDS = ("recorded", "fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec="recorded", seed=None):
+        kind, _, params = (spec or "recorded").strip().partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",")] if params else []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, recorded=0.0):
+        with self._lock:
+            if self.kind == "recorded":
+                return recorded
+            if self.kind == "fixed":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self._rng.uniform(*self.params)
+            if self.kind == "normal":
+                return max(0.0, self._rng.gauss(*self.params))
+            return self._rng.lognormvariate(*self.params)
+
+
+class Cassette:
+    """File JSONL các lượt gọi model đã ghi: mỗi dòng một lần gọi (khoá, các LlmResponse, mốc thời gian)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _add(self, entry):
+        key = (make_search_key(entry["question"]), entry.get("step", 0))
+        self._entries.setdefault(key, []).append(entry)
+
+    def __len__(self):
+        return sum(len(v) for v in self._entries.values())
+
+    def lookup(self, key):
+        return self._entries.get(key, ())
+
+    def append(self, entry):
+        with self._lock:
+            self._add(entry)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class ReplayLlm(BaseLlm):
+    """
+    Model giả thay Gemini: phát lại các phản hồi đã ghi (kể cả function call) theo khoá câu hỏi + bước,
+    với độ trễ lấy từ LatencyModel. Không tìm thấy thì trả câu mặc định (hoặc báo lỗi nếu strict).
+    Nhiều bản ghi cùng khoá thì chọn ngẫu nhiên (theo seed) -> tái lập được.
+    """
+
+    model: str = "replay"
+    cassette_path: str = DEFAULT_CASSETTE
+    latency: str = "recorded"
+    seed: int = 0
+    strict: bool = False
+
+    _cassette: Cassette = PrivateAttr(default=None)
+    _latency: LatencyModel = PrivateAttr(default=None)
+    _rng: random.Random = PrivateAttr(default=None)
+    _counters: dict = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        self._cassette = Cassette(self.cassette_path)
+        self._latency = LatencyModel(self.latency, self.seed)
+        self._rng = random.Random(self.seed)
+        self._counters = {"hits": 0, "misses": 0}
+
+    def stats(self) -> dict:
+        return {"cassette": self.cassette_path, "recorded_calls": len(self._cassette),
+                "latency": self.latency, **self._counters}
+
+    async def generate_content_async(self, llm_request, stream=False):
+        key = request_key(llm_request)
+        entries = self._cassette.lookup(key)
+        if entries:
+            self._counters["hits"] += 1
+            entry = entries[0] if len(entries) == 1 else self._rng.choice(entries)
+            responses = [LlmResponse.model_validate(r) for r in entry["responses"]]
+            offsets = entry.get("offsets") or [0.0] * len(responses)
+        else:
+            self._counters["misses"] += 1
+            if self.strict:
+                raise LookupError(f"No recorded response for {key!r} in {self.cassette_path}")
+            logger.warning("ReplayLlm: không có bản ghi cho %r, trả câu mặc định", key)
+            text = types.Part(text=FALLBACK_REPLY)
+            responses, offsets = [LlmResponse(content=types.Content(role="model", parts=[text]))], [0.0]
+
+        if not stream:
+            # Gọi không stream: chỉ trả các phản hồi hoàn chỉnh, như Gemini
+            kept = [(r, at) for r, at in zip(responses, offsets) if not r.partial] or list(zip(responses, offsets))
+            responses, offsets = [r for r, _ in kept], [at for _, at in kept]
+
+        # Giãn/co các mốc thời gian đã ghi theo tổng độ trễ lấy mẫu
+        recorded_total = offsets[-1]
+        total = self._latency.sample(recorded_total)
+        scale = total / recorded_total if recorded_total else None
+        elapsed = 0.0
+        for response, at in zip(responses, offsets):
+            target = at * scale if scale is not None else total
+            if target > elapsed:
+                await asyncio.sleep(target - elapsed)
+                elapsed = target
+            yield response
+
+
+class RecordingLlm(BaseLlm):
+    """Bọc model thật (Gemini), chuyển nguyên phản hồi cho runner và ghi từng lần gọi vào cassette."""
+
+    model: str = "record"
+    inner: BaseLlm
+    cassette_path: str = DEFAULT_CASSETTE
+
+    _cassette: Cassette = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._cassette = Cassette(self.cassette_path)
+
+    async def generate_content_async(self, llm_request, stream=False):
+        question, step = request_key(llm_request)
+        start = time.perf_counter()
+        responses, offsets = [], []
+        async for response in self.inner.generate_content_async(llm_request, stream=stream):
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            offsets.append(round(time.perf_counter() - start, 4))
+            yield response
+        if responses:
+            self._cassette.append({"question": question, "step": step, "model": self.inner.model,
+                                   "stream": stream, "responses": responses, "offsets": offsets})
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def build_model(model_name, **gemini_kwargs) -> ResilientLlm:
+    """
+    Chọn model cho runner theo THAY_TU_MODEL_BACKEND:
+      gemini (mặc định) -> Gemini thật
+      replay            -> ReplayLlm phát lại cassette (THAY_TU_CASSETTE, THAY_TU_MODEL_LATENCY,
+                           THAY_TU_MODEL_SEED, THAY_TU_REPLAY_STRICT)
+      record            -> RecordingLlm: gọi Gemini thật và ghi vào cassette
+    Model giả dùng chung một instance mỗi process (cassette chỉ nạp một lần).
+    Mọi backend đều được bọc ResilientLlm (retry/hedging từng lần gọi, cấu hình LLM_RETRY_* / LLM_HEDGE_*).
+    """
+    return ResilientLlm(model=model_name, inner=_build_backend(model_name, **gemini_kwargs),
+                        policy=LlmRetryPolicy.from_env())
+
+
+def _build_backend(model_name, **gemini_kwargs) -> BaseLlm:
+    backend = os.environ.get("THAY_TU_MODEL_BACKEND", "gemini").lower()
+    if backend == "gemini":
+        return Gemini(model=model_name, **gemini_kwargs)
+
+    cassette_path = os.environ.get("THAY_TU_CASSETTE", DEFAULT_CASSETTE)
+    with _shared_lock:
+        cache_key = (backend, model_name, cassette_path)
+        if cache_key not in _shared:
+            if backend == "replay":
+                _shared[cache_key] = ReplayLlm(
+                    model=model_name,
+                    cassette_path=cassette_path,
+                    latency=os.environ.get("THAY_TU_MODEL_LATENCY", "recorded"),
+                    seed=int(os.environ.get("THAY_TU_MODEL_SEED", 0)),
+                    strict=os.environ.get("THAY_TU_REPLAY_STRICT", "false").lower() == "true",
+                )
+            elif backend == "record":
+                _shared[cache_key] = RecordingLlm(model=model_name, cassette_path=cassette_path,
+                                                  inner=Gemini(model=model_name, **gemini_kwargs))
+            else:
+                raise ValueError(f"Unknown THAY_TU_MODEL_BACKEND: {backend!r}")
+        return _shared[cache_key]
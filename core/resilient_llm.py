@@ -0,0 +1,177 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+from pydantic import PrivateAttr
+from google.adk.models import BaseLlm
+from google.genai.errors import ClientError, ServerError
+from opentelemetry import trace
+
+from core import metrics
+from core.deadline import clamp
+
+
+@dataclass(frozen=True)
+class LlmRetryPolicy:
+    """Retry + hedging cho TỪNG lần gọi model (không chạy lại cả lượt agent, không gọi lại tool)."""
+    max_attempts: int = 4
+    base_delay: float = 1.0 # Backoff 1s, 2s, 4s... (có jitter), tối đa max_delay
+    max_delay: float = 8.0
+    request_budget: float = 45.0 # Tổng thời gian một lượt /ask được phép dành cho việc chờ retry
+    hedge_percentile: float = 0.0 # 95 = gọi thêm một bản sao khi lần gọi chậm hơn p95 gần đây; 0 = tắt
+    hedge_min_samples: int = 20
+    hedge_window: int = 200
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.environ.get('LLM_RETRY_ATTEMPTS', cls.max_attempts)),
+            base_delay=float(os.environ.get('LLM_RETRY_BASE_DELAY', cls.base_delay)),
+            max_delay=float(os.environ.get('LLM_RETRY_MAX_DELAY', cls.max_delay)),
+            request_budget=float(os.environ.get('LLM_RETRY_BUDGET', cls.request_budget)),
+            hedge_percentile=float(os.environ.get('LLM_HEDGE_PERCENTILE', cls.hedge_percentile)),
+        )
+
+
+def is_retryable(error) -> bool:
+    """Gemini quá tải / lỗi phía server (5xx) hoặc hết quota tạm thời (429)."""
+    return isinstance(error, ServerError) or (isinstance(error, ClientError) and error.code == 429)
+
+
+_retry_deadline = contextvars.ContextVar("llm_retry_deadline", default=None)
+
+
+@contextmanager
+def retry_budget(seconds):
+    """Ngân sách retry cho cả một request: mọi lần gọi model trong context không chờ retry quá mốc này."""
+    token = _retry_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _retry_deadline.reset(token)
+
+
+class ResilientLlm(BaseLlm):
+    """
+    Bọc model thật: retry với backoff khi Gemini trả 5xx/429, chỉ trong phạm vi MỘT lần gọi model.
+    Stream đã gửi phản hồi đầu tiên thì không retry nữa (runner đã nhận dữ liệu).
+    Tuỳ chọn hedging cho lần gọi không stream: quá phân vị độ trễ gần đây mà chưa xong
+    thì gửi thêm một bản sao, lấy kết quả về trước, huỷ bản còn lại.
+    """
+
+    model: str = "resilient"
+    inner: BaseLlm
+    policy: LlmRetryPolicy = LlmRetryPolicy()
+
+    _latencies: deque = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default=None)
+    _rng: random.Random = PrivateAttr(default=None)
+    _counters: dict = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        self._latencies = deque(maxlen=self.policy.hedge_window)
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._counters = {"calls": 0, "retries": 0, "gave_up": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"model": self.model, **self._counters, "hedge_after_s": self._hedge_delay()}
+        if hasattr(self.inner, "stats"):
+            stats["inner"] = self.inner.stats()
+        stats["policy"] = asdict(self.policy)
+        return stats
+
+    def _hedge_delay(self):
+        """Độ trễ (giây) ở phân vị hedge_percentile của các lần gọi gần đây; None = chưa/không hedge."""
+        policy = self.policy
+        if policy.hedge_percentile <= 0 or len(self._latencies) < policy.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * policy.hedge_percentile / 100))
+        return round(ordered[index], 3)
+
+    def _backoff(self, attempt):
+        # Full jitter: các worker bị 503 cùng lúc không dội lại Gemini cùng một nhịp
+        ceiling = min(self.policy.max_delay, self.policy.base_delay * 2 ** (attempt - 1))
+        return self._rng.uniform(ceiling / 2, ceiling)
+
+    async def _collect(self, llm_request):
+        return [response async for response in self.inner.generate_content_async(llm_request, stream=False)]
+
+    async def _hedged(self, llm_request):
+        with self._lock:
+            delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._collect(llm_request))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        metrics.LLM_HEDGES.labels(self.model, "launched").inc()
+        trace.get_current_span().add_event("llm.hedge", {"after_s": delay})
+        hedge = asyncio.ensure_future(self._collect(llm_request.model_copy(deep=True)))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                            metrics.LLM_HEDGES.labels(self.model, "won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            yielded = False
+            try:
+                if stream:
+                    async for response in self.inner.generate_content_async(llm_request, stream=True):
+                        yielded = True
+                        yield response
+                else:
+                    responses = await self._hedged(llm_request)
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - started)
+                    for response in responses:
+                        yielded = True
+                        yield response
+                return
+            except Exception as e:
+                if yielded or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                deadline = _retry_deadline.get()
+                # Chờ xong mà request đã hết hạn (core.deadline) hay hết ngân sách retry thì bỏ cuộc luôn
+                if attempt >= self.policy.max_attempts or delay >= clamp(float("inf")) \
+                        or (deadline is not None and time.monotonic() + delay >= deadline):
+                    self._count("gave_up")
+                    raise
+                self._count("retries")
+                metrics.record_llm_retry(self.model, e)
+                trace.get_current_span().add_event("llm.retry", {"attempt": attempt, "sleep_s": round(delay, 3),
+                                                                 "error": str(e)[:200]})
+                await asyncio.sleep(delay)
@@ -0,0 +1,207 @@
+import os
+import queue
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+
+from google.adk.runners import Runner
+from google.adk.apps import App
+from google.adk.apps.app import EventsCompactionConfig
+
+from core.metrics import MetricsPlugin
+from core.model_tiers import ModelTierPolicy, build_summarizer_model
+from core.usage import MeteredEventSummarizer
+
+APP_NAME = "thay_tu_app"
+
+
+class AgentRuntime:
+    """
+    Gemini client + summarizer + App + Runner, dựng MỘT lần cho mỗi worker.
+    Runner không giữ state theo request nên dùng chung an toàn cho mọi lượt hỏi.
+    """
+
+    def __init__(self, root_agent, session_service, memory_service, tier_policy: ModelTierPolicy = None, plugins=()):
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        # Gemini tự giữ một genai Client (và connection pool) cho mỗi event loop.
+        # Tóm tắt compaction chạy trên model nhẹ riêng (SUMMARIZER_MODEL);
+        # chạy offline (THAY_TU_MODEL_BACKEND=replay) thì summarizer cũng dùng model giả.
+        self.llm = build_summarizer_model(tier_policy or ModelTierPolicy.from_env(), api_key=api_key)
+        self.summarizer = MeteredEventSummarizer(llm=self.llm) # Token của compaction cộng vào lượt đang chạy
+
+        self.compaction_config = EventsCompactionConfig(
+            summarizer=self.summarizer,
+            compaction_interval=50, # High interval to reduce load
+            overlap_size=2
+        )
+
+        self.app = App(
+            name=APP_NAME,
+            root_agent=root_agent,
+            events_compaction_config=self.compaction_config,
+            # Plugin của app chạy trước (vd dùng lại kết quả tool), rồi đếm/đo từng lần gọi tool và model cho /metrics
+            plugins=[*plugins, MetricsPlugin()]
+        )
+
+        self.runner = Runner(
+            app=self.app,
+            session_service=session_service,
+            memory_service=memory_service
+        )
+
+    async def close(self):
+        await self.runner.close()
+
+
+class AgentLoop:
+    """
+    Một event loop chạy nền suốt đời worker.
+
+    Flask (qua asgiref) tạo event loop mới cho mỗi request async, nên client HTTP
+    gắn với loop cũ không dùng lại được. Đẩy mọi coroutine của agent về một loop
+    cố định giúp Gemini client giữ được kết nối giữa các request.
+    """
+
+    def __init__(self, name="thay-tu-agent-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Khởi động lười + kiểm tra pid để an toàn khi gunicorn fork worker
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._serve, args=(loop,), name=self.name, daemon=True)
+                thread.start()
+                self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        return self._loop
+
+    @staticmethod
+    def _serve(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """
+        Đưa coroutine vào loop nền, giữ nguyên contextvars của thread gọi (Flask g, trace_id...).
+        `future.cancel()` từ thread gọi huỷ luôn task trên loop nền (task nhận CancelledError).
+        """
+        loop = self._ensure_started()
+        ctx = contextvars.copy_context()
+        # Cố ý để future ở trạng thái PENDING suốt lúc task chạy (không set_running_or_notify_cancel):
+        # future RUNNING thì cancel() trả False và task không bao giờ bị huỷ
+        future = concurrent.futures.Future()
+
+        def _start():
+            if future.cancelled():
+                coro.close()
+                return
+            task = loop.create_task(coro, context=ctx)
+
+            def _copy_result(t):
+                if future.done(): # Bên gọi đã huỷ
+                    return
+                try:
+                    if t.cancelled():
+                        future.cancel()
+                    elif t.exception() is not None:
+                        future.set_exception(t.exception())
+                    else:
+                        future.set_result(t.result())
+                except concurrent.futures.InvalidStateError:
+                    pass # Bị huỷ từ thread gọi ngay lúc task xong
+
+            task.add_done_callback(_copy_result)
+            future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        loop.call_soon_threadsafe(_start)
+        return future
+
+    def run(self, coro, timeout=None):
+        """Chạy coroutine trên loop nền và chờ kết quả (gọi từ thread của Flask)."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel() # -> task.cancel() trên loop nền, lượt agent dừng ở lần await kế tiếp
+            raise
+
+    def iterate(self, agen, timeout=None):
+        """
+        Tiêu thụ một async generator trên loop nền, trả từng phần tử về thread gọi.
+        Cả generator chạy trong MỘT task (context không bị cắt giữa các lần yield);
+        bên gọi đóng generator này (client ngắt SSE) hoặc hết timeout thì task bị huỷ theo
+        và phần đã sinh ra sau đó bị bỏ, không dồn vào hàng đợi không ai đọc.
+        """
+        items = queue.Queue()
+        closed = threading.Event()
+
+        async def _pump():
+            try:
+                async for item in agen:
+                    if closed.is_set():
+                        break
+                    items.put((True, item))
+            except BaseException as e:
+                items.put((False, e))
+                raise
+            finally:
+                items.put((False, None))
+                await agen.aclose() # Chạy finally của generator (trả suất admission, ghi usage...) ngay trên loop
+
+        future = self.submit(_pump())
+        try:
+            while True:
+                try:
+                    ok, item = items.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"Không nhận được phần tử nào sau {timeout}s") from None # Như run()
+                if ok:
+                    yield item
+                elif item is None:
+                    return
+                else:
+                    raise item
+        finally:
+            closed.set()
+            future.cancel() # -> task.cancel() trên loop nền
+
+    def shutdown(self, *cleanups, timeout=10):
+        """Chạy các coroutine dọn dẹp trên loop nền rồi dừng loop (dùng cho atexit)."""
+        if self._loop is None or self._pid != os.getpid():
+            return
+        for cleanup in cleanups:
+            try:
+                self.run(cleanup(), timeout=timeout)
+            except Exception as e:
+                print(f"[SHUTDOWN] {cleanup} failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop = None
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime(factory) -> AgentRuntime:
+    """Trả về AgentRuntime của worker hiện tại, dựng bằng `factory` ở lần gọi đầu."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = factory()
+    return _runtime
+
+
+async def close_runtime():
+    global _runtime
+    if _runtime is not None:
+        runtime, _runtime = _runtime, None
+        await runtime.close()
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_search_key(*parts) -> str:
+    """Chuẩn hoá khoá tra cứu: NFC + chữ thường + gộp khoảng trắng ('Tài  Lộc ' == 'tài lộc')."""
+    normalized = []
+    for part in parts:
+        text = unicodedata.normalize("NFC", str(part)).lower()
+        normalized.append(" ".join(text.split()))
+    return "|".join(normalized)
+
+
+class SearchCache:
+    """
+    Cache kết quả tra cứu online, hai tầng:
+    - LRU trong RAM: trúng là trả về ngay (vài µs).
+    - SQLite: sống qua restart và dùng chung giữa các worker.
+
+    Vòng đời một entry:
+    - tuổi < ttl                 -> fresh, trả về luôn
+    - ttl <= tuổi < ttl + stale  -> trả bản cũ ngay, làm mới ở thread nền (stale-while-revalidate)
+    - quá hạn / chưa có          -> gọi loader đồng bộ (mỗi key chỉ một lượt gọi cùng lúc)
+    Loader trả về rỗng/None thì không cache (lỗi mạng thường chỉ thoáng qua).
+    """
+
+    def __init__(self, db_path, ttl=24 * 3600, stale_ttl=7 * 24 * 3600, max_entries=5000,
+                 memory_entries=1000, refresh_workers=2, on_count=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory = OrderedDict() # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._inflight = {} # key -> threading.Event (singleflight)
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="search-refresh")
+        self._local = threading.local()
+        self._writes = 0
+        self._on_count = on_count # Hook (name, amount) để đẩy bộ đếm ra ngoài, vd Prometheus
+
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0,
+                         "refresh_errors": 0, "load_errors": 0, "evictions": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS idx_search_cache_stored_at ON search_cache (stored_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=2000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+        if self._on_count is not None:
+            self._on_count(name, amount)
+
+    # --- Storage tiers ---
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self._memory[key] = (stored_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        row = self._conn().execute("SELECT stored_at, value FROM search_cache WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], json.loads(row[1]))
+        self._remember(key, *entry)
+        return entry
+
+    def _store(self, key, value):
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO search_cache (key, value, stored_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value, stored_at=excluded.stored_at",
+                (key, json.dumps(value, ensure_ascii=False), stored_at),
+            )
+            with self._lock: # _store chạy trên thread của executor
+                self._writes += 1
+                prune = self._writes % 100 == 0
+            if prune:
+                self._prune(conn) # Ngoài lock: _prune gọi _count
+        except sqlite3.Error as e:
+            print(f"[SEARCH_CACHE] Persist failed: {e}")
+
+    def _prune(self, conn):
+        # Giữ tối đa max_entries dòng, bỏ các entry cũ nhất
+        excess = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN (SELECT key FROM search_cache ORDER BY stored_at LIMIT ?)",
+                (excess,),
+            )
+            self._count("evictions", excess)
+
+    # --- Public API ---
+    def get_fresh(self, key):
+        """Chỉ tra RAM, không chạm SQLite hay loader -> gọi thẳng trên event loop được. None nếu chưa có bản tươi."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                return None
+            self._memory.move_to_end(key)
+            value = entry[1]
+        self._count("hits")
+        return value
+
+    def get_or_load(self, key, loader):
+        """Trả về giá trị cho `key`, gọi `loader()` khi chưa có hoặc đã quá hạn. None nếu loader thất bại."""
+        entry = self._lookup(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count("hits")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._schedule_refresh(key, loader)
+                return value
+
+        self._count("misses")
+        return self._load_once(key, loader)
+
+    def _load_once(self, key, loader):
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+        if waiter is not None:
+            # Đã có request khác đang tra cùng key -> chờ dùng chung kết quả
+            waiter.wait()
+            entry = self._lookup(key)
+            return entry[1] if entry else None
+
+        try:
+            value = loader()
+            if value:
+                self._store(key, value)
+            return value or None
+        except Exception as e:
+            self._count("load_errors")
+            print(f"[SEARCH_CACHE] Load failed for '{key}': {e}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def _schedule_refresh(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresher.submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            if value:
+                self._store(key, value)
+                self._count("refreshes")
+        except Exception as e:
+            self._count("refresh_errors")
+            print(f"[SEARCH_CACHE] Background refresh failed for '{key}': {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            memory_size = len(self._memory)
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0.0
+        counters["memory_entries"] = memory_size
+        return counters
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, asdict
+
+from core.tracing import traced
+
+try:
+    import fcntl
+except ImportError: # Windows: không có flock -> worker nào cũng tự dọn
+    fcntl = None
+
+
+@dataclass(frozen=True)
+class SessionBudget:
+    """Ngân sách cho session: hết hạn khi nhàn rỗi, trần số session và số event mỗi session."""
+    idle_ttl: float = 24 * 3600
+    max_sessions: int = 100_000
+    max_events_per_session: int = 300
+    sweep_interval: float = 300
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            idle_ttl=float(os.environ.get('SESSION_IDLE_TTL', cls.idle_ttl)),
+            max_sessions=int(os.environ.get('SESSION_MAX_COUNT', cls.max_sessions)),
+            max_events_per_session=int(os.environ.get('SESSION_MAX_EVENTS', cls.max_events_per_session)),
+            sweep_interval=float(os.environ.get('SESSION_SWEEP_INTERVAL', cls.sweep_interval)),
+        )
+
+
+class SessionSweeper:
+    """
+    Thread nền dọn session theo SessionBudget: TTL nhàn rỗi -> LRU theo trần số session
+    -> cắt event cũ của session quá dài.
+
+    Nhiều worker cùng chạy nhưng chỉ worker giữ được file lock mới dọn (đỡ tranh ghi SQLite);
+    worker đó chết thì worker khác tự nhận lock ở vòng sau.
+    """
+
+    def __init__(self, store, budget: SessionBudget, lock_path=None):
+        self.store = store
+        self.budget = budget
+        self.lock_path = lock_path
+        self.last_sweep = None
+        self._lock_file = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        """Khởi động thread (lười, theo pid) - gọi được nhiều lần, kể cả sau khi gunicorn fork."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._lock_file = None
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _is_leader(self) -> bool:
+        if fcntl is None or self.lock_path is None:
+            return True
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file # Giữ file mở = giữ lock tới khi process chết
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.budget.sweep_interval):
+            try:
+                if self._is_leader():
+                    self.sweep_once()
+            except Exception as e:
+                print(f"[SESSION_SWEEPER] Sweep failed: {e}")
+
+    @staticmethod
+    def _drain(step):
+        # Mỗi bước xử lý theo lô; lặp tới khi hết việc
+        total = 0
+        while True:
+            done = step()
+            total += done
+            if done == 0:
+                return total
+
+    @traced("session_sweeper.sweep")
+    def sweep_once(self) -> dict:
+        start = time.perf_counter()
+        cutoff = time.time() - self.budget.idle_ttl
+        result = {
+            "evicted_idle": self._drain(lambda: self.store.evict_idle(cutoff)),
+            "evicted_lru": self._drain(lambda: self.store.evict_lru(self.budget.max_sessions)),
+            "events_trimmed": self._drain(lambda: self.store.trim_events(self.budget.max_events_per_session)),
+        }
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["at"] = time.time()
+        self.last_sweep = result
+        return result
+
+    def stats(self) -> dict:
+        return {
+            **self.store.storage_stats(),
+            "last_sweep": self.last_sweep,
+            "budget": asdict(self.budget),
+        }
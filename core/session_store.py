@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import functools
+import threading
+import concurrent.futures
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.errors import StaleSessionError
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.errors.session_not_found_error import SessionNotFoundError
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from core.tracing import traced
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+) WITHOUT ROWID;
+
+-- Append-only: mỗi event là một dòng mới, không bao giờ UPDATE
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_session ON events (app_name, user_id, session_id, seq);
+CREATE INDEX IF NOT EXISTS idx_sessions_update_time ON sessions (update_time);
+
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+) WITHOUT ROWID;
+
+-- Bộ đếm dọn dẹp, dùng chung cho mọi worker
+CREATE TABLE IF NOT EXISTS store_counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _split_state(state: dict) -> tuple[dict, dict, dict]:
+    """Tách state theo scope: (app:, user:, session). Bỏ temp: vì không được lưu."""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _merge_state(app_state: dict, user_state: dict, session_state: dict) -> dict:
+    merged = dict(session_state)
+    merged.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+    merged.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+    return merged
+
+
+class SharedSqliteSessionService(BaseSessionService):
+    """
+    Session service lưu trên một file SQLite (WAL) mà mọi gunicorn worker cùng máy đọc/ghi chung,
+    nên request của một user rơi vào worker nào cũng thấy đủ lịch sử.
+
+    - Tra cứu theo khoá (app_name, user_id, session_id) dùng primary key / index.
+    - Event chỉ được INSERT thêm (append-only), không ghi đè cả session.
+    - Mỗi thread giữ một connection riêng. Đọc (WAL, không chờ khoá) chạy thẳng trên event loop vì chỉ
+      tốn cỡ vài chục µs; ghi (BEGIN IMMEDIATE) chạy trên thread pool riêng, vì khi worker khác hay
+      SessionSweeper đang giữ khoá ghi thì có thể phải chờ tới busy_timeout - không được chặn event loop
+      dùng chung của mọi lượt agent trong worker.
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000, write_threads: int = 2):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_threads = write_threads
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn().executescript(SCHEMA_SQL)
+
+    # --- Connection helpers ---
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _writer(self) -> concurrent.futures.ThreadPoolExecutor:
+        # Dựng lười + kiểm tra pid: thread không sống sót qua fork của gunicorn
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        self.write_threads, thread_name_prefix="session-store-write")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    async def _off_loop(self, fn, *args, **kwargs):
+        """Chạy thao tác ghi đồng bộ trên thread pool ghi, event loop vẫn phục vụ các lượt khác."""
+        return await asyncio.get_running_loop().run_in_executor(self._writer(), functools.partial(fn, *args, **kwargs))
+
+    @contextmanager
+    def _write(self):
+        """Transaction ghi ngắn; BEGIN IMMEDIATE để các worker xếp hàng thay vì deadlock."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _load_json(conn, query, params) -> dict:
+        row = conn.execute(query, params).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _app_state(self, conn, app_name):
+        return self._load_json(conn, "SELECT state FROM app_states WHERE app_name=?", (app_name,))
+
+    def _user_state(self, conn, app_name, user_id):
+        return self._load_json(conn, "SELECT state FROM user_states WHERE app_name=? AND user_id=?", (app_name, user_id))
+
+    def _upsert_scoped_state(self, conn, app_name, user_id, app_delta, user_delta):
+        if app_delta:
+            state = self._app_state(conn, app_name)
+            state.update(app_delta)
+            conn.execute(
+                "INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                "ON CONFLICT(app_name) DO UPDATE SET state=excluded.state",
+                (app_name, json.dumps(state, ensure_ascii=False)),
+            )
+        if user_delta:
+            state = self._user_state(conn, app_name, user_id)
+            state.update(user_delta)
+            conn.execute(
+                "INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT(app_name, user_id) DO UPDATE SET state=excluded.state",
+                (app_name, user_id, json.dumps(state, ensure_ascii=False)),
+            )
+
+    # --- BaseSessionService ---
+    @traced("session_store.create_session")
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        return await self._off_loop(self._create_session, app_name, user_id, session_id, state)
+
+    def _create_session(self, app_name, user_id, session_id, state) -> Session:
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+
+        with self._write() as conn:
+            self._upsert_scoped_state(conn, app_name, user_id, app_delta, user_delta)
+            try:
+                conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, session_id, state, create_time, update_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, json.dumps(session_state, ensure_ascii=False), now, now),
+                )
+            except sqlite3.IntegrityError:
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            merged = _merge_state(self._app_state(conn, app_name), self._user_state(conn, app_name, user_id), session_state)
+
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=merged, events=[], last_update_time=now)
+
+    @traced("session_store.get_session")
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT state, update_time FROM sessions WHERE app_name=? AND user_id=? AND session_id=?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+        session_state, update_time = json.loads(row[0]), row[1]
+
+        events = []
+        if not (config and config.num_recent_events == 0):
+            query = "SELECT data FROM events WHERE app_name=? AND user_id=? AND session_id=?"
+            params: list[Any] = [app_name, user_id, session_id]
+            if config and config.after_timestamp:
+                query += " AND timestamp >= ?"
+                params.append(config.after_timestamp)
+            query += " ORDER BY seq DESC"
+            if config and config.num_recent_events is not None:
+                query += " LIMIT ?"
+                params.append(config.num_recent_events)
+            rows = conn.execute(query, params).fetchall()
+            events = [Event.model_validate_json(data) for (data,) in reversed(rows)]
+
+        merged = _merge_state(self._app_state(conn, app_name), self._user_state(conn, app_name, user_id), session_state)
+        return Session(
+            app_name=app_name, user_id=user_id, id=session_id,
+            state=merged, events=events, last_update_time=update_time,
+        )
+
+    @traced("session_store.list_sessions")
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        conn = self._conn()
+        if user_id is None:
+            rows = conn.execute(
+                "SELECT user_id, session_id, state, update_time FROM sessions WHERE app_name=? ORDER BY update_time",
+                (app_name,),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT user_id, session_id, state, update_time FROM sessions WHERE app_name=? AND user_id=? ORDER BY update_time",
+                (app_name, user_id),
+            ).fetchall()
+
+        app_state = self._app_state(conn, app_name)
+        user_states = {}
+        sessions = []
+        for uid, sid, state, update_time in rows:
+            if uid not in user_states:
+                user_states[uid] = self._user_state(conn, app_name, uid)
+            sessions.append(Session(
+                app_name=app_name, user_id=uid, id=sid,
+                state=_merge_state(app_state, user_states[uid], json.loads(state)),
+                events=[], last_update_time=update_time,
+            ))
+        return ListSessionsResponse(sessions=sessions)
+
+    @traced("session_store.delete_session")
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self._off_loop(self._delete_session, app_name, user_id, session_id)
+
+    def _delete_session(self, app_name, user_id, session_id):
+        with self._write() as conn:
+            conn.execute("DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=?", (app_name, user_id, session_id))
+            conn.execute("DELETE FROM sessions WHERE app_name=? AND user_id=? AND session_id=?", (app_name, user_id, session_id))
+
+    @traced("session_store.append_event")
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        self._apply_temp_state(session, event)
+        event = self._trim_temp_delta_state(event)
+
+        session.last_update_time = await self._off_loop(self._insert_event, session, event)
+        return self._commit_event_to_session(session, event)
+
+    def _insert_event(self, session: Session, event: Event) -> float:
+        """Ghi event + cập nhật state trong một transaction; trả về update_time mới của session."""
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT state, update_time FROM sessions WHERE app_name=? AND user_id=? AND session_id=?",
+                (session.app_name, session.user_id, session.id),
+            ).fetchone()
+            if row is None:
+                raise SessionNotFoundError(f"Session {session.id} not found.")
+            stored_state, stored_update_time = row
+            if stored_update_time > session.last_update_time:
+                raise StaleSessionError(
+                    "The last_update_time provided in the session object is earlier than the update_time in storage."
+                )
+
+            update_time = max(event.timestamp, stored_update_time)
+            session_state_json = stored_state
+            if event.actions and event.actions.state_delta:
+                app_delta, user_delta, session_delta = _split_state(event.actions.state_delta)
+                self._upsert_scoped_state(conn, session.app_name, session.user_id, app_delta, user_delta)
+                if session_delta:
+                    merged = json.loads(stored_state)
+                    merged.update(session_delta)
+                    session_state_json = json.dumps(merged, ensure_ascii=False)
+
+            conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, event_id, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (session.app_name, session.user_id, session.id, event.id, event.timestamp,
+                 event.model_dump_json(exclude_none=True)),
+            )
+            conn.execute(
+                "UPDATE sessions SET state=?, update_time=? WHERE app_name=? AND user_id=? AND session_id=?",
+                (session_state_json, update_time, session.app_name, session.user_id, session.id),
+            )
+        return update_time
+
+    # --- Lifecycle (SessionSweeper gọi định kỳ, mỗi lần xử lý một lô nhỏ để transaction ngắn) ---
+    @staticmethod
+    def _bump(conn, name, amount):
+        if amount:
+            conn.execute(
+                "INSERT INTO store_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, amount),
+            )
+
+    @staticmethod
+    def _delete_sessions(conn, keys):
+        conn.executemany("DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=?", keys)
+        conn.executemany("DELETE FROM sessions WHERE app_name=? AND user_id=? AND session_id=?", keys)
+
+    def evict_idle(self, cutoff: float, limit: int = 1000) -> int:
+        """Xoá session không hoạt động từ trước `cutoff` (epoch seconds)."""
+        with self._write() as conn:
+            keys = conn.execute(
+                "SELECT app_name, user_id, session_id FROM sessions WHERE update_time < ? LIMIT ?",
+                (cutoff, limit),
+            ).fetchall()
+            self._delete_sessions(conn, keys)
+            self._bump(conn, "evicted_idle", len(keys))
+        return len(keys)
+
+    def evict_lru(self, max_sessions: int, limit: int = 1000) -> int:
+        """Giữ tối đa `max_sessions`: xoá các session lâu không dùng nhất (LRU theo update_time)."""
+        with self._write() as conn:
+            live = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            excess = min(live - max_sessions, limit)
+            if excess <= 0:
+                return 0
+            keys = conn.execute(
+                "SELECT app_name, user_id, session_id FROM sessions ORDER BY update_time LIMIT ?",
+                (excess,),
+            ).fetchall()
+            self._delete_sessions(conn, keys)
+            self._bump(conn, "evicted_lru", len(keys))
+        return len(keys)
+
+    def trim_events(self, max_events: int, limit: int = 100) -> int:
+        """
+        Cắt bớt event cũ của các session dài hơn `max_events`.
+        Điểm cắt dời tới lượt hỏi kế tiếp của user để không bỏ dở cặp function_call/function_response.
+        Tìm session dài bằng một lần đọc thường (WAL: không giữ khoá ghi, quét cả bảng cũng không chặn
+        worker nào); khoá ghi chỉ giữ cho từng session lúc tìm điểm cắt và DELETE (đi theo index).
+        """
+        heavy = self._conn().execute(
+            "SELECT app_name, user_id, session_id FROM events "
+            "GROUP BY app_name, user_id, session_id HAVING COUNT(*) > ? LIMIT ?",
+            (max_events, limit),
+        ).fetchall()
+        deleted = 0
+        for key in heavy:
+            with self._write() as conn:
+                boundary = conn.execute(
+                    "SELECT seq FROM events WHERE app_name=? AND user_id=? AND session_id=? "
+                    "ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                    (*key, max_events - 1),
+                ).fetchone()
+                if boundary is None: # Session vừa bị xoá / cắt bởi worker khác sau lần đọc
+                    continue
+                cut = conn.execute(
+                    "SELECT MIN(seq) FROM events WHERE app_name=? AND user_id=? AND session_id=? "
+                    "AND seq >= ? AND json_extract(data, '$.author') = 'user'",
+                    (*key, boundary[0]),
+                ).fetchone()[0]
+                trimmed = conn.execute(
+                    "DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=? AND seq < ?",
+                    (*key, cut if cut is not None else boundary[0]),
+                ).rowcount
+                self._bump(conn, "events_trimmed", trimmed)
+            deleted += trimmed
+        return deleted
+
+    def storage_stats(self) -> dict:
+        """Số session đang sống, dung lượng đang giữ (bytes) và các bộ đếm dọn dẹp."""
+        conn = self._conn()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        stats = {
+            "live_sessions": conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "bytes_retained": (page_count - freelist) * page_size,
+            "evicted_idle": 0,
+            "evicted_lru": 0,
+            "events_trimmed": 0,
+        }
+        stats.update(dict(conn.execute("SELECT name, value FROM store_counters").fetchall()))
+        return stats
@@ -0,0 +1,61 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+from core import metrics
+
+# Kết quả tool báo lỗi / thiếu dữ liệu thì không dùng lại: lần gọi sau có thể thành công
+NON_REUSABLE_STATUSES = frozenset(("error", "missing_info"))
+
+
+def call_key(tool_name, tool_args) -> str:
+    return tool_name + ":" + json.dumps(tool_args or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ToolResultReusePlugin(BasePlugin):
+    """
+    Plugin ADK: trong cùng một lượt (invocation), model gọi lại một tool với đúng tham số đã chạy
+    (vd sau khi lần gọi model kế tiếp được retry) thì trả luôn kết quả cũ, không tính / tra cứu lại.
+    Chỉ giữ kết quả của `max_invocations` lượt gần nhất (lượt lỗi giữa chừng có thể không dọn được).
+    """
+
+    def __init__(self, max_invocations=256):
+        super().__init__(name="thay_tu_tool_reuse")
+        self.max_invocations = max_invocations
+        self._results = OrderedDict() # invocation_id -> {call_key: result}
+        self._lock = threading.Lock()
+        self.counters = {"reused": 0, "stored": 0}
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        with self._lock:
+            result = self._results.get(tool_context.invocation_id, {}).get(call_key(tool.name, tool_args))
+            if result is None:
+                return None
+            self.counters["reused"] += 1
+        metrics.TOOL_REUSED.labels(tool.name).inc()
+        return copy.deepcopy(result)
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        if not isinstance(result, dict) or result.get("status") in NON_REUSABLE_STATUSES:
+            return None
+        with self._lock:
+            calls = self._results.setdefault(tool_context.invocation_id, {})
+            self._results.move_to_end(tool_context.invocation_id)
+            key = call_key(tool.name, tool_args)
+            if key not in calls:
+                calls[key] = copy.deepcopy(result)
+                self.counters["stored"] += 1
+            while len(self._results) > self.max_invocations:
+                self._results.popitem(last=False)
+        return None
+
+    async def after_run_callback(self, *, invocation_context):
+        with self._lock:
+            self._results.pop(invocation_context.invocation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "open_invocations": len(self._results)}
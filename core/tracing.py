@@ -0,0 +1,128 @@
+import os
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+# Proxy tracer: chưa gọi setup_tracing() thì mọi span là no-op (gần như không tốn gì)
+tracer = trace.get_tracer("thay_tu")
+
+_setup_lock = threading.Lock()
+_provider = None
+
+
+def _build_exporter(kind):
+    if kind == "console":
+        return ConsoleSpanExporter()
+    if kind == "otlp":
+        # Endpoint/headers lấy từ biến chuẩn OTEL_EXPORTER_OTLP_* (mặc định collector local)
+        if os.environ.get("OTEL_EXPORTER_OTLP_PROTOCOL", "http/protobuf") == "grpc":
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        else:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {kind!r}")
+
+
+def setup_tracing() -> bool:
+    """
+    Bật tracing theo TRACING_EXPORTER (none | console | otlp), gọi một lần lúc khởi động.
+    Span của ADK (invocation, invoke_agent, call_llm, execute_tool, compact_events) đi chung provider này.
+    """
+    global _provider
+    kind = os.environ.get("TRACING_EXPORTER", "none").lower()
+    if kind == "none":
+        return False
+    with _setup_lock:
+        if _provider is None:
+            # Mặc định không ghi nội dung prompt/câu trả lời vào span (dữ liệu người dùng)
+            os.environ.setdefault("ADK_CAPTURE_MESSAGE_CONTENT_IN_SPANS", "false")
+            resource = Resource.create({"service.name": os.environ.get("OTEL_SERVICE_NAME", "thay-tu-online")})
+            provider = TracerProvider(resource=resource)
+            # BatchSpanProcessor: xuất ở thread nền theo lô, tự dựng lại thread sau khi gunicorn fork
+            provider.add_span_processor(BatchSpanProcessor(_build_exporter(kind)))
+            trace.set_tracer_provider(provider)
+            _provider = provider
+    return True
+
+
+def shutdown_tracing():
+    """Xuất nốt span còn trong hàng đợi (gọi từ atexit)."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def current_trace_ids() -> dict:
+    """trace_id/span_id (hex) của span hiện tại để gắn vào log; rỗng nếu không có span."""
+    ctx = trace.get_current_span().get_span_context()
+    if not ctx.is_valid:
+        return {}
+    return {"otel_trace_id": format(ctx.trace_id, "032x"), "otel_span_id": format(ctx.span_id, "016x")}
+
+
+def start_request_span(method, path, headers, trace_id=None):
+    """
+    Mở span SERVER cho một request và đặt nó làm span hiện tại.
+    Nhận `traceparent` (W3C) nếu phía trước đã có trace; `trace_id` của app gắn làm thuộc tính để tra chéo với log.
+    Trả về (span, token) cho finish_request_span.
+    """
+    parent = propagate.extract(headers)
+    span = tracer.start_span(f"{method} {path}", context=parent, kind=SpanKind.SERVER,
+                             attributes={"http.request.method": method, "url.path": path})
+    if trace_id:
+        span.set_attribute("app.trace_id", trace_id)
+    token = otel_context.attach(trace.set_span_in_context(span, parent))
+    return span, token
+
+
+def finish_request_span(span, token, status_code=None, error=None):
+    if status_code is not None:
+        span.set_attribute("http.response.status_code", status_code)
+        if status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+    if error is not None:
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+    span.end()
+    try:
+        otel_context.detach(token)
+    except Exception:
+        pass # Flask teardown có thể chạy ở context khác (response stream) -> span vẫn đã đóng
+
+
+@contextmanager
+def span(name, **attributes):
+    """`with span("agent.run", user_id=...)`: span con của span hiện tại, tự ghi exception."""
+    with tracer.start_as_current_span(name, attributes=attributes or None) as current:
+        yield current
+
+
+def annotate(**attributes):
+    """Gắn thuộc tính vào span hiện tại (vd span execute_tool của ADK) mà không mở span mới."""
+    trace.get_current_span().set_attributes(attributes)
+
+
+def traced(name=None):
+    """Decorator bọc hàm (sync hoặc async) trong một span mang tên `name` (mặc định tên hàm)."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+
+from core.log_pipeline import LogPipeline, LogPolicy
+
+# Giá tham khảo (USD / 1 triệu token): input, input đã cache, output (kể cả token "thinking").
+# Ghi đè bằng USAGE_PRICES='{"gemini-2.5-flash": [0.3, 0.03, 2.5]}'. Khớp theo tiền tố dài nhất của tên model.
+DEFAULT_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.01, 0.40),
+    "gemini-2.5-flash": (0.30, 0.03, 2.50),
+    "gemini-2.5-pro": (1.25, 0.125, 10.00),
+}
+
+
+def load_prices() -> dict:
+    prices = dict(DEFAULT_PRICES)
+    override = os.environ.get("USAGE_PRICES")
+    if override:
+        prices.update({model: tuple(p) for model, p in json.loads(override).items()})
+    return prices
+
+
+PRICES = load_prices()
+
+
+def price_for(model) -> tuple:
+    for name in sorted(PRICES, key=len, reverse=True):
+        if (model or "").startswith(name):
+            return PRICES[name]
+    return (0.0, 0.0, 0.0)
+
+
+@dataclass
+class TokenUsage:
+    """Cộng dồn usage_metadata của nhiều lần gọi model."""
+    calls: int = 0
+    input_tokens: int = 0 # prompt_token_count, đã gồm phần cached
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    thought_tokens: int = 0
+    max_input_tokens: int = 0 # Prompt dài nhất trong lượt (~ độ dài lịch sử gửi lên)
+    cost_usd: float = 0.0
+
+    def add_metadata(self, usage, model):
+        prompt = usage.prompt_token_count or 0
+        output = usage.candidates_token_count or 0
+        cached = usage.cached_content_token_count or 0
+        thoughts = usage.thoughts_token_count or 0
+        price_in, price_cached, price_out = price_for(model)
+        self.calls += 1
+        self.input_tokens += prompt
+        self.output_tokens += output
+        self.cached_tokens += cached
+        self.thought_tokens += thoughts
+        self.max_input_tokens = max(self.max_input_tokens, prompt)
+        self.cost_usd += ((prompt - cached) * price_in + cached * price_cached + (output + thoughts) * price_out) / 1e6
+
+
+@dataclass
+class TurnUsage:
+    """Token của một lượt /ask: agent (mọi lần gọi model kể cả sau khi gọi tool) + summarizer (compaction)."""
+    model: str = ""
+    agent: TokenUsage = field(default_factory=TokenUsage)
+    summarizer: TokenUsage = field(default_factory=TokenUsage)
+
+    @property
+    def cost_usd(self) -> float:
+        return self.agent.cost_usd + self.summarizer.cost_usd
+
+    def log_fields(self) -> dict:
+        return {
+            "llm_calls": self.agent.calls,
+            "input_tokens": self.agent.input_tokens,
+            "output_tokens": self.agent.output_tokens,
+            "cached_tokens": self.agent.cached_tokens,
+            "thought_tokens": self.agent.thought_tokens,
+            "max_input_tokens": self.agent.max_input_tokens,
+            "summarizer_calls": self.summarizer.calls,
+            "summarizer_input_tokens": self.summarizer.input_tokens,
+            "summarizer_output_tokens": self.summarizer.output_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+_current_turn = contextvars.ContextVar("usage_turn", default=None)
+
+
+@contextmanager
+def track_turn(model):
+    """Mở sổ token cho một lượt; record_event / summarizer trong cùng context tự cộng vào."""
+    turn = TurnUsage(model=model)
+    token = _current_turn.set(turn)
+    try:
+        yield turn
+    finally:
+        _current_turn.reset(token)
+
+
+def current_turn():
+    return _current_turn.get()
+
+
+def record_event(event):
+    """Cộng usage của một event agent (bỏ partial: stream gửi usage ở phản hồi cuối)."""
+    turn = _current_turn.get()
+    if turn is not None and not event.partial and event.usage_metadata:
+        turn.agent.add_metadata(event.usage_metadata, event.model_version or turn.model)
+
+
+class MeteredEventSummarizer(LlmEventSummarizer):
+    """LlmEventSummarizer có đếm token: compaction chạy trong runner.run_async nên cộng vào lượt đang mở."""
+
+    async def maybe_summarize_events(self, *, events):
+        event = await super().maybe_summarize_events(events=events)
+        turn = _current_turn.get()
+        if turn is not None and event is not None and event.usage_metadata:
+            turn.summarizer.add_metadata(event.usage_metadata, self._llm.model)
+        return event
+
+
+def tool_path(tool_calls) -> str:
+    """Chuỗi tool đã gọi trong lượt, vd 'xem_sao_giai_han>tra_cuu_tu_vi_online'; '-' nếu không gọi tool."""
+    return ">".join(name for name, _ in tool_calls) or "-"
+
+
+class UsageLedger:
+    """
+    Sổ tổng token/chi phí, dùng chung cho mọi worker (SQLite WAL).
+    Mỗi lượt cộng vào 4 phạm vi: all, day (UTC), user, tool_path - một transaction, vài UPSERT theo khoá chính.
+    Dòng theo user / ngày không cập nhật quá `retention` giây thì bị dọn.
+    """
+
+    SCOPES = ("all", "day", "user", "tool_path")
+    ORDER_COLUMNS = ("cost_usd", "input_tokens", "output_tokens", "latency_s", "turns", "max_input_tokens", "updated")
+    _COLUMNS = ("turns", "llm_calls", "input_tokens", "output_tokens", "cached_tokens", "thought_tokens",
+                "summarizer_calls", "summarizer_input_tokens", "summarizer_output_tokens", "cost_usd", "latency_s")
+
+    _UPSERT = (
+        "INSERT INTO usage_totals (scope, key, " + ", ".join(_COLUMNS) + ", max_input_tokens, updated) "
+        "VALUES (?, ?, " + ", ".join("?" for _ in _COLUMNS) + ", ?, ?) "
+        "ON CONFLICT(scope, key) DO UPDATE SET "
+        + ", ".join(f"{c} = {c} + excluded.{c}" for c in _COLUMNS)
+        + ", max_input_tokens = MAX(max_input_tokens, excluded.max_input_tokens), updated = excluded.updated"
+    )
+
+    def __init__(self, db_path, retention=30 * 24 * 3600, prune_every=1000, policy: LogPolicy = None):
+        self.db_path = db_path
+        self.retention = retention
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._records = 0
+        self.errors = 0
+        # Ghi theo lô ở thread nền như pipeline log: lượt agent (trên event loop) chỉ đẩy vào hàng đợi,
+        # không chờ khoá ghi SQLite hay lần dọn dữ liệu cũ
+        self.pipeline = LogPipeline(self._write_batch, policy or LogPolicy(max_queue=5000, batch_size=100,
+                                                                           flush_interval=0.5))
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS usage_totals (scope TEXT NOT NULL, key TEXT NOT NULL, "
+            + ", ".join(f"{c} {'REAL' if c in ('cost_usd', 'latency_s') else 'INTEGER'} NOT NULL DEFAULT 0"
+                        for c in self._COLUMNS)
+            + ", max_input_tokens INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL, "
+            "PRIMARY KEY (scope, key)) WITHOUT ROWID"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=2000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def record(self, user_id, turn: TurnUsage, tool_calls, latency) -> bool:
+        """Đưa một lượt vào hàng đợi ghi sổ (không chặn). False nếu hàng đợi đầy và lượt này bị bỏ."""
+        now = time.time()
+        a, s = turn.agent, turn.summarizer
+        values = (1, a.calls, a.input_tokens, a.output_tokens, a.cached_tokens, a.thought_tokens,
+                  s.calls, s.input_tokens, s.output_tokens, turn.cost_usd, latency, a.max_input_tokens, now)
+        keys = (("all", "all"), ("day", time.strftime("%Y-%m-%d", time.gmtime(now))),
+                ("user", user_id), ("tool_path", tool_path(tool_calls)))
+        return self.pipeline.submit("usage", user_id, {"rows": [(scope, key, *values) for scope, key in keys]})
+
+    def _write_batch(self, batch):
+        """Cộng cả lô vào sổ trong MỘT transaction (chạy ở thread của pipeline). Lỗi SQLite chỉ ghi nhận."""
+        rows = [row for _, _, _, payload in batch for row in payload["rows"]]
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(self._UPSERT, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            with self._lock:
+                self.errors += len(batch)
+            print(f"[USAGE] Record failed, dropped {len(batch)} turns: {e}")
+            return
+
+        with self._lock:
+            before = self._records
+            self._records += len(batch)
+            should_prune = before // self.prune_every != self._records // self.prune_every
+        if should_prune:
+            self.prune(time.time() - self.retention)
+
+    def flush(self, timeout=5.0) -> bool:
+        """Chờ các lượt đang xếp hàng được ghi xong (trước khi đọc report trong test / benchmark)."""
+        return self.pipeline.flush(timeout)
+
+    def close(self, timeout=5.0):
+        """Ghi nốt hàng đợi rồi dừng thread (gọi từ atexit)."""
+        self.pipeline.close(timeout)
+
+    def prune(self, older_than):
+        try:
+            self._conn().execute("DELETE FROM usage_totals WHERE scope IN ('user', 'day') AND updated < ?",
+                                 (older_than,))
+        except sqlite3.Error as e:
+            print(f"[USAGE] Prune failed: {e}")
+
+    @staticmethod
+    def _row(names, values) -> dict:
+        row = dict(zip(names, values))
+        turns = row.get("turns") or 0
+        if turns:
+            row["avg_input_tokens"] = round(row["input_tokens"] / turns, 1)
+            row["avg_latency_s"] = round(row["latency_s"] / turns, 3)
+            row["avg_cost_usd"] = round(row["cost_usd"] / turns, 6)
+        row["cost_usd"] = round(row["cost_usd"], 6)
+        row["latency_s"] = round(row["latency_s"], 3)
+        return row
+
+    def report(self, scope="user", order="cost_usd", limit=50) -> dict:
+        """Tổng toàn bộ + top `limit` dòng của một phạm vi, sắp theo `order` giảm dần."""
+        if scope not in self.SCOPES:
+            raise ValueError(f"scope must be one of {self.SCOPES}")
+        if order not in self.ORDER_COLUMNS:
+            raise ValueError(f"order must be one of {self.ORDER_COLUMNS}")
+        conn = self._conn()
+        columns = ("key",) + self._COLUMNS + ("max_input_tokens", "updated")
+        select = "SELECT " + ", ".join(columns) + " FROM usage_totals WHERE scope=?"
+        total = conn.execute(select + " AND key='all'", ("all",)).fetchone()
+        rows = conn.execute(select + f" ORDER BY {order} DESC LIMIT ?", (scope, int(limit))).fetchall()
+        return {
+            "scope": scope,
+            "order": order,
+            "total": self._row(columns[1:], total[1:]) if total else None,
+            "rows": [self._row(columns, r) for r in rows],
+        }
+
+    def stats(self) -> dict:
+        queue = self.pipeline.stats()
+        with self._lock:
+            return {"records": self._records, "errors": self.errors, "queued": queue["queued"],
+                    "dropped": queue["dropped_full"]}
+
@@ -0,0 +1,25 @@
+"""
+Cấu hình gunicorn dùng chung (gunicorn tự nạp file này khi chạy trong thư mục dự án).
+
+Prometheus multiprocess: mỗi worker ghi số đo ra file trong PROMETHEUS_MULTIPROC_DIR,
+/metrics gộp file của mọi worker. Thư mục được dọn lúc master khởi động (số cũ của lần chạy trước
+không được cộng dồn) và số của worker đã chết được đánh dấu bỏ để gauge "live" không bị treo.
+"""
+import os
+import glob
+import tempfile
+
+# Phải có trước khi worker import prometheus_client (worker kế thừa env của master)
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                                    os.path.join(tempfile.gettempdir(), "thay-tu-prometheus"))
+
+
+def on_starting(server):
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
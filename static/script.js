@@ -25,17 +25,19 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     shuffleChips();
 
+    const AVATAR_HTML = `
+                <div class="avatar">
+                    <img src="https://res.cloudinary.com/dkeupjars/image/upload/v1765254047/agent/thay-tu-avatar-01_vju3dt.png" alt="Thầy Tư">
+                </div>
+            `;
+
     function addMessage(content, isUser) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${isUser ? 'user-message' : 'bot-message'}`;
         
         let innerHTML = '';
         if (!isUser) {
-            innerHTML += `
-                <div class="avatar">
-                    <img src="https://res.cloudinary.com/dkeupjars/image/upload/v1765254047/agent/thay-tu-avatar-01_vju3dt.png" alt="Thầy Tư">
-                </div>
-            `;
+            innerHTML += AVATAR_HTML;
         }
 
         // Parse for chart data
@@ -56,6 +58,86 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Tên thân thiện cho từng công cụ khi hiện tiến độ
+    const toolLabels = {
+        xem_sao_giai_han: 'Thầy đang coi sao hạn...',
+        tra_cuu_tu_vi_online: 'Thầy đang lật sách tử vi...',
+        phan_tich_chi_so_khoa_hoc: 'Thầy đang chạy mô hình chỉ số...',
+        xem_so_chu_dao: 'Thầy đang tính số chủ đạo...',
+        xem_cung_hoang_dao_tool: 'Thầy đang coi cung hoàng đạo...',
+        xem_than_so_hoc: 'Thầy đang lập hồ sơ thần số...'
+    };
+
+    // Bong bóng tin nhắn của Thầy được vẽ dần theo từng token (SSE)
+    function createStreamingMessage() {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message bot-message';
+        messageDiv.innerHTML = AVATAR_HTML + `<div class="message-content">
+                        <div class="stream-text"></div>
+                        <div class="tool-status" style="opacity: 0.7; font-style: italic;"></div>
+                        <div class="stream-chart"></div>
+                      </div>`;
+        chatMessages.appendChild(messageDiv);
+
+        const textEl = messageDiv.querySelector('.stream-text');
+        const toolEl = messageDiv.querySelector('.tool-status');
+        const chartEl = messageDiv.querySelector('.stream-chart');
+        let buffer = '';
+        let chartRendered = false;
+
+        function scroll() {
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+
+        return {
+            appendText(chunk) {
+                buffer += chunk;
+                // Ẩn block JSON biểu đồ đang gõ dở, chỉ hiện phần chữ
+                textEl.innerHTML = formatMessage(buffer.split('```json')[0]);
+                scroll();
+            },
+            showTool(name, status) {
+                toolEl.textContent = status === 'running' ? (toolLabels[name] || 'Thầy đang bấm quẻ...') : '';
+            },
+            showChart(chartData) {
+                if (chartRendered || !chartData || !chartData.chart_config) return;
+                chartRendered = true;
+                const canvasId = 'chart-' + Date.now();
+                chartEl.innerHTML = '<div class="chart-container" style="position: relative; height:300px; width:100%"><canvas id="' + canvasId + '"></canvas></div>';
+                renderChart(canvasId, chartData);
+                scroll();
+            },
+            finish(fullText) {
+                const { text, chartData } = parseContent(fullText || buffer);
+                toolEl.textContent = '';
+                textEl.innerHTML = formatMessage(text || 'Xin lỗi, thầy chưa thể trả lời lúc này. Bạn thử hỏi lại nhé!');
+                this.showChart(chartData);
+                scroll();
+            },
+            fail(message) {
+                toolEl.textContent = '';
+                textEl.innerHTML = formatMessage(buffer ? buffer.split('```json')[0] + '\n\n' + message : message);
+                scroll();
+            }
+        };
+    }
+
+    // Tách luồng SSE thành từng frame {event, data}
+    function parseSseFrame(frame) {
+        let event = 'message';
+        const dataLines = [];
+        frame.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        });
+        try {
+            return { event, data: JSON.parse(dataLines.join('\n') || '{}') };
+        } catch (e) {
+            console.error('Error parsing SSE frame:', e);
+            return { event, data: {} };
+        }
+    }
+
     function parseContent(content) {
         // Regex to find JSON block: ```json { ... } ```
         const jsonBlockRegex = /```json\s*(\{[\s\S]*?"type"\s*:\s*"chart_data"[\s\S]*?\})\s*```/;
@@ -187,27 +269,123 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Server đủ tải (503 / SSE 'busy'): tự hỏi lại vài lần, chờ theo Retry-After có jitter
+    // để các tab bị từ chối cùng lúc không dội lại server cùng một nhịp
+    const BUSY_MAX_RETRIES = 3;
+    const BUSY_MAX_DELAY_MS = 15000;
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function busyDelay(retryAfter, attempt) {
+        const base = (parseFloat(retryAfter) || 1) * 1000 * Math.pow(2, attempt);
+        return Math.min(BUSY_MAX_DELAY_MS, base * (0.5 + Math.random()));
+    }
+
+    async function sendMessageClassic(message, attempt = 0) {
+        const response = await fetch('/ask', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ message: message })
+        });
+
+        const data = await response.json();
+        if (response.status === 503 && attempt < BUSY_MAX_RETRIES) {
+            await sleep(busyDelay(response.headers.get('Retry-After') || data.retry_after, attempt));
+            return sendMessageClassic(message, attempt + 1);
+        }
+        hideTypingIndicator();
+
+        if (response.ok) {
+            addMessage(data.response, false);
+        } else {
+            addMessage(data.error || 'Có lỗi xảy ra, vui lòng thử lại!', false);
+        }
+    }
+
+    async function sendMessageStreaming(message, attempt = 0) {
+        const response = await fetch('/ask/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({ message: message })
+        });
+
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
+            if (response.status === 503 && attempt < BUSY_MAX_RETRIES) {
+                await sleep(busyDelay(response.headers.get('Retry-After') || data.retry_after, attempt));
+                return sendMessageStreaming(message, attempt + 1);
+            }
+            hideTypingIndicator();
+            addMessage(data.error || 'Có lỗi xảy ra, vui lòng thử lại!', false);
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = '';
+        let bubble = null;
+        let finished = false;
+        let busy = null;
+
+        // Token/tool đầu tiên tới thì bỏ indicator, mở bong bóng trả lời
+        function ensureBubble() {
+            if (!bubble) {
+                hideTypingIndicator();
+                bubble = createStreamingMessage();
+            }
+            return bubble;
+        }
+
+        function handle({ event, data }) {
+            if (event === 'token') ensureBubble().appendText(data.text || '');
+            else if (event === 'tool') ensureBubble().showTool(data.name, data.status);
+            else if (event === 'chart') ensureBubble().showChart(data);
+            else if (event === 'done') { ensureBubble().finish(data.response); finished = true; }
+            else if (event === 'error') { ensureBubble().fail(data.error || 'Có lỗi xảy ra, vui lòng thử lại!'); finished = true; }
+            else if (event === 'busy') { busy = data; finished = true; }
+        }
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            pending += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = pending.indexOf('\n\n')) !== -1) {
+                const frame = pending.slice(0, boundary);
+                pending = pending.slice(boundary + 2);
+                if (frame.trim()) handle(parseSseFrame(frame));
+            }
+        }
+
+        if (busy) {
+            // Chưa có chữ nào hiện ra thì hỏi lại được; đã trả lời dở thì báo bận luôn
+            if (!bubble && attempt < BUSY_MAX_RETRIES) {
+                await sleep(busyDelay(busy.retry_after, attempt));
+                return sendMessageStreaming(message, attempt + 1);
+            }
+            ensureBubble().fail(busy.error || 'Có lỗi xảy ra, vui lòng thử lại!');
+        } else if (!finished) {
+            ensureBubble().fail('Mạng mẽo cà chớn quá, con đợi xíu rồi hỏi lại nghen!');
+        }
+    }
+
     async function sendMessage(message) {
         addMessage(message, true);
         setLoading(true);
         showTypingIndicator();
 
         try {
-            const response = await fetch('/ask', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ message: message })
-            });
-
-            const data = await response.json();
-            hideTypingIndicator();
-
-            if (response.ok) {
-                addMessage(data.response, false);
+            if (window.ReadableStream && window.TextDecoder) {
+                await sendMessageStreaming(message);
             } else {
-                addMessage(data.error || 'Có lỗi xảy ra, vui lòng thử lại!', false);
+                await sendMessageClassic(message);
             }
         } catch (error) {
             hideTypingIndicator();